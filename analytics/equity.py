@@ -0,0 +1,207 @@
+import json
+from typing import List, Tuple
+import polars as pl
+from constants.coin_id import coin_id_map
+
+cash_schema = pl.Schema(
+    {
+        "event": pl.UInt32,
+        "time": pl.Datetime("ms"),
+        "spot_usdc": pl.Float64,
+        "perp_usdc": pl.Float64,
+        "margin_used": pl.Float64,
+        "vault_balance": pl.Float64,
+    }
+)
+
+balances_schema = pl.Schema(
+    {
+        "event": pl.UInt32,
+        "time": pl.Datetime("ms"),
+        "token": pl.String,
+        "kind": pl.String,
+        "amount": pl.Float64,
+    }
+)
+
+# Position dicts of a state and the field holding each position's amount
+_BALANCE_FIELDS = [
+    ("spot", "spot_positions", "balance"),
+    ("perp", "perp_positions", "size"),
+]
+
+
+def state_timeline(out: List[dict]) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Flatten a replay timeline into columnar cash and balance frames.
+
+    States are read in a single pass into plain column lists, which scales to
+    millions of events where inferring a nested schema does not.
+
+    Args:
+        out: Replay output as produced by replay_updates (time, update, new_state)
+
+    Returns:
+        Tuple of (cash frame with one row per event, long frame of token
+        balances per event with kind "spot" or "perp")
+    """
+
+    cash = {name: [] for name in cash_schema.names()}
+    balances = {name: [] for name in balances_schema.names()}
+
+    for event, entry in enumerate(out):
+        state = entry["new_state"]
+        cash["event"].append(event)
+        cash["time"].append(entry["time"])
+        cash["spot_usdc"].append(state["spot_usdc"])
+        cash["perp_usdc"].append(state["perp_usdc"])
+        cash["margin_used"].append(
+            sum(
+                margin.get("margin_used") or 0.0
+                for margin in (state.get("margins") or {}).values()
+            )
+        )
+        cash["vault_balance"].append(
+            sum(
+                vault.get("balance") or 0.0
+                for vault in (state.get("vault_positions") or {}).values()
+            )
+        )
+
+        for kind, column, field in _BALANCE_FIELDS:
+            for token, position in (state.get(column) or {}).items():
+                amount = position.get(field)
+                if amount is None:
+                    continue
+                balances["event"].append(event)
+                balances["time"].append(entry["time"])
+                balances["token"].append(token)
+                balances["kind"].append(kind)
+                balances["amount"].append(amount)
+
+    # Times are epoch milliseconds until the frames are built
+    overrides = {"time": pl.Int64}
+    cash = pl.DataFrame(cash, schema={**cash_schema, **overrides})
+    balances = pl.DataFrame(balances, schema={**balances_schema, **overrides})
+    return (
+        cash.with_columns(pl.col("time").cast(pl.Datetime("ms"))),
+        balances.with_columns(pl.col("time").cast(pl.Datetime("ms"))),
+    )
+
+
+def event_log(out: List[dict]) -> pl.DataFrame:
+    """Event index, time, name and hash of every replayed update."""
+    return pl.DataFrame(
+        {
+            "event": range(len(out)),
+            "time": [entry["time"] for entry in out],
+            "name": [entry["update"].get("name") for entry in out],
+            "hash": [entry["update"].get("hash") for entry in out],
+        },
+        schema_overrides={"event": pl.UInt32, "time": pl.Datetime("ms")},
+    )
+
+
+def load_replay_output(path: str) -> List[dict]:
+    """Read a user_state_*.json replay dump."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def fill_prices(fills_df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Trade prices per standardized token from a fills frame.
+
+    Args:
+        fills_df: Fills frame following user_fills_schema
+
+    Returns:
+        Polars DataFrame with time, token and px sorted by time
+    """
+
+    return fills_df.select(
+        "time",
+        pl.col("coin").replace(coin_id_map).alias("token"),
+        "px",
+    ).sort("time")
+
+
+def replay_prices(out: List[dict]) -> pl.DataFrame:
+    """
+    Trade prices per standardized token from the trades of a replay timeline.
+
+    Fills give their price, TWAPs replayed as a whole their average execution
+    price, so a replay dump can be valued without the fills cache.
+
+    Args:
+        out: Replay output as produced by replay_updates
+
+    Returns:
+        Polars DataFrame with time, token and px sorted by time
+    """
+
+    rows = []
+    for entry in out:
+        update = entry["update"]
+        if update.get("name") == "UserFill":
+            px = update["px"]
+        elif update.get("name") == "TWAP" and update.get("executedSz"):
+            px = update["executedNtl"] / update["executedSz"]
+        else:
+            continue
+        coin = update["coin"]
+        rows.append((entry["time"], coin_id_map.get(coin, coin), float(px)))
+
+    return pl.DataFrame(
+        rows,
+        schema={"time": pl.Int64, "token": pl.String, "px": pl.Float64},
+        orient="row",
+    ).with_columns(pl.col("time").cast(pl.Datetime("ms"))).sort("time")
+
+
+def value_state_timeline(
+    cash: pl.DataFrame, balances: pl.DataFrame, prices: pl.DataFrame
+) -> pl.DataFrame:
+    """
+    Value every replayed state at the last known price of each token.
+
+    Equity is spot_usdc + perp_usdc + margin_used + vault_balance + spot
+    balances at price. Perp exposure is reported as perp_notional; its
+    unrealized PnL is not part of equity since the replay does not track
+    entry prices.
+
+    Args:
+        cash: Cash frame from state_timeline
+        balances: Balance frame from state_timeline
+        prices: Price frame with time, token and px (e.g. from fill_prices)
+
+    Returns:
+        Polars DataFrame with one row per event and spot_value, perp_notional
+        and equity columns
+    """
+
+    valued = (
+        balances.sort("time")
+        .join_asof(prices.sort("time"), on="time", by="token", strategy="backward")
+        .with_columns((pl.col("amount") * pl.col("px")).fill_null(0.0).alias("value"))
+        .group_by("event")
+        .agg(
+            pl.col("value").filter(pl.col("kind") == "spot").sum().alias("spot_value"),
+            pl.col("value").filter(pl.col("kind") == "perp").sum().alias("perp_notional"),
+        )
+    )
+
+    return (
+        cash.join(valued, on="event", how="left")
+        .with_columns(pl.col("spot_value", "perp_notional").fill_null(0.0))
+        .with_columns(
+            (
+                pl.col("spot_usdc")
+                + pl.col("perp_usdc")
+                + pl.col("margin_used")
+                + pl.col("vault_balance")
+                + pl.col("spot_value")
+            ).alias("equity")
+        )
+        .sort("event")
+    )
@@ -0,0 +1,64 @@
+from typing import List
+import polars as pl
+from loaders.fees import get_fees_dataframe, scan_fees
+
+FEE_GROUPS = ["fee_token", "event_type", "coin"]
+
+
+def fee_rollup(
+    fees: pl.DataFrame | pl.LazyFrame,
+    by: List[str] | None = None,
+    every: str | None = None,
+) -> pl.DataFrame:
+    """
+    Sum fees by any combination of token, event type, coin and address.
+
+    Args:
+        fees: Fee table following fees_schema
+        by: Columns to group by, fee_token by default
+        every: Optional time bucket width (e.g. "1d", "1w", "1mo")
+
+    Returns:
+        Polars DataFrame with total fee and event count per group (and bucket)
+    """
+
+    by = ["fee_token"] if by is None else list(by)
+    aggs = [pl.col("fee").sum().alias("fee"), pl.len().alias("events")]
+    lf = fees.lazy()
+
+    if every is None:
+        return lf.group_by(by).agg(aggs).sort(by).collect()
+
+    return (
+        lf.sort("time")
+        .group_by_dynamic("time", every=every, group_by=by)
+        .agg(aggs)
+        .sort(["time", *by])
+        .collect()
+    )
+
+
+def get_strategy_fees(
+    addresses: List[str],
+    by: List[str] | None = None,
+    every: str | None = "1mo",
+    use_cache: bool = True,
+) -> pl.DataFrame:
+    """
+    Fee totals across all addresses of a strategy, monthly by default.
+
+    Args:
+        addresses: Strategy member addresses
+        by: Columns to group by, fee_token by default
+        every: Optional time bucket width, None for all-time totals
+        use_cache: Whether to use cached data if available
+
+    Returns:
+        Polars DataFrame with total fee and event count per group (and bucket)
+    """
+
+    # extract (or refresh) every member's fee table, then roll up from Parquet
+    for address in addresses:
+        get_fees_dataframe(address, use_cache)
+
+    return fee_rollup(scan_fees(addresses), by=by, every=every)
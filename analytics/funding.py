@@ -0,0 +1,153 @@
+import polars as pl
+from constants.coin_id import coin_id_map
+from loaders.user_funding import get_user_funding_dataframe
+
+# Hyperliquid pays funding every hour
+FUNDING_PAYMENTS_PER_YEAR = 24 * 365
+
+
+def funding_with_notional(funding_df: pl.DataFrame | pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Attach position notional and oracle price to each funding payment.
+
+    A payment is usdc = -szi * px * fundingRate, so the notional |szi| * px is
+    recovered as |usdc / fundingRate| without needing a price feed.
+
+    Args:
+        funding_df: Funding frame following user_funding_schema
+
+    Returns:
+        Polars LazyFrame sorted by time with notional and px columns added
+    """
+
+    notional = (
+        pl.when(pl.col("fundingRate") != 0)
+        .then((pl.col("usdc") / pl.col("fundingRate")).abs())
+        .otherwise(None)
+    )
+    return (
+        funding_df.lazy()
+        .with_columns(
+            pl.col("coin").replace(coin_id_map),
+            notional.alias("notional"),
+        )
+        .with_columns(
+            (pl.col("notional") / pl.col("szi").abs()).alias("px"),
+        )
+        .sort("time")
+    )
+
+
+def cumulative_funding(funding_df: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+    """
+    Running funding total per coin at every payment.
+
+    Args:
+        funding_df: Funding frame following user_funding_schema
+
+    Returns:
+        Polars DataFrame with cumulative_usdc per coin
+    """
+
+    return (
+        funding_with_notional(funding_df)
+        .with_columns(
+            pl.col("usdc").cum_sum().over("coin").alias("cumulative_usdc"),
+        )
+        .collect()
+    )
+
+
+def rolling_funding_apr(
+    funding_df: pl.DataFrame | pl.LazyFrame, window: str = "7d"
+) -> pl.DataFrame:
+    """
+    Rolling annualized funding yield per coin relative to position notional.
+
+    The yield is the funding received over the trailing window divided by the
+    notional it was earned on, scaled from hourly payments to a year.
+
+    Args:
+        funding_df: Funding frame following user_funding_schema
+        window: Trailing window width (e.g. "1d", "7d", "30d")
+
+    Returns:
+        Polars DataFrame with rolling_usdc, rolling_notional and rolling_apr
+    """
+
+    lf = funding_with_notional(funding_df).filter(pl.col("notional").is_not_null())
+    rolling_usdc = pl.col("usdc").rolling_sum_by("time", window_size=window)
+    rolling_notional = pl.col("notional").rolling_sum_by("time", window_size=window)
+
+    return (
+        lf.with_columns(
+            rolling_usdc.over("coin").alias("rolling_usdc"),
+            rolling_notional.over("coin").alias("rolling_notional"),
+        )
+        .with_columns(
+            (
+                pl.col("rolling_usdc")
+                / pl.col("rolling_notional")
+                * FUNDING_PAYMENTS_PER_YEAR
+            ).alias("rolling_apr"),
+        )
+        .collect()
+    )
+
+
+def funding_buckets(
+    funding_df: pl.DataFrame | pl.LazyFrame, every: str = "1d"
+) -> pl.DataFrame:
+    """
+    Funding per coin aggregated into fixed time buckets.
+
+    Args:
+        funding_df: Funding frame following user_funding_schema
+        every: Bucket width (e.g. "1h", "1d", "1w")
+
+    Returns:
+        Polars DataFrame with funding, payment count, average notional and APR
+        per coin and bucket
+    """
+
+    return (
+        funding_with_notional(funding_df)
+        .group_by_dynamic("time", every=every, group_by="coin")
+        .agg(
+            pl.col("usdc").sum().alias("usdc"),
+            pl.len().alias("payments"),
+            pl.col("notional").mean().alias("avg_notional"),
+            (
+                pl.col("usdc").sum()
+                / pl.col("notional").sum()
+                * FUNDING_PAYMENTS_PER_YEAR
+            ).alias("apr"),
+        )
+        .sort(["time", "coin"])
+        .collect()
+    )
+
+
+def get_funding_analytics(
+    address: str, every: str = "1d", window: str = "7d", use_cache: bool = True
+) -> dict[str, pl.DataFrame]:
+    """
+    Funding attribution for an address.
+
+    Args:
+        address: User address to analyze funding for
+        every: Bucket width for funding_buckets
+        window: Trailing window width for rolling_funding_apr
+        use_cache: Whether to use cached data if available
+
+    Returns:
+        Dictionary with "cumulative", "rolling" and "buckets" DataFrames
+    """
+
+    funding_df = get_user_funding_dataframe(address, use_cache)
+
+    return {
+        "cumulative": cumulative_funding(funding_df),
+        "rolling": rolling_funding_apr(funding_df, window),
+        "buckets": funding_buckets(funding_df, every),
+    }
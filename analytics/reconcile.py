@@ -0,0 +1,328 @@
+from typing import List, Tuple
+import polars as pl
+from loguru import logger
+from analytics.equity import event_log, fill_prices, state_timeline, value_state_timeline
+from constants.coin_id import coin_id_map
+from loaders.actions import TWAP_HASH, get_actions, get_executions, twap_parents
+from loaders.portfolio import get_portfolio
+from loaders.user_fills import get_user_fills_dataframe
+from models.class_models.user_fills import UserFillsModel
+from models.class_models.user_ledger_updates import TxModel
+from transformer.replay import UpdateModel, get_user_updates, replay_updates
+
+# Export classes of fills, compared per (time, token) rather than per hash
+EXECUTION_CLASSES = ["PERP", "SPOT"]
+# Export action types without a counterpart in the replay
+UNREPLAYED_TYPES = ["Spot Dust Conversion"]
+
+
+def reconcile_portfolio(
+    valued: pl.DataFrame,
+    portfolio_df: pl.DataFrame,
+    period: str = "allTime",
+    jump_threshold: float = 0.01,
+) -> pl.DataFrame:
+    """
+    Compare the replayed equity with the exchange's account value history.
+
+    The replayed timeline is as-of joined onto the portfolio timestamps, so each
+    portfolio point is compared with the last replayed state before it.
+
+    Args:
+        valued: Valued timeline from value_state_timeline
+        portfolio_df: Portfolio frame following portfolio_schema
+        period: Portfolio period to reconcile against
+        jump_threshold: Drift change, relative to account value, that flags a jump
+
+    Returns:
+        Polars DataFrame with one row per portfolio timestamp holding drift,
+        relative drift and whether drift jumped since the previous timestamp
+    """
+
+    portfolio = portfolio_df.filter(pl.col("period") == period).sort("timestamp")
+    replayed = valued.select(
+        pl.col("time").alias("replay_time"), "event", "equity"
+    ).sort("replay_time")
+
+    return (
+        portfolio.select("timestamp", "account_value", "pnl")
+        .join_asof(
+            replayed, left_on="timestamp", right_on="replay_time", strategy="backward"
+        )
+        .with_columns(pl.col("equity").fill_null(0.0))
+        .with_columns((pl.col("equity") - pl.col("account_value")).alias("drift"))
+        .with_columns(
+            (pl.col("drift") / pl.col("account_value").abs()).alias("relative_drift"),
+            pl.col("drift").diff().fill_null(pl.col("drift")).alias("drift_change"),
+            pl.col("timestamp").shift(1).alias("previous_timestamp"),
+        )
+        .with_columns(
+            (
+                pl.col("drift_change").abs()
+                > jump_threshold * pl.max_horizontal(pl.col("account_value").abs(), 1.0)
+            ).alias("drift_jump")
+        )
+    )
+
+
+def drift_events(
+    report: pl.DataFrame, events: pl.DataFrame, last: int = 5
+) -> pl.DataFrame:
+    """
+    Events replayed just before each drift jump.
+
+    Args:
+        report: Report from reconcile_portfolio
+        events: Event log from event_log
+        last: Number of events to keep before each jump
+
+    Returns:
+        Polars DataFrame of the last events between the previous portfolio
+        timestamp and the one where drift jumped
+    """
+
+    jumps = report.filter(pl.col("drift_jump")).select(
+        "timestamp",
+        pl.col("previous_timestamp").fill_null(pl.lit(0).cast(pl.Datetime("ms"))),
+        "drift_change",
+    )
+
+    return (
+        events.join_where(
+            jumps,
+            pl.col("time") > pl.col("previous_timestamp"),
+            pl.col("time") <= pl.col("timestamp"),
+        )
+        .sort(["timestamp", "event"])
+        .group_by("timestamp", maintain_order=True)
+        .tail(last)
+    )
+
+
+def reconcile_address(
+    address: str,
+    period: str = "allTime",
+    jump_threshold: float = 0.01,
+    use_cache: bool = True,
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Replay an address and reconcile it against its exchange portfolio.
+
+    Args:
+        address: User address to reconcile
+        period: Portfolio period to reconcile against
+        jump_threshold: Drift change, relative to account value, that flags a jump
+        use_cache: Whether to use cached data if available
+
+    Returns:
+        Tuple of (drift report, events just before drift jumps)
+    """
+
+    _, out = replay_updates(address, get_user_updates(address, use_cache))
+    if not out:
+        logger.warning(f"Nothing to reconcile for address {address}")
+
+    cash, balances = state_timeline(out)
+    prices = fill_prices(get_user_fills_dataframe(address, use_cache))
+    valued = value_state_timeline(cash, balances, prices)
+
+    report = reconcile_portfolio(
+        valued, get_portfolio(address, use_cache), period, jump_threshold
+    )
+    jumps = drift_events(report, event_log(out))
+    logger.info(
+        f"Reconciled {address}: {report['drift_jump'].sum()} drift jumps over {report.height} timestamps"
+    )
+
+    return report, jumps
+
+
+def replay_event_amounts(address: str, updates: List[UpdateModel]) -> pl.DataFrame:
+    """
+    Signed token amounts moved by each replayed fill and transfer.
+
+    Transfers between the perp and spot accounts of the address are positive
+    towards perp, as the USDC they move stays with the address.
+
+    Args:
+        address: User address the updates belong to
+        updates: Updates from get_user_updates
+
+    Returns:
+        Polars DataFrame with class (as in the actions export), hash, time,
+        token, amount and twap, the twapId (or order id when the API leaves
+        it out) of the TWAP a slice belongs to
+    """
+
+    address = address.lower()
+    rows = []
+    for update in updates:
+        if isinstance(update, UserFillsModel):
+            twap = None
+            if update.hash == TWAP_HASH:
+                twap = update.twapId if update.twapId is not None else update.oid
+            rows.append(
+                (
+                    "SPOT" if update.coin[0] == "@" else "PERP",
+                    update.hash,
+                    update.time,
+                    update.coin,
+                    update.sz if update.side == "b" else -update.sz,
+                    twap,
+                )
+            )
+        elif isinstance(update, TxModel):
+            delta = update.delta
+            row = None
+            if delta.type == "deposit":
+                row = ("DEPOSIT", "USDC", delta.usdc)
+            elif delta.type == "withdraw":
+                row = ("WITHDRAW", "USDC", -delta.usdc)
+            elif delta.type == "accountClassTransfer":
+                row = ("TRANSFER", "USDC", delta.usdc if delta.toPerp else -delta.usdc)
+            elif delta.type in ("internalTransfer", "spotTransfer"):
+                token = "USDC" if delta.type == "internalTransfer" else delta.token
+                amount = delta.usdc if delta.type == "internalTransfer" else delta.amount
+                sign = -1 if delta.user.lower() == address else 1
+                row = ("TRANSFER", token, sign * amount)
+            if row is not None:
+                account_class, token, amount = row
+                rows.append(
+                    (account_class, update.hash, update.time, token, amount, None)
+                )
+
+    return pl.DataFrame(
+        rows,
+        schema={
+            "class": pl.String,
+            "hash": pl.String,
+            "time": pl.Int64,
+            "token": pl.String,
+            "amount": pl.Float64,
+            "twap": pl.Int64,
+        },
+        orient="row",
+    ).with_columns(
+        pl.col("time").cast(pl.Datetime("ms")),
+        pl.col("token").replace(coin_id_map),
+    )
+
+
+def _execution_keys(lf: pl.LazyFrame, twaps: pl.LazyFrame) -> pl.LazyFrame:
+    # Executions are compared per (time, token), whatever hashes and fill
+    # aggregation either side uses, and TWAP slices at their TWAP's Twap row
+    is_slice = pl.col("hash") == TWAP_HASH
+    return (
+        twap_parents(lf, twaps)
+        .with_columns(
+            pl.when(is_slice & pl.col("twap_time").is_not_null())
+            .then(pl.col("twap_time"))
+            .otherwise(pl.col("time"))
+            .alias("time"),
+            pl.when(pl.col("class").cast(pl.String).is_in(EXECUTION_CLASSES))
+            .then(None)
+            .otherwise(pl.col("hash"))
+            .alias("hash"),
+        )
+        .drop("twap_time")
+    )
+
+
+def reconcile_actions(
+    address: str, tolerance: float = 1e-6, use_cache: bool = True
+) -> pl.DataFrame:
+    """
+    Diff the explorer actions export of an address against its replay events.
+
+    Transfers are summed per (hash, time, token). Executions are summed per
+    (time, token), since the export lists every fill while the replay
+    aggregates fills by time. Replayed TWAP slices are summed per TWAP, and
+    slices on both sides count at the Twap row of their TWAP, since the
+    export may only list that row. Both sides are outer joined on those keys
+    over the time span of the export. Action types the replay does not model
+    are left out of the diff and only logged.
+
+    Args:
+        address: User address with an export in src/<checksum>.csv
+        tolerance: Absolute amount difference still considered matching
+        use_cache: Whether to use cached data if available
+
+    Returns:
+        Polars DataFrame of keys missing on either side or whose amounts
+        differ, hash is null for executions
+    """
+
+    keys = ["hash", "time", "token"]
+
+    executions = get_executions(get_actions(address, use_cache)).with_columns(
+        pl.col("token").str.strip_suffix("-USD").replace(coin_id_map)
+    )
+    unreplayed, exported = pl.collect_all(
+        [
+            executions.filter(pl.col("type").is_in(UNREPLAYED_TYPES))
+            .group_by("type", "token")
+            .agg(pl.len().alias("actions"), pl.col("amount").sum()),
+            executions.filter(~pl.col("type").is_in(UNREPLAYED_TYPES)),
+        ]
+    )
+    for row in unreplayed.iter_rows(named=True):
+        logger.info(
+            f"Not reconciling {row['actions']} {row['type']} actions of {row['token']} "
+            f"for {address} ({row['amount']}), the replay does not model them"
+        )
+
+    twaps = exported.lazy().filter(pl.col("type") == "Twap")
+    actions = (
+        _execution_keys(exported.lazy(), twaps)
+        .group_by(keys)
+        .agg(
+            pl.col("amount").sum().alias("actions_amount"),
+            pl.col("type").first().alias("actions_type"),
+        )
+        .collect()
+    )
+
+    # The export is a snapshot, events replayed outside of it are not in it
+    start, end = exported["time"].min(), exported["time"].max()
+    amounts = replay_event_amounts(address, get_user_updates(address, use_cache))
+    # Slices of one TWAP count as one execution at the time of the last one
+    slices = (
+        amounts.filter(pl.col("twap").is_not_null())
+        .group_by("class", "token", "twap")
+        .agg(pl.col("hash").first(), pl.col("time").max(), pl.col("amount").sum())
+    )
+    replayed = (
+        _execution_keys(
+            pl.concat(
+                [amounts.filter(pl.col("twap").is_null()), slices], how="diagonal"
+            )
+            .drop("twap")
+            .lazy(),
+            twaps,
+        )
+        .filter(pl.col("time").is_between(start, end))
+        .group_by(keys)
+        .agg(pl.col("amount").sum().alias("replay_amount"))
+        .collect()
+    )
+
+    diff = (
+        actions.join(replayed, on=keys, how="full", coalesce=True, nulls_equal=True)
+        .with_columns(
+            (
+                pl.col("actions_amount").fill_null(0.0)
+                - pl.col("replay_amount").fill_null(0.0)
+            ).alias("difference")
+        )
+        .filter(
+            pl.col("actions_amount").is_null()
+            | pl.col("replay_amount").is_null()
+            | (pl.col("difference").abs() > tolerance)
+        )
+        .sort("time")
+    )
+
+    logger.info(
+        f"Actions reconciliation for {address}: {diff.height} mismatches out of {actions.height} actions"
+    )
+    return diff
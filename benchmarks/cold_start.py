@@ -0,0 +1,125 @@
+"""
+Cold start check of the replay entry points.
+
+Imports each entry point in a fresh interpreter and fails when it loads a
+dependency that must stay deferred to the code path needing it, or when its
+import time exceeds the budget:
+
+    python -m benchmarks.cold_start
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+from loguru import logger
+from benchmarks.fixtures import ROOT_DIR
+
+# Entry point -> import time budget in ms
+ENTRY_POINTS = {
+    "main": 450.0,
+    "transformer.memo": 400.0,
+    "transformer.replay": 400.0,
+    "transformer.live": 450.0,
+    "utils.metrics": 150.0,
+    "viz.equity": 400.0,
+    "viz.portfolio": 400.0,
+}
+
+# Only fetching, dataframes, charts and live mode may import these
+DEFERRED_MODULES = ["requests", "urllib3", "polars", "altair", "hyperliquid", "eth_account"]
+
+# Entry point -> deferred modules it works on directly, charts build their
+# data with polars but only import altair once they render
+ALLOWED_MODULES: Dict[str, List[str]] = {
+    "viz.equity": ["polars"],
+    "viz.portfolio": ["polars"],
+}
+
+_PROBE = "import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+
+
+def import_profile(module: str) -> dict:
+    """
+    Import time and loaded modules of a module in a fresh interpreter.
+
+    Args:
+        module: Dotted module name to import
+
+    Returns:
+        Dictionary with the cumulative import time in ms and the modules loaded
+    """
+
+    env = {**os.environ, "PYTHONPATH": ROOT_DIR}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+    return {
+        "import_ms": cumulative_us / 1000,
+        "modules": json.loads(result.stdout.strip().splitlines()[-1]),
+    }
+
+
+def check_cold_start(repeat: int = 3) -> Dict[str, List[str]]:
+    """
+    Problems found when importing every entry point.
+
+    Args:
+        repeat: Imports per entry point, the fastest is compared to the budget
+
+    Returns:
+        Dictionary of entry point to problems, empty when all pass
+    """
+
+    problems = {}
+    for module, budget in ENTRY_POINTS.items():
+        profiles = [import_profile(module) for _ in range(repeat)]
+        import_ms = min(profile["import_ms"] for profile in profiles)
+        loaded = set(profiles[0]["modules"])
+
+        allowed = ALLOWED_MODULES.get(module, [])
+        issues = [
+            f"imports {deferred} eagerly"
+            for deferred in DEFERRED_MODULES
+            if deferred in loaded and deferred not in allowed
+        ]
+        if import_ms > budget:
+            issues.append(f"imports in {import_ms:.0f} ms, budget {budget:.0f} ms")
+        if issues:
+            problems[module] = issues
+        logger.info(f"{module}: {import_ms:.0f} ms, {len(loaded)} modules")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    problems = check_cold_start(args.repeat)
+    for module, issues in problems.items():
+        for issue in issues:
+            logger.error(f"{module} {issue}")
+    if problems:
+        sys.exit(1)
+    logger.success("Every entry point starts cold within budget")
+
+
+if __name__ == "__main__":
+    main()
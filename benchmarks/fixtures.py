@@ -0,0 +1,275 @@
+"""
+Raw API shaped caches rebuilt from the replay outputs shipped with the repo.
+
+Every user_state_*.json file holds the updates a replay applied, which are
+turned back into the responses they were parsed from. Funding and portfolio
+histories are not part of a replay and are derived from the replayed states:
+
+    python -m benchmarks.fixtures --out recorded
+"""
+
+import argparse
+import glob
+import os
+from typing import Dict, List
+from loguru import logger
+from analytics.equity import load_replay_output
+from utils.cache import write_cache_json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMP_PATTERN = os.path.join(ROOT_DIR, "user_state_*.json")
+
+FUNDING_RATE = 0.0000125
+FUNDING_INTERVAL = 3_600_000
+FUNDING_HASH = "0x" + "0" * 64
+
+# Lookback of each portfolio period in ms, None for the whole history
+PORTFOLIO_PERIODS = {
+    "day": 86_400_000,
+    "week": 7 * 86_400_000,
+    "month": 30 * 86_400_000,
+    "allTime": None,
+    "perpDay": 86_400_000,
+    "perpWeek": 7 * 86_400_000,
+    "perpMonth": 30 * 86_400_000,
+    "perpAllTime": None,
+}
+# The API samples every period history down to a few hundred points
+PORTFOLIO_POINTS = 200
+
+FILL_DECIMALS = ["px", "sz", "startPosition", "closedPnl", "fee"]
+
+
+def _decimal(value) -> str | None:
+    """Numbers are strings in API responses."""
+    return None if value is None else str(value)
+
+
+def fill_from_update(update: dict) -> dict:
+    """Raw userFills entry of a replayed UserFill update."""
+    fill = {key: value for key, value in update.items() if key != "name"}
+    for key in FILL_DECIMALS:
+        fill[key] = _decimal(fill[key])
+    fill["side"] = fill["side"].upper()
+    return fill
+
+
+def twap_from_update(update: dict) -> dict:
+    """Raw twapHistory entry of a replayed TWAP update."""
+    return {
+        "time": update["time"] // 1000,
+        "state": {
+            "coin": update["coin"],
+            "user": update["user"],
+            "side": update["side"].upper(),
+            "sz": _decimal(update["sz"]),
+            "executedSz": _decimal(update["executedSz"]),
+            "executedNtl": _decimal(update["executedNtl"]),
+            "minutes": update["minutes"],
+            "reduceOnly": update["reduceOnly"],
+            "randomize": update["randomize"],
+            "timestamp": update["timestamp"],
+        },
+        "status": {"status": update["status"]},
+        "twapId": update["twapId"],
+    }
+
+
+def explorer_tx_from_update(update: dict) -> dict:
+    """Raw userDetails transaction of a replayed updateLeverage update."""
+    return {
+        "time": update["time"],
+        "user": update["user"],
+        "action": {
+            "type": "updateLeverage",
+            "asset": update["asset"],
+            "isCross": update["isCross"],
+            "leverage": update["leverage"],
+        },
+        "block": update["block"],
+        "hash": update["hash"],
+        "error": update["error"],
+    }
+
+
+def ledger_update_from_update(update: dict) -> dict:
+    """Raw userNonFundingLedgerUpdates entry of a replayed ledger update."""
+    delta = {
+        key: _decimal(value) if isinstance(value, float) else value
+        for key, value in update["delta"].items()
+    }
+    return {"time": update["time"], "hash": update["hash"], "delta": delta}
+
+
+def hourly_funding(out: List[dict]) -> List[dict]:
+    """
+    Funding paid every hour on the perp positions of a replay timeline.
+
+    Args:
+        out: Replay output of {time, update, new_state}
+
+    Returns:
+        Raw userFunding entries sorted by time
+    """
+
+    funding = []
+    index = 0
+    state = None
+    first_hour = out[0]["time"] // FUNDING_INTERVAL + 1
+    last_hour = out[-1]["time"] // FUNDING_INTERVAL
+    for hour in range(first_hour, last_hour + 1):
+        time_ms = hour * FUNDING_INTERVAL
+        while index < len(out) and out[index]["time"] < time_ms:
+            state = out[index]["new_state"]
+            index += 1
+
+        for coin, position in (state or {}).get("perp_positions", {}).items():
+            if not position["size"]:
+                continue
+            notional = position["size"] * position["entry_price"]
+            funding.append(
+                {
+                    "time": time_ms,
+                    "hash": FUNDING_HASH,
+                    "delta": {
+                        "type": "funding",
+                        "coin": coin,
+                        "usdc": _decimal(-notional * FUNDING_RATE),
+                        "szi": _decimal(position["size"]),
+                        "fundingRate": _decimal(FUNDING_RATE),
+                        "nSamples": None,
+                    },
+                }
+            )
+    return funding
+
+
+def _account_value(state: dict) -> float:
+    positions = [
+        *state["spot_positions"].values(),
+        *state["perp_positions"].values(),
+        *state["vault_positions"].values(),
+    ]
+    return (
+        state["spot_usdc"]
+        + state["perp_usdc"]
+        + sum(position["usdc_value"] for position in positions)
+    )
+
+
+def portfolio_from_timeline(out: List[dict]) -> list:
+    """
+    Raw portfolio response built from the states of a replay timeline.
+
+    Args:
+        out: Replay output of {time, update, new_state}
+
+    Returns:
+        List of [period, {accountValueHistory, pnlHistory, vlm}] pairs
+    """
+
+    end = out[-1]["time"]
+    portfolio = []
+    for period, lookback in PORTFOLIO_PERIODS.items():
+        rows = [row for row in out if lookback is None or row["time"] >= end - lookback]
+        step = max(len(rows) // PORTFOLIO_POINTS, 1)
+        values = [
+            (row["time"], _account_value(row["new_state"])) for row in rows[::step]
+        ]
+        base = values[0][1] if values else 0.0
+        volume = sum(
+            float(row["update"]["px"]) * float(row["update"]["sz"])
+            for row in rows
+            if row["update"].get("name") == "UserFill"
+        )
+        portfolio.append(
+            [
+                period,
+                {
+                    "accountValueHistory": [[t, _decimal(v)] for t, v in values],
+                    "pnlHistory": [[t, _decimal(v - base)] for t, v in values],
+                    "vlm": _decimal(volume),
+                },
+            ]
+        )
+    return portfolio
+
+
+def build_fixture_cache(
+    out_dir: str, pattern: str = DUMP_PATTERN
+) -> Dict[str, Dict[str, int]]:
+    """
+    Write the raw responses of every replay output into a cache directory.
+
+    The layout is the one the loaders fetch into, with full histories in
+    single files as the API returns them, so it can be used as a cache or
+    served by benchmarks.replay_server.
+
+    Args:
+        out_dir: Cache directory to write
+        pattern: Glob of the replay outputs to rebuild
+
+    Returns:
+        Dictionary of address to number of events per endpoint
+    """
+
+    counts = {}
+    for path in sorted(glob.glob(pattern)):
+        out = load_replay_output(path)
+        if not out:
+            continue
+        address = out[0]["new_state"]["user"].lower()
+
+        fills, twaps, ledger, txs = [], [], [], []
+        for row in out:
+            update = row["update"]
+            name = update.get("name")
+            if name == "UserFill":
+                fills.append(fill_from_update(update))
+            elif name == "TWAP":
+                twaps.append(twap_from_update(update))
+            elif name == "updateLeverage":
+                txs.append(explorer_tx_from_update(update))
+            elif "delta" in update:
+                ledger.append(ledger_update_from_update(update))
+
+        funding = hourly_funding(out)
+        files = {
+            # userFills returns the most recent fills first
+            ("user_fills", f"{address}_user_fills_agg.json"): fills[::-1],
+            ("twap", f"{address}_twap_history.json"): twaps,
+            ("user_ledger_updates", f"{address}_ledger_updates.json"): ledger,
+            ("user_funding", f"{address}_user_funding.json"): funding,
+            ("user_explorer", f"{address}_raw.json"): {
+                "type": "userDetails",
+                "txs": txs,
+            },
+            ("portfolio", f"{address}.json"): portfolio_from_timeline(out),
+        }
+        for (folder, name), data in files.items():
+            write_cache_json(os.path.join(out_dir, folder, name), data, indent=None)
+
+        counts[address] = {
+            "fills": len(fills),
+            "twaps": len(twaps),
+            "ledger": len(ledger),
+            "funding": len(funding),
+            "txs": len(txs),
+        }
+        logger.debug(f"Rebuilt {address} from {path}: {counts[address]}")
+
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default="recorded", help="Cache directory to write")
+    parser.add_argument("--pattern", default=DUMP_PATTERN)
+    args = parser.parse_args()
+
+    for address, count in build_fixture_cache(args.out, args.pattern).items():
+        logger.info(f"{address}: {count}")
+
+
+if __name__ == "__main__":
+    main()
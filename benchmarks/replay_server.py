@@ -0,0 +1,223 @@
+"""
+Local stand-in for the Hyperliquid info and explorer endpoints.
+
+Serves responses recorded in a cache directory laid out like the loaders'
+cache, so the fetch path can be benchmarked without network access:
+
+    python -m benchmarks.replay_server --cache-dir recorded --latency-ms 80 --error-rate 0.05
+    HYPERLIQUID_API_URL=http://127.0.0.1:8765 HYPERLIQUID_EXPLORER_URL=http://127.0.0.1:8765 python main.py
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Tuple
+from loguru import logger
+from loaders.historical_orders import order_status_time
+from loaders.twap import twap_time
+from utils.cache import read_cache_json
+from utils.partitions import read_partitions
+from utils.window import event_time, time_window
+
+# Rows the API returns at most for a single history request
+ROW_CAP = 2000
+
+
+@dataclass
+class Faults:
+    """Faults injected into every response."""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    row_cap: int = ROW_CAP
+
+
+def recorded_history(cache_dir: str, folder: str, name: str, key) -> List[dict]:
+    """Full recorded history sorted by time, from month partitions or a single file."""
+    partition_dir = os.path.join(cache_dir, folder, name)
+    if os.path.isdir(partition_dir):
+        return read_partitions(partition_dir, key) or []
+    events = read_cache_json(os.path.join(cache_dir, folder, f"{name}.json")) or []
+    return sorted(events, key=key)
+
+
+def _window(events: List[dict], key, payload: dict) -> List[dict]:
+    # The API treats both bounds as inclusive
+    end_time = payload.get("endTime")
+    return time_window(
+        events,
+        key,
+        payload.get("startTime"),
+        end_time + 1 if end_time is not None else None,
+    )
+
+
+def recorded_response(cache_dir: str, path: str, payload: dict, row_cap: int) -> Any:
+    """
+    Response the API would give for a request, built from recorded data.
+
+    Time ranged requests return the oldest rows of the range first, the
+    others the most recent rows first, both truncated to row_cap.
+
+    Args:
+        cache_dir: Cache directory holding the recorded responses
+        path: Request path, "/info" or "/explorer"
+        payload: JSON request body
+        row_cap: Maximum number of rows in list responses
+
+    Returns:
+        Decoded response body
+    """
+
+    request_type = payload.get("type")
+    address = str(payload.get("user", "")).lower()
+
+    if path.rstrip("/").endswith("explorer"):
+        for suffix in ("raw", "filtered"):
+            details = read_cache_json(
+                os.path.join(cache_dir, "user_explorer", f"{address}_{suffix}.json")
+            )
+            if details is not None:
+                return details
+        return {"type": "userDetails", "txs": []}
+
+    if request_type in ("userFills", "userFillsByTime"):
+        agg_suffix = "_agg" if payload.get("aggregateByTime", True) else "_no_agg"
+        fills = recorded_history(
+            cache_dir, "user_fills", f"{address}_user_fills{agg_suffix}", event_time
+        )
+        if request_type == "userFills":
+            return sorted(fills, key=event_time, reverse=True)[:row_cap]
+        return _window(fills, event_time, payload)[:row_cap]
+
+    elif request_type == "userFunding":
+        funding = recorded_history(
+            cache_dir, "user_funding", f"{address}_user_funding", event_time
+        )
+        return _window(funding, event_time, payload)[:row_cap]
+
+    elif request_type == "userNonFundingLedgerUpdates":
+        ledger = recorded_history(
+            cache_dir, "user_ledger_updates", f"{address}_ledger_updates", event_time
+        )
+        return _window(ledger, event_time, payload)[:row_cap]
+
+    elif request_type == "twapHistory":
+        twaps = recorded_history(
+            cache_dir, "twap", f"{address}_twap_history", twap_time
+        )
+        return twaps[:row_cap]
+
+    elif request_type == "historicalOrders":
+        orders = recorded_history(
+            cache_dir,
+            "historical_orders",
+            f"{address}_historical_orders",
+            order_status_time,
+        )
+        return sorted(orders, key=order_status_time, reverse=True)[:row_cap]
+
+    elif request_type == "portfolio":
+        portfolio_path = os.path.join(cache_dir, "portfolio", f"{address}.json")
+        return read_cache_json(portfolio_path) or []
+
+    raise ValueError(f"Unsupported request type: {request_type}")
+
+
+def make_handler(cache_dir: str, faults: Faults) -> type:
+    """Request handler class bound to a cache directory and fault settings."""
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: Any, headers: dict | None = None) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self) -> None:
+            delay = faults.latency_ms + random.uniform(-1, 1) * faults.jitter_ms
+            time.sleep(max(delay, 0.0) / 1000)
+
+            if random.random() < faults.error_rate:
+                self._send(429, {"error": "rate limited"}, {"Retry-After": "1"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                body = recorded_response(cache_dir, self.path, payload, faults.row_cap)
+            except (ValueError, KeyError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(200, body)
+
+        def log_message(self, format: str, *args) -> None:
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return ReplayHandler
+
+
+def start_replay_server(
+    cache_dir: str,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    faults: Faults | None = None,
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve recorded responses from a background thread.
+
+    Args:
+        cache_dir: Cache directory holding the recorded responses
+        host: Interface to bind
+        port: Port to bind, 0 picks a free one
+        faults: Faults to inject, none by default
+
+    Returns:
+        Tuple of (server, base URL), stop it with server.shutdown()
+    """
+
+    server = ThreadingHTTPServer(
+        (host, port), make_handler(cache_dir, faults or Faults())
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}"
+    logger.info(f"Replaying {cache_dir} on {url}")
+    return server, url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cache-dir", default="cache")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 429 responses"
+    )
+    parser.add_argument("--row-cap", type=int, default=ROW_CAP)
+    args = parser.parse_args()
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.row_cap)
+    server = ThreadingHTTPServer(
+        (args.host, args.port), make_handler(args.cache_dir, faults)
+    )
+    logger.info(f"Replaying {args.cache_dir} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Round trip check of the perp margin accounting.
+
+Replays opening, partly closing and closing a long, a short and a flipped
+position from an empty state, and fails when margin used goes negative, is
+left over once flat, or when USDC is created or lost along the way:
+
+    python -m benchmarks.round_trip
+"""
+
+import argparse
+import sys
+from typing import Dict, List, Tuple
+from loguru import logger
+from models.class_models.user_fills import UserFillsModel
+from transformer.replay import replay_updates
+
+# Round trip -> (signed size, price) of its fills, ending flat
+ROUND_TRIPS: Dict[str, List[Tuple[float, float]]] = {
+    "long": [(1.0, 100.0), (0.5, 104.0), (-0.5, 110.0), (-1.0, 120.0)],
+    "short": [(-1.0, 100.0), (-0.5, 96.0), (0.5, 90.0), (1.0, 80.0)],
+    "flip": [(1.0, 100.0), (-2.0, 110.0), (1.0, 90.0)],
+}
+
+
+def round_trip_fills(trades: List[Tuple[float, float]]) -> List[UserFillsModel]:
+    """
+    Fills of a sequence of trades on one perp asset, with their closed PnL.
+
+    Args:
+        trades: Signed size and price of every trade
+
+    Returns:
+        Fills in time order, without fees
+    """
+
+    fills = []
+    position, entry = 0.0, 0.0
+    for i, (sz, px) in enumerate(trades):
+        closed = min(abs(sz), abs(position)) if position * sz < 0 else 0.0
+        pnl = closed * (px - entry) * (1 if position > 0 else -1)
+        new_position = position + sz
+        if position * new_position <= 0:
+            entry = px
+        elif abs(new_position) > abs(position):
+            entry = (entry * abs(position) + px * abs(sz)) / abs(new_position)
+        if position == 0 or (position > 0 and sz > 0) or (position < 0 and sz < 0):
+            direction = "Open Long" if sz > 0 else "Open Short"
+        else:
+            direction = "Close Long" if position > 0 else "Close Short"
+
+        fills.append(
+            UserFillsModel(
+                coin="HYPE",
+                px=px,
+                sz=abs(sz),
+                side="b" if sz > 0 else "a",
+                time=(i + 1) * 1_000_000,
+                startPosition=position,
+                dir=direction,
+                closedPnl=pnl,
+                hash=f"0x{i:064x}",
+                crossed=True,
+                fee=0.0,
+                tid=i,
+                feeToken="USDC",
+            )
+        )
+        position = new_position
+    return fills
+
+
+def check_round_trips() -> Dict[str, List[str]]:
+    """
+    Problems found when replaying every round trip.
+
+    Returns:
+        Dictionary of round trip to problems, empty when all pass
+    """
+
+    problems = {}
+    for name, trades in ROUND_TRIPS.items():
+        fills = round_trip_fills(trades)
+        state, out = replay_updates(name, fills)
+        issues = []
+
+        for entry in out:
+            margin = entry["new_state"]["margins"].get("HYPE", {})
+            if margin.get("margin_used", 0.0) < -1e-9:
+                issues.append(f"margin used {margin['margin_used']} at {entry['time']}")
+
+        margin_used = state.margins["HYPE"].margin_used
+        if abs(margin_used) > 1e-9:
+            issues.append(f"margin used {margin_used} once flat")
+        pnl = sum(fill.closedPnl for fill in fills)
+        if abs(state.perp_usdc - pnl) > 1e-9:
+            issues.append(f"perp USDC {state.perp_usdc} once flat, closed PnL {pnl}")
+
+        if issues:
+            problems[name] = issues
+        logger.info(f"{name}: margin used {margin_used}, perp USDC {state.perp_usdc}")
+    return problems
+
+
+def main() -> None:
+    argparse.ArgumentParser(description=__doc__.strip().splitlines()[0]).parse_args()
+
+    problems = check_round_trips()
+    for name, issues in problems.items():
+        for issue in issues:
+            logger.error(f"{name} round trip: {issue}")
+    if problems:
+        sys.exit(1)
+    logger.success("Every round trip ends flat with no margin used")
+
+
+if __name__ == "__main__":
+    main()
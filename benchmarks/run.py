@@ -0,0 +1,391 @@
+"""
+Stage timings of the fetch, parse, replay and output pipeline on fixtures.
+
+Fixture caches are rebuilt from the user_state_*.json replay outputs and
+served by benchmarks.replay_server, then every stage is timed on its own and
+compared against the baseline:
+
+    python -m benchmarks.run                    # compare, exit 1 on a regression
+    python -m benchmarks.run --update-baseline  # record a new baseline
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+import polars as pl
+from cchecksum import to_checksum_address
+from loguru import logger
+import config
+import utils.http
+import utils.window
+from benchmarks.fixtures import ROOT_DIR, build_fixture_cache
+from benchmarks.replay_server import start_replay_server
+from loaders.actions import generate_positions
+from loaders.explorer import get_user_explorer_json, get_user_explorer_pydantic
+from loaders.portfolio import combine_portfolios, get_portfolio, get_portfolio_json
+from loaders.twap import (
+    get_twap_history_dataframe,
+    get_twap_history_json,
+    get_twap_history_pydantic,
+)
+from loaders.user_fills import (
+    get_user_fills_dataframe,
+    get_user_fills_json,
+    get_user_fills_pydantic,
+)
+from loaders.user_funding import (
+    get_user_funding_dataframe,
+    get_user_funding_json,
+    get_user_funding_pydantic,
+)
+from loaders.user_ledger_updates import (
+    get_user_ledger_updates_dataframe,
+    get_user_ledger_updates_json,
+    get_user_ledger_updates_pydantic,
+)
+from transformer.replay import replay_updates
+from transformer.twap import build_twap_fill_index, link_twap_fills
+from viz.portfolio import visualize_portfolio
+
+BASELINE_PATH = os.path.join(ROOT_DIR, "benchmarks", "baseline.json")
+
+# A stage regresses when its median exceeds baseline * max_ratio, and by more
+# than MIN_REGRESSION_SECONDS so sub-millisecond stages do not flap on noise
+DEFAULT_MAX_RATIO = 1.25
+MIN_REGRESSION_SECONDS = 0.005
+
+
+@dataclass
+class Stage:
+    """A benchmarked stage, setup runs untimed before every repetition."""
+
+    name: str
+    run: Callable[[dict], None]
+    setup: Callable[[dict], None] | None = None
+
+
+def _clear_time_indexes(ctx: dict) -> None:
+    # Parse stages measure reading the cache, not the in-process memo
+    utils.window._time_indexes.clear()
+
+
+def _clear_cache(ctx: dict) -> None:
+    shutil.rmtree(config.cache_dir, ignore_errors=True)
+    _clear_time_indexes(ctx)
+
+
+def fetch(ctx: dict) -> None:
+    """Every endpoint of every address through the local API stand-in."""
+    for address in ctx["addresses"]:
+        get_user_fills_json(address, use_cache=False)
+        get_user_funding_json(address, use_cache=False)
+        get_user_ledger_updates_json(address, use_cache=False)
+        get_twap_history_json(address, use_cache=False)
+        get_user_explorer_json(address, use_cache=False)
+        get_portfolio_json(address, use_cache=False)
+
+
+def parse_pydantic(ctx: dict) -> None:
+    """Cached JSON into the update models of the replay."""
+    ctx["models"] = {
+        address: {
+            "fills": get_user_fills_pydantic(address),
+            "funding": get_user_funding_pydantic(address),
+            "ledger": get_user_ledger_updates_pydantic(address),
+            "twaps": get_twap_history_pydantic(address),
+            "margin": get_user_explorer_pydantic(address),
+        }
+        for address in ctx["addresses"]
+    }
+
+
+def parse_dataframe(ctx: dict) -> None:
+    """Cached JSON into Polars frames."""
+    for address in ctx["addresses"]:
+        get_user_fills_dataframe(address)
+        get_user_funding_dataframe(address)
+        get_user_ledger_updates_dataframe(address)
+        get_twap_history_dataframe(address)
+    ctx["portfolios"] = [
+        get_portfolio(address).filter(pl.col("period") == "allTime")
+        for address in ctx["addresses"]
+    ]
+
+
+def actions(ctx: dict) -> None:
+    """Actions CSV exports into position histories, without the Parquet sidecar."""
+    for address in ctx["action_addresses"]:
+        generate_positions(address, use_cache=False)
+
+
+def merge(ctx: dict) -> None:
+    """TWAP linking, concatenation and time sort, as in get_user_updates."""
+    ctx["updates"] = {}
+    for address, models in ctx["models"].items():
+        twaps, _ = link_twap_fills(
+            models["twaps"], build_twap_fill_index(models["fills"])
+        )
+        updates = [
+            *twaps,
+            *models["funding"],
+            *models["fills"],
+            *models["ledger"],
+            *models["margin"],
+        ]
+        ctx["updates"][address] = sorted(updates, key=lambda x: x.time)
+
+
+def replay(ctx: dict) -> None:
+    """Per event replay through the transformers."""
+    ctx["out"] = {
+        address: replay_updates(address, updates)[1]
+        for address, updates in ctx["updates"].items()
+    }
+
+
+def combine(ctx: dict) -> None:
+    """combine_portfolios over the allTime portfolio of every address."""
+    ctx["combined"] = combine_portfolios(ctx["portfolios"])
+
+
+def visualize(ctx: dict) -> None:
+    """Altair spec building for every portfolio and the combined one."""
+    ctx["charts"] = [
+        visualize_portfolio(portfolio).to_dict()
+        for portfolio in [*ctx["portfolios"], ctx["combined"]]
+    ]
+
+
+def serialize(ctx: dict) -> None:
+    """Replay timelines and chart specs to JSON, as main.py writes them."""
+    for out in ctx["out"].values():
+        json.dumps(out, indent=2)
+    for chart in ctx["charts"]:
+        json.dumps(chart)
+
+
+STAGES = [
+    Stage("fetch", fetch, _clear_cache),
+    Stage("parse_pydantic", parse_pydantic, _clear_time_indexes),
+    Stage("parse_dataframe", parse_dataframe, _clear_time_indexes),
+    Stage("actions", actions),
+    Stage("merge", merge),
+    Stage("replay", replay),
+    Stage("combine_portfolios", combine),
+    Stage("visualize", visualize),
+    Stage("serialize", serialize),
+]
+
+
+def time_stage(stage: Stage, ctx: dict, repeat: int) -> List[float]:
+    """Wall clock seconds of each repetition of a stage, after one warmup run."""
+    durations = []
+    for i in range(repeat + 1):
+        if stage.setup is not None:
+            stage.setup(ctx)
+        start = time.perf_counter()
+        stage.run(ctx)
+        if i > 0:
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def prepare_workdir(workdir: str) -> dict:
+    """
+    Build fixtures in a working directory and point the loaders at them.
+
+    Args:
+        workdir: Directory the loaders' relative cache and src paths resolve in
+
+    Returns:
+        Context shared by the stages
+    """
+
+    os.chdir(workdir)
+    counts = build_fixture_cache("recorded")
+
+    # get_actions looks exports up by checksummed address
+    os.makedirs("src", exist_ok=True)
+    for csv_path in glob.glob(os.path.join(ROOT_DIR, "src", "*.csv")):
+        address = os.path.splitext(os.path.basename(csv_path))[0]
+        shutil.copy(csv_path, os.path.join("src", f"{to_checksum_address(address)}.csv"))
+
+    server, url = start_replay_server("recorded")
+    config.api_url = url
+    config.explorer_url = url
+    # The stand-in has no rate limit, the shared bucket would only add sleeps
+    utils.http.rate_limit_weight_per_minute = 10**9
+
+    return {
+        "server": server,
+        "counts": counts,
+        "addresses": list(counts),
+        "action_addresses": [
+            os.path.splitext(os.path.basename(path))[0]
+            for path in sorted(glob.glob(os.path.join("src", "*.csv")))
+        ],
+    }
+
+
+def run_benchmarks(repeat: int = 5, stages: List[str] | None = None) -> dict:
+    """
+    Time every stage on fixtures in a temporary directory.
+
+    Stages depend on the output of the previous ones, so a selection still
+    runs the stages before it, untimed.
+
+    Args:
+        repeat: Timed repetitions per stage
+        stages: Names of the stages to report, all by default
+
+    Returns:
+        Results with per stage runs, min, median and max in seconds
+    """
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="hyliq-bench-")
+    ctx = None
+    try:
+        ctx = prepare_workdir(workdir)
+        results = {}
+        for stage in STAGES:
+            if stages is not None and stage.name not in stages:
+                if stage.setup is not None:
+                    stage.setup(ctx)
+                stage.run(ctx)
+                continue
+            durations = time_stage(stage, ctx, repeat)
+            results[stage.name] = {
+                "min": min(durations),
+                "median": statistics.median(durations),
+                "max": max(durations),
+                "runs": durations,
+            }
+            logger.info(f"{stage.name}: {results[stage.name]['median'] * 1000:.1f} ms")
+
+        return {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "events": ctx["counts"],
+            "stages": results,
+        }
+    finally:
+        # The replay server is only running once the fixtures are built
+        if ctx is not None:
+            ctx["server"].shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_to_baseline(results: dict, baseline: dict) -> List[str]:
+    """
+    Stages slower than their baseline threshold.
+
+    Args:
+        results: Output of run_benchmarks
+        baseline: Baseline file content
+
+    Returns:
+        Descriptions of the regressed stages
+    """
+
+    regressions = []
+    for name, result in results["stages"].items():
+        reference = baseline["stages"].get(name)
+        if reference is None:
+            logger.warning(f"No baseline for stage {name}")
+            continue
+        limit = max(
+            reference["median"] * reference.get("max_ratio", DEFAULT_MAX_RATIO),
+            reference["median"] + MIN_REGRESSION_SECONDS,
+        )
+        ratio = result["median"] / reference["median"]
+        if result["median"] > limit:
+            regressions.append(
+                f"{name}: {result['median'] * 1000:.1f} ms, {ratio:.2f}x baseline "
+                f"{reference['median'] * 1000:.1f} ms"
+            )
+        logger.info(f"{name}: {ratio:.2f}x baseline")
+    return regressions
+
+
+def write_baseline(results: dict, path: str = BASELINE_PATH) -> None:
+    """Store results as the new baseline, keeping thresholds tuned by hand."""
+    previous = {}
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            previous = json.load(f).get("stages", {})
+
+    baseline = {
+        key: value for key, value in results.items() if key != "stages"
+    }
+    baseline["stages"] = {
+        name: {
+            "median": result["median"],
+            "min": result["min"],
+            "max_ratio": previous.get(name, {}).get("max_ratio", DEFAULT_MAX_RATIO),
+        }
+        for name, result in results["stages"].items()
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def _benchmark_records(record: dict) -> bool:
+    return record["name"] == __name__ or record["name"].startswith("benchmarks")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stage", action="append", help="Only report this stage")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Show loader logs")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(
+        sys.stderr,
+        level="INFO",
+        filter=None if args.verbose else _benchmark_records,
+    )
+
+    results = run_benchmarks(args.repeat, args.stage)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        write_baseline(results, args.baseline)
+        logger.info(f"Wrote baseline {args.baseline}")
+        return
+
+    if not os.path.isfile(args.baseline):
+        logger.error(f"No baseline at {args.baseline}, run with --update-baseline")
+        sys.exit(2)
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    regressions = compare_to_baseline(results, baseline)
+    for regression in regressions:
+        logger.error(f"Regression in {regression}")
+    if regressions:
+        sys.exit(1)
+    logger.success("No stage regressed")
+
+
+if __name__ == "__main__":
+    main()
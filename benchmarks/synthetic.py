@@ -0,0 +1,479 @@
+"""
+Seeded synthetic Hyperliquid histories at market maker scale.
+
+Generates raw API shaped fills, funding, non-funding ledger updates, TWAP
+history and explorer transactions that are consistent with each other, and
+writes them straight into the cache layout so the loaders and the replay can
+be stress tested without the API:
+
+    python -m benchmarks.synthetic --out cache --fills 200000 --months 12 --seed 7
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+from loguru import logger
+from utils.cache import write_cache_json
+from utils.partitions import month_key, write_partitions
+from utils.window import event_time
+
+# Perp asset id and spot pair of each generated coin, as in constants/coin_id.py
+PERP_ASSETS = {"HYPE": 159, "PUMP": 200, "FARTCOIN": 165, "XPL": 203}
+SPOT_PAIRS = {"HYPE": "@107", "PUMP": "@188", "FARTCOIN": "@162", "XPL": "@210"}
+START_PRICES = {"HYPE": 38.0, "PUMP": 0.005, "FARTCOIN": 0.8, "XPL": 0.9}
+
+FUNDING_INTERVAL = 3_600_000
+FUNDING_HASH = "0x" + "0" * 64
+TAKER_FEE = 0.00045
+MAKER_FEE = 0.00015
+
+
+@dataclass
+class SyntheticConfig:
+    """Shape of a generated history."""
+
+    seed: int = 0
+    fills: int = 20_000
+    start_time: int = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    months: int = 6
+    coins: List[str] = field(default_factory=lambda: list(PERP_ASSETS))
+    # Share of fills on spot pairs instead of perps
+    spot_share: float = 0.2
+    # Share of fills executed as TWAP slices
+    twap_share: float = 0.1
+    twap_slices: int = 20
+    # One ledger update every ledger_every fills on average
+    ledger_every: int = 200
+    # Position size, in notional USDC, the strategy keeps around
+    target_notional: float = 250_000.0
+    volatility: float = 0.002
+
+    @property
+    def end_time(self) -> int:
+        """Exclusive end of the history in ms."""
+        return self.start_time + self.months * 30 * 86_400_000
+
+
+def synthetic_address(seed: int, index: int = 0) -> str:
+    """Deterministic address of the index-th generated account."""
+    return "0x" + hashlib.sha1(f"synthetic:{seed}:{index}".encode()).hexdigest()
+
+
+def _decimal(value: float, digits: int = 8) -> str:
+    """Numbers are strings in API responses."""
+    return str(round(value, digits))
+
+
+class _Account:
+    """Positions, balances and counters the generated events must agree with."""
+
+    def __init__(self, config: SyntheticConfig, address: str):
+        self.config = config
+        self.address = address
+        self.rng = random.Random(config.seed)
+        self.prices = {coin: START_PRICES[coin] for coin in config.coins}
+        self.perp = {coin: 0.0 for coin in config.coins}
+        self.entry = {coin: 0.0 for coin in config.coins}
+        self.spot = {coin: 0.0 for coin in config.coins}
+        self.tid = self.rng.randrange(10**14, 10**15)
+        self.oid = self.rng.randrange(10**10, 10**11)
+        self.twap_id = self.rng.randrange(10**5, 10**6)
+        self.block = self.rng.randrange(10**8, 10**9)
+        self.nonce = 0
+
+    def hash(self) -> str:
+        return f"0x{self.rng.getrandbits(256):064x}"
+
+    def move_prices(self) -> None:
+        for coin, price in self.prices.items():
+            self.prices[coin] = price * math.exp(
+                self.rng.gauss(0.0, self.config.volatility)
+            )
+
+    def size(self, coin: str) -> float:
+        """Order size around a fiftieth of the target notional."""
+        notional = self.config.target_notional / 50 * self.rng.lognormvariate(0, 0.5)
+        return float(f"{notional / self.prices[coin]:.4g}")
+
+    def perp_fill(
+        self, time_ms: int, coin: str, is_buy: bool, sz: float, twap_id: int | None
+    ) -> dict:
+        """Fill of a perp order, never crossing through zero in one fill."""
+        position = self.perp[coin]
+        px = float(f"{self.prices[coin]:.5g}")
+        closing = position != 0 and (position > 0) != is_buy
+        if closing:
+            sz = min(sz, abs(position))
+
+        closed_pnl = 0.0
+        if closing:
+            direction = 1 if position > 0 else -1
+            closed_pnl = (px - self.entry[coin]) * sz * direction
+            dir = "Close Long" if position > 0 else "Close Short"
+        else:
+            total = abs(position) + sz
+            self.entry[coin] = (self.entry[coin] * abs(position) + px * sz) / total
+            dir = "Open Long" if is_buy else "Open Short"
+
+        signed = sz if is_buy else -sz
+        new_position = round(position + signed, 8)
+        self.perp[coin] = new_position
+        if new_position == 0:
+            self.entry[coin] = 0.0
+
+        crossed = twap_id is None and self.rng.random() < 0.3
+        fee = px * sz * (TAKER_FEE if crossed or twap_id is not None else MAKER_FEE)
+        return self._fill(
+            time_ms, coin, px, sz, is_buy, position, dir, closed_pnl, crossed,
+            fee, "USDC", twap_id,
+        )
+
+    def spot_fill(self, time_ms: int, coin: str, is_buy: bool, sz: float) -> dict:
+        """Fill on a spot pair, sells never exceed the balance."""
+        balance = self.spot[coin]
+        if not is_buy:
+            sz = min(sz, balance)
+        px = float(f"{self.prices[coin]:.5g}")
+        self.spot[coin] = round(balance + (sz if is_buy else -sz), 8)
+
+        crossed = self.rng.random() < 0.3
+        # Spot fees are paid in the received token
+        fee_rate = TAKER_FEE if crossed else MAKER_FEE
+        fee = sz * fee_rate if is_buy else px * sz * fee_rate
+        fee_token = coin if is_buy else "USDC"
+        return self._fill(
+            time_ms, SPOT_PAIRS[coin], px, sz, is_buy, balance,
+            "Buy" if is_buy else "Sell", 0.0, crossed, fee, fee_token, None,
+        )
+
+    def _fill(
+        self, time_ms, coin, px, sz, is_buy, start, dir, closed_pnl, crossed, fee,
+        fee_token, twap_id,
+    ) -> dict:
+        self.tid += self.rng.randrange(1, 1000)
+        self.oid += 1
+        return {
+            "coin": coin,
+            "px": _decimal(px),
+            "sz": _decimal(sz),
+            "side": "B" if is_buy else "A",
+            "time": time_ms,
+            "startPosition": _decimal(start),
+            "dir": dir,
+            "closedPnl": _decimal(closed_pnl, 6),
+            "hash": FUNDING_HASH if twap_id is not None else self.hash(),
+            "oid": self.oid,
+            "crossed": crossed,
+            "fee": _decimal(fee, 6),
+            "tid": self.tid,
+            "feeToken": fee_token,
+            "twapId": twap_id,
+        }
+
+    def is_buy(self, coin: str, spot: bool) -> bool:
+        """Side leaning back towards the target exposure."""
+        if spot:
+            # Spot inventory hovers around a tenth of the target, never short
+            if self.spot[coin] <= 0:
+                return True
+            notional = self.spot[coin] * self.prices[coin]
+            notional -= self.config.target_notional / 10
+        else:
+            notional = self.perp[coin] * self.prices[coin]
+        lean = max(-0.4, min(0.4, notional / self.config.target_notional * 0.4))
+        return self.rng.random() < 0.5 - lean
+
+    def funding(self, time_ms: int) -> List[dict]:
+        """Funding on every open perp position at an hour boundary."""
+        events = []
+        for coin, szi in self.perp.items():
+            if szi == 0:
+                continue
+            rate = self.rng.gauss(0.0000125, 0.00002)
+            events.append(
+                {
+                    "time": time_ms,
+                    "hash": FUNDING_HASH,
+                    "delta": {
+                        "type": "funding",
+                        "coin": coin,
+                        "usdc": _decimal(-szi * self.prices[coin] * rate, 6),
+                        "szi": _decimal(szi),
+                        "fundingRate": _decimal(rate, 10),
+                        "nSamples": None,
+                    },
+                }
+            )
+        return events
+
+    def ledger_update(self, time_ms: int) -> dict:
+        """Deposit, withdrawal or transfer between the spot and perp accounts."""
+        usdc = self.config.target_notional * self.rng.uniform(0.01, 0.1)
+        kind = self.rng.choices(
+            ["deposit", "withdraw", "toPerp", "toSpot"], weights=[3, 2, 2, 2]
+        )[0]
+        if kind == "deposit":
+            delta = {"type": "deposit", "usdc": _decimal(usdc, 2)}
+        elif kind == "withdraw":
+            self.nonce += 1
+            delta = {
+                "type": "withdraw",
+                "usdc": _decimal(usdc, 2),
+                "nonce": time_ms + self.nonce,
+                "fee": "1.0",
+            }
+        else:
+            delta = {
+                "type": "accountClassTransfer",
+                "usdc": _decimal(usdc, 2),
+                "toPerp": kind == "toPerp",
+            }
+        return {"time": time_ms, "hash": self.hash(), "delta": delta}
+
+    def leverage_tx(self, time_ms: int, coin: str) -> dict:
+        self.block += self.rng.randrange(1, 5000)
+        return {
+            "time": time_ms,
+            "user": self.address,
+            "action": {
+                "type": "updateLeverage",
+                "asset": PERP_ASSETS[coin],
+                "isCross": self.rng.random() < 0.8,
+                "leverage": self.rng.choice([3, 5, 10, 20]),
+            },
+            "block": self.block,
+            "hash": self.hash(),
+            "error": None,
+        }
+
+    def twap_entry(
+        self, start_ms: int, time_ms: int, coin: str, is_buy: bool, sz: float,
+        minutes: int, twap_id: int, status: str, executed_sz: float,
+        executed_ntl: float,
+    ) -> dict:
+        return {
+            "time": time_ms // 1000,
+            "state": {
+                "coin": coin,
+                "user": self.address,
+                "side": "B" if is_buy else "A",
+                "sz": _decimal(sz),
+                "executedSz": _decimal(executed_sz),
+                "executedNtl": _decimal(executed_ntl, 6),
+                "minutes": minutes,
+                "reduceOnly": False,
+                "randomize": True,
+                "timestamp": start_ms,
+            },
+            "status": {"status": status},
+            "twapId": twap_id,
+        }
+
+
+def generate_events(
+    config: SyntheticConfig, address: str | None = None
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Events of one synthetic account in time order.
+
+    Positions carry over between fills, so every fill's startPosition,
+    direction and closed PnL follow from the fills before it. TWAP slices
+    share their parent's twapId and add up to its finished executedSz, and
+    funding is paid hourly on the positions open at that hour.
+
+    Args:
+        config: Shape of the history
+        address: Account address, derived from the seed by default
+
+    Yields:
+        Tuples of (event kind, raw event), kinds as in loaders.event_store
+    """
+
+    address = address or synthetic_address(config.seed)
+    account = _Account(config, address)
+    rng = account.rng
+
+    # Deposit and leverage settings before trading starts
+    time_ms = config.start_time
+    yield "user_ledger_updates", {
+        "time": time_ms,
+        "hash": account.hash(),
+        "delta": {"type": "deposit", "usdc": _decimal(config.target_notional, 2)},
+    }
+    for coin in config.coins:
+        time_ms += 1
+        yield "user_explorer_txs", account.leverage_tx(time_ms, coin)
+
+    gap = (config.end_time - config.start_time) / max(config.fills, 1)
+    next_funding = (time_ms // FUNDING_INTERVAL + 1) * FUNDING_INTERVAL
+    fills = 0
+    while fills < config.fills:
+        time_ms += max(int(rng.expovariate(1 / gap)), 1)
+        if time_ms >= config.end_time:
+            break
+
+        while next_funding <= time_ms:
+            for event in account.funding(next_funding):
+                yield "user_funding", event
+            next_funding += FUNDING_INTERVAL
+
+        account.move_prices()
+        coin = rng.choice(config.coins)
+
+        if rng.random() < config.twap_share / config.twap_slices:
+            # A TWAP executes as evenly spaced slices of the same coin and side
+            is_buy = account.is_buy(coin, spot=False)
+            slices = min(config.twap_slices, config.fills - fills)
+            minutes = max(slices // 2, 1)
+            account.twap_id += 1
+            twap_id = account.twap_id
+            start_ms = time_ms
+            sz = account.size(coin) * slices
+            yield "twap_history", account.twap_entry(
+                start_ms, start_ms, coin, is_buy, sz, minutes, twap_id,
+                "activated", 0.0, 0.0,
+            )
+
+            executed_sz = executed_ntl = 0.0
+            step = minutes * 60_000 // slices
+            for _ in range(slices):
+                time_ms += step
+                fill = account.perp_fill(
+                    time_ms, coin, is_buy, sz / slices, twap_id
+                )
+                executed_sz += float(fill["sz"])
+                executed_ntl += float(fill["sz"]) * float(fill["px"])
+                fills += 1
+                yield "user_fills", fill
+
+            time_ms += 1
+            yield "twap_history", account.twap_entry(
+                start_ms, time_ms, coin, is_buy, sz, minutes, twap_id,
+                "finished", executed_sz, executed_ntl,
+            )
+            continue
+
+        spot = rng.random() < config.spot_share
+        is_buy = account.is_buy(coin, spot)
+        sz = account.size(coin)
+        if spot:
+            fill = account.spot_fill(time_ms, coin, is_buy, sz)
+        else:
+            fill = account.perp_fill(time_ms, coin, is_buy, sz, None)
+        if float(fill["sz"]) == 0:
+            continue
+        fills += 1
+        yield "user_fills", fill
+
+        if rng.random() < 1 / config.ledger_every:
+            time_ms += 1
+            yield "user_ledger_updates", account.ledger_update(time_ms)
+        if rng.random() < 1 / (config.ledger_every * 10):
+            time_ms += 1
+            yield "user_explorer_txs", account.leverage_tx(time_ms, coin)
+
+
+def write_synthetic_cache(
+    cache_dir: str, config: SyntheticConfig, address: str | None = None
+) -> Dict[str, int]:
+    """
+    Generate an account and write it into the loaders' cache layout.
+
+    Fills and funding go straight into month partitions, one month at a
+    time, so memory stays bounded by a month of events whatever the scale.
+    Ledger updates, TWAP history and explorer transactions are single files.
+
+    Args:
+        cache_dir: Cache directory to write into
+        config: Shape of the history
+        address: Account address, derived from the seed by default
+
+    Returns:
+        Number of events written per kind
+    """
+
+    address = (address or synthetic_address(config.seed)).lower()
+    partition_dirs = {
+        "user_fills": os.path.join(cache_dir, "user_fills", f"{address}_user_fills_agg"),
+        "user_funding": os.path.join(cache_dir, "user_funding", f"{address}_user_funding"),
+    }
+    months: Dict[str, list] = {kind: [] for kind in partition_dirs}
+    current_month = None
+    singles: Dict[str, list] = {
+        "user_ledger_updates": [],
+        "twap_history": [],
+        "user_explorer_txs": [],
+    }
+    counts = {kind: 0 for kind in [*partition_dirs, *singles]}
+
+    def flush_months() -> None:
+        for kind, events in months.items():
+            if events:
+                write_partitions(
+                    partition_dirs[kind], events, event_time, now=config.end_time
+                )
+                months[kind] = []
+
+    for kind, event in generate_events(config, address):
+        counts[kind] += 1
+        if kind in months:
+            month = month_key(event["time"])
+            if month != current_month:
+                flush_months()
+                current_month = month
+            months[kind].append(event)
+        else:
+            singles[kind].append(event)
+    flush_months()
+
+    write_cache_json(
+        os.path.join(cache_dir, "user_ledger_updates", f"{address}_ledger_updates.json"),
+        singles["user_ledger_updates"],
+        indent=None,
+    )
+    write_cache_json(
+        os.path.join(cache_dir, "twap", f"{address}_twap_history.json"),
+        singles["twap_history"],
+        indent=None,
+    )
+    details = {"type": "userDetails", "txs": singles["user_explorer_txs"]}
+    for suffix in ("raw", "filtered"):
+        write_cache_json(
+            os.path.join(cache_dir, "user_explorer", f"{address}_{suffix}.json"),
+            details,
+            indent=None,
+        )
+
+    logger.info(f"Generated {address}: {counts}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default="cache", help="Cache directory to write into")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--fills", type=int, default=SyntheticConfig.fills)
+    parser.add_argument("--months", type=int, default=SyntheticConfig.months)
+    parser.add_argument("--spot-share", type=float, default=SyntheticConfig.spot_share)
+    parser.add_argument("--twap-share", type=float, default=SyntheticConfig.twap_share)
+    args = parser.parse_args()
+
+    for index in range(args.accounts):
+        config = SyntheticConfig(
+            seed=args.seed + index,
+            fills=args.fills,
+            months=args.months,
+            spot_share=args.spot_share,
+            twap_share=args.twap_share,
+        )
+        write_synthetic_cache(args.out, config, synthetic_address(args.seed, index))
+
+
+if __name__ == "__main__":
+    main()
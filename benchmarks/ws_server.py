@@ -0,0 +1,292 @@
+"""
+Local stand-in for the Hyperliquid websocket API.
+
+Answers user subscriptions with a snapshot of the events recorded in a cache
+directory before --start-time, then streams the later ones one message at a
+time, so the live mode can be exercised without network access:
+
+    python -m benchmarks.ws_server --cache-dir recorded --start-time 1756684800000 --interval-ms 50
+    python -m transformer.live 0x1c020f03305acd09994c1910d440646e4a5f91b0 --url http://127.0.0.1:8766
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+from typing import Any, List, Tuple
+from loguru import logger
+from benchmarks.replay_server import recorded_history
+from utils.window import event_time
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Events sent in the snapshot that answers a subscription
+SNAPSHOT_ROWS = 50
+
+
+def recorded_channel_events(
+    cache_dir: str, subscription: dict
+) -> Tuple[str, List[dict]]:
+    """
+    Data field and websocket shaped events recorded for a user subscription.
+
+    Args:
+        cache_dir: Cache directory holding the recorded responses
+        subscription: Subscription sent by the client
+
+    Returns:
+        Tuple of (data field, events sorted by time)
+    """
+
+    address = subscription["user"].lower()
+    channel = subscription["type"]
+
+    if channel == "userFills":
+        agg_suffix = "_agg" if subscription.get("aggregateByTime", False) else "_no_agg"
+        return "fills", recorded_history(
+            cache_dir, "user_fills", f"{address}_user_fills{agg_suffix}", event_time
+        )
+
+    elif channel == "userFundings":
+        funding = recorded_history(
+            cache_dir, "user_funding", f"{address}_user_funding", event_time
+        )
+        # The websocket sends funding flat, without hash or delta
+        return "fundings", [
+            {
+                "time": event["time"],
+                "coin": event["delta"]["coin"],
+                "usdc": event["delta"]["usdc"],
+                "szi": event["delta"]["szi"],
+                "fundingRate": event["delta"]["fundingRate"],
+            }
+            for event in funding
+        ]
+
+    elif channel == "userNonFundingLedgerUpdates":
+        return "nonFundingLedgerUpdates", recorded_history(
+            cache_dir, "user_ledger_updates", f"{address}_ledger_updates", event_time
+        )
+
+    raise ValueError(f"Unsupported subscription type: {channel}")
+
+
+def encode_frame(payload: bytes, opcode: int = OP_TEXT) -> bytes:
+    """Unmasked server frame holding a whole message."""
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 1 << 16:
+        header += bytes([126]) + struct.pack("!H", length)
+    else:
+        header += bytes([127]) + struct.pack("!Q", length)
+    return header + payload
+
+
+def _read_exact(rfile, size: int) -> bytes:
+    data = rfile.read(size)
+    if len(data) < size:
+        raise ConnectionError("Websocket closed by the client")
+    return data
+
+
+def read_frame(rfile) -> Tuple[int, bytes]:
+    """Opcode and unmasked payload of the next client frame."""
+    first, second = _read_exact(rfile, 2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", _read_exact(rfile, 2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", _read_exact(rfile, 8))[0]
+    mask = _read_exact(rfile, 4) if second & 0x80 else b"\x00" * 4
+    payload = _read_exact(rfile, length)
+    return first & 0x0F, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+def make_handler(
+    cache_dir: str, start_time: int | None, interval_ms: float, snapshot_rows: int
+) -> type:
+    """Connection handler class bound to a cache directory and stream settings."""
+
+    class ReplayWebsocketHandler(socketserver.StreamRequestHandler):
+        def setup(self) -> None:
+            super().setup()
+            self.send_lock = threading.Lock()
+            self.closed = threading.Event()
+
+        def send_json(self, message: Any, opcode: int = OP_TEXT) -> None:
+            frame = encode_frame(json.dumps(message).encode(), opcode)
+            with self.send_lock:
+                self.wfile.write(frame)
+                self.wfile.flush()
+
+        def handshake(self) -> bool:
+            headers = {}
+            request_line = self.rfile.readline().decode()
+            while True:
+                line = self.rfile.readline().decode().strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            key = headers.get("sec-websocket-key")
+            if key is None or not request_line.startswith("GET"):
+                self.wfile.write(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+                return False
+
+            accept = base64.b64encode(
+                hashlib.sha1((key + WS_GUID).encode()).digest()
+            ).decode()
+            self.wfile.write(
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+            )
+            self.wfile.flush()
+            return True
+
+        def stream(self, subscription: dict) -> None:
+            """Send the snapshot, then the recorded events after start_time."""
+            try:
+                field, events = recorded_channel_events(cache_dir, subscription)
+            except ValueError as e:
+                self.send_json({"channel": "error", "data": str(e)})
+                return
+
+            data = {"user": subscription["user"].lower()}
+            split = len(events)
+            if start_time is not None:
+                split = next(
+                    (i for i, event in enumerate(events) if event["time"] >= start_time),
+                    len(events),
+                )
+            snapshot = events[max(split - snapshot_rows, 0) : split]
+            self.send_json(
+                {
+                    "channel": subscription["type"],
+                    "data": {**data, "isSnapshot": True, field: snapshot[::-1]},
+                }
+            )
+
+            for event in events[split:]:
+                if self.closed.wait(interval_ms / 1000):
+                    return
+                self.send_json(
+                    {"channel": subscription["type"], "data": {**data, field: [event]}}
+                )
+            logger.debug(f"Streamed {len(events) - split} {subscription['type']} events")
+
+        def handle(self) -> None:
+            if not self.handshake():
+                return
+            with self.send_lock:
+                self.wfile.write(encode_frame(b"Websocket connection established."))
+
+            try:
+                while True:
+                    opcode, payload = read_frame(self.rfile)
+                    if opcode == OP_CLOSE:
+                        with self.send_lock:
+                            self.wfile.write(encode_frame(payload[:2], OP_CLOSE))
+                        break
+                    elif opcode == OP_PING:
+                        with self.send_lock:
+                            self.wfile.write(encode_frame(payload, OP_PONG))
+                        continue
+                    elif opcode != OP_TEXT:
+                        continue
+
+                    message = json.loads(payload)
+                    if message.get("method") == "ping":
+                        self.send_json({"channel": "pong"})
+                    elif message.get("method") == "subscribe":
+                        subscription = message["subscription"]
+                        self.send_json(
+                            {"channel": "subscriptionResponse", "data": message}
+                        )
+                        threading.Thread(
+                            target=self.stream, args=(subscription,), daemon=True
+                        ).start()
+            except (ConnectionError, OSError):
+                pass
+            finally:
+                self.closed.set()
+
+    return ReplayWebsocketHandler
+
+
+class ReplayWebsocketServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_ws_server(
+    cache_dir: str,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    start_time: int | None = None,
+    interval_ms: float = 0.0,
+    snapshot_rows: int = SNAPSHOT_ROWS,
+) -> Tuple[ReplayWebsocketServer, str]:
+    """
+    Serve recorded events over a websocket from a background thread.
+
+    Args:
+        cache_dir: Cache directory holding the recorded responses
+        host: Interface to bind
+        port: Port to bind, 0 picks a free one
+        start_time: Time in ms from which events are streamed instead of
+            being part of the snapshot, everything is in the snapshot by default
+        interval_ms: Delay between streamed messages
+        snapshot_rows: Events sent in the snapshot
+
+    Returns:
+        Tuple of (server, base URL the SDK derives the websocket URL from),
+        stop it with server.shutdown()
+    """
+
+    server = ReplayWebsocketServer(
+        (host, port), make_handler(cache_dir, start_time, interval_ms, snapshot_rows)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}"
+    logger.info(f"Streaming {cache_dir} on {url}/ws")
+    return server, url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cache-dir", default="cache")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--start-time", type=int, default=None)
+    parser.add_argument("--interval-ms", type=float, default=0.0)
+    parser.add_argument("--snapshot-rows", type=int, default=SNAPSHOT_ROWS)
+    args = parser.parse_args()
+
+    server = ReplayWebsocketServer(
+        (args.host, args.port),
+        make_handler(
+            args.cache_dir, args.start_time, args.interval_ms, args.snapshot_rows
+        ),
+    )
+    logger.info(f"Streaming {args.cache_dir} on ws://{args.host}:{args.port}/ws")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
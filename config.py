@@ -1,6 +1,50 @@
+import os
+
 REFRESH = False
 
 cache_dir = "cache"
 
+# Base URLs, override to point the loaders at a local stand-in server
+api_url = os.environ.get("HYPERLIQUID_API_URL", "https://api-ui.hyperliquid.xyz")
+explorer_url = os.environ.get("HYPERLIQUID_EXPLORER_URL", "https://rpc.hyperliquid.xyz")
+# The SDK websocket connects to <ws_api_url>/ws
+ws_api_url = os.environ.get("HYPERLIQUID_WS_API_URL", "https://api.hyperliquid.xyz")
+
+# Also save an equity chart next to every replay dump of main.py
+render_charts = os.environ.get("HYLIQ_RENDER_CHARTS", "") == "1"
 chart_width = 400
 chart_height = 200
+# Points kept per chart series ("lttb" keeps the shape, "minmax" the extremes)
+chart_max_points = 1000
+chart_downsample_method = "lttb"
+# Directory to write chart data to, referenced by URL instead of embedded in
+# the spec, relative to the saved page. None embeds the data
+chart_data_dir = None
+chart_data_format = "json"
+
+event_store_path = f"{cache_dir}/events.sqlite"
+
+# Hyperliquid allows 1200 request weight per minute per IP
+rate_limit_weight_per_minute = 1200
+request_max_retries = 5
+# Seconds to wait for a connection or a response before retrying
+request_timeout = 30.0
+
+# Pipeline metrics reports, and stage name -> budget in total seconds per run
+metrics_dir = "metrics"
+stage_budgets = {
+    "replay_address": 600.0,
+    "fetch.userFills": 120.0,
+    "replay": 300.0,
+    "serialize": 120.0,
+}
+# Also profile the memory of every stage, slows the pipeline down
+profile_memory = os.environ.get("HYLIQ_PROFILE_MEMORY", "") == "1"
+
+# Progress ledger of workflows.backfill and attempts per unit before giving up
+backfill_ledger_path = f"{cache_dir}/backfill.sqlite"
+backfill_max_attempts = 3
+
+# Content-addressed step outputs of workflows.dag and steps run at once
+artifact_dir = f"{cache_dir}/artifacts"
+workflow_workers = 4
@@ -0,0 +1,54 @@
+dnhype_short_eoa = "0x1Da7920cA7f9ee28D481BC439dccfED09F52a237"
+dnhype_spot_eoa = "0xca36897cd0783a558f46407cd663d0f46d2f3386"
+
+dnpump_short_eoa = "0xCA0Eb15d0efF480c15aC9071db8F47aF9b35ce98"
+dnpump_spot_eoa = "0x975b62b498ed8369f781c2bd2e181ee53612a704"
+
+hbusdt_deposit = "0xD317d8Bf73fCB1758bAA772819163B452D6e2b01"
+hbusdt_onchain = "0x5064d3e2906317905f1d59663d5fa257c15a704a"
+hbusdt_spot_1 = "0x1c020f03305acd09994c1910d440646e4a5f91b0"
+hbusdt_spot_2 = "0xf545003323da8419ce95dd4137ec90577d420ea1"
+hbusdt_withdrawal = "0x77930A9cd3Db2A9e49f730Db8743bece140260C9"
+
+hbusdc_deposit = "0xBBB2f471a72D4ea4B2C92B65859A503526BB3622"
+hbhype_deposit = "0x37B9De93bbe9747c7fc48913417A9AADe1E59FA2"
+
+# Strategy -> display name and member EOAs
+strategies = {
+    "dnhype": {
+        "name": "dnHYPE",
+        "eoas": [
+            {"address": dnhype_short_eoa, "label": "DN Hype Short"},
+            {"address": dnhype_spot_eoa, "label": "DN Hype Spot"},
+        ],
+    },
+    "dnpump": {
+        "name": "dnPUMP",
+        "eoas": [
+            {"address": dnpump_short_eoa, "label": "DN Pump Short"},
+            {"address": dnpump_spot_eoa, "label": "DN Pump Spot"},
+        ],
+    },
+    "hbusdt": {
+        "name": "hbUSDT",
+        "eoas": [
+            {"address": hbusdt_deposit, "label": "hbUSDT Deposit"},
+            {"address": hbusdt_onchain, "label": "hbUSDT Onchain"},
+            {"address": hbusdt_spot_1, "label": "hbUSDT Spot 1"},
+            {"address": hbusdt_spot_2, "label": "hbUSDT Spot 2"},
+            {"address": hbusdt_withdrawal, "label": "hbUSDT Withdrawal"},
+        ],
+    },
+    "hbusdc": {
+        "name": "hbUSDC",
+        "eoas": [
+            {"address": hbusdc_deposit, "label": "hbUSDC Deposit"},
+        ],
+    },
+    "hbhype": {
+        "name": "hbHYPE",
+        "eoas": [
+            {"address": hbhype_deposit, "label": "hbHype Deposit"},
+        ],
+    },
+}
@@ -1,23 +1,55 @@
-import re
+from datetime import datetime
 import polars as pl
 import os
+from loguru import logger
 from config import cache_dir
 from cchecksum import to_checksum_address
 from models.df_models.actions import actions_schema
+from utils.cache import atomic_path, verify_checksum
 
+# Action types that do not change balances themselves
+NON_EXECUTION_TYPES = ["order", "tokenDelegate"]
+
+# TWAP slices have no transaction of their own and are listed with an all zero hash
+TWAP_HASH = "0x" + "0" * 64
+# Longest a TWAP runs, its slices execute at most this long before its Twap row
+TWAP_MAX_DURATION = "1d"
+
+
+def get_actions(address: str, use_cache: bool = True) -> pl.LazyFrame:
+    """
+    Lazily scan the explorer actions export of an address.
+
+    The CSV in src/ is converted once into a Parquet sidecar keyed by the CSV's
+    modification time, so repeated runs skip CSV parsing entirely and filters
+    on the returned LazyFrame are pushed down into the Parquet scan.
+
+    Args:
+        address: User address whose export lives in src/<checksum>.csv
+        use_cache: Whether to reuse the Parquet sidecar if it is up to date
+
+    Returns:
+        Polars LazyFrame following actions_schema
+    """
 
-def get_actions(address: str, use_cache: bool = True) -> pl.DataFrame:
     actions_dir = os.path.join("src")
     os.makedirs(actions_dir, exist_ok=True)
     file_name = f"{to_checksum_address(address)}"
     actions_file = os.path.join(actions_dir, f"{file_name}.csv")
 
-    # Read CSV with proper null handling and increased schema inference
-    df_actions = pl.read_csv(
+    sidecar_dir = os.path.join(cache_dir, "actions")
+    os.makedirs(sidecar_dir, exist_ok=True)
+    mtime = os.stat(actions_file).st_mtime_ns
+    sidecar_path = os.path.join(sidecar_dir, f"{file_name}_{mtime}.parquet")
+
+    if use_cache and verify_checksum(sidecar_path):
+        return pl.scan_parquet(sidecar_path)
+
+    # Read CSV with proper null handling, every column type is known upfront
+    lf_actions = pl.scan_csv(
         actions_file,
         schema_overrides={**actions_schema, "time": pl.Int64},  # Read as integer first
         null_values=["-", "", "null", "NULL"],
-        infer_schema_length=10000,
     ).with_columns(
         [
             pl.col("time").cast(
@@ -26,28 +58,162 @@ def get_actions(address: str, use_cache: bool = True) -> pl.DataFrame:
         ]
     )
 
-    return df_actions
+    with atomic_path(sidecar_path) as tmp_path:
+        lf_actions.sink_parquet(tmp_path)
+
+    # Drop sidecars of previous versions of the export
+    for stale in os.listdir(sidecar_dir):
+        if stale.startswith(f"{file_name}_") and not stale.startswith(
+            os.path.basename(sidecar_path)
+        ):
+            os.remove(os.path.join(sidecar_dir, stale))
+
+    logger.debug(f"Converted {actions_file} to {sidecar_path}")
+    return pl.scan_parquet(sidecar_path)
+
+
+def twap_parents(slices: pl.LazyFrame, twaps: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Match TWAP slices to the Twap row of the TWAP they belong to.
+
+    The export lists a TWAP as one Twap row at the time it ended, so the
+    parent of a slice is the first Twap row of the same class and token at or
+    after it, within TWAP_MAX_DURATION.
+
+    Args:
+        slices: Executions with class, token and time
+        twaps: Twap rows with class, token and time
+
+    Returns:
+        The slices with the time of their parent Twap row as twap_time, null
+        when no Twap row follows them
+    """
+
+    class_dtype = slices.collect_schema()["class"]
+    parents = twaps.select(
+        pl.col("class").cast(class_dtype),
+        "token",
+        pl.col("time").alias("twap_time"),
+    ).sort("twap_time")
+
+    return slices.sort("time").join_asof(
+        parents,
+        left_on="time",
+        right_on="twap_time",
+        by=["class", "token"],
+        strategy="forward",
+        tolerance=TWAP_MAX_DURATION,
+        check_sortedness=False,
+    )
+
+
+def get_executions(actions_lf: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Actions moving balances, with every TWAP execution counted once.
+
+    Order placements and delegations are left out. Some exports list a TWAP
+    only as its Twap row, others also list its slices as zero hash rows, so a
+    Twap row only keeps the part of its amount its listed slices do not
+    cover and is left out when they cover all of it. Perp <-> spot transfers
+    are unsigned in the export, their amounts are made negative towards spot.
+
+    Args:
+        actions_lf: Actions from get_actions
+
+    Returns:
+        Polars LazyFrame following actions_schema
+    """
+
+    lf = actions_lf.filter(~pl.col("type").is_in(NON_EXECUTION_TYPES))
+    is_twap = pl.col("type") == "Twap"
+    is_slice = (pl.col("hash") == TWAP_HASH) & ~is_twap
+    group = ["class", "token"]
+
+    # Parent of each row as in twap_parents, with window expressions as both
+    # sides come from the same frame, a Twap row being its own parent
+    twap_time = pl.when(is_twap).then(pl.col("time")).backward_fill().over(group)
+    within = pl.col("time").dt.offset_by(TWAP_MAX_DURATION) >= twap_time
+    sliced = (
+        pl.when(is_slice)
+        .then(pl.col("amount"))
+        .otherwise(0.0)
+        .sum()
+        .over([*group, "twap_time"])
+    )
+    residual = pl.col("amount") - sliced
+    to_spot = (pl.col("type") == "InternalTransfer") & (pl.col("to") == "SPOT")
+
+    return (
+        lf.sort("time", maintain_order=True)
+        .with_columns(pl.when(within).then(twap_time).alias("twap_time"))
+        .filter(~is_twap | (residual.abs() > 1e-6 * pl.col("amount").abs()))
+        .with_columns(
+            pl.when(is_twap)
+            .then(residual)
+            .when(to_spot)
+            .then(-pl.col("amount"))
+            .otherwise(pl.col("amount"))
+            .alias("amount")
+        )
+        .drop("twap_time")
+    )
 
 
 def generate_positions(
-    address: str, use_cache: bool = True
+    address: str,
+    use_cache: bool = True,
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
 ) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Build position histories per class and token from an actions export.
+
+    Order placements and delegations do not move balances and are left out,
+    TWAPs count once whether the export lists their slices or only their
+    Twap row and perp <-> spot transfers count towards perp, see
+    get_executions.
+
+    Args:
+        address: User address whose export lives in src/<checksum>.csv
+        use_cache: Whether to use cached data if available
+        start_time: Only return history from this time on (positions still
+            accumulate from the start of the export)
+        end_time: Only consider actions up to this time
 
-    actions_df = get_actions(address, use_cache)
+    Returns:
+        Tuple of (every action with its cumulative_amount, latest position per
+        class and token)
+    """
+
+    actions_lf = get_actions(address, use_cache)
+    if end_time is not None:
+        actions_lf = actions_lf.filter(pl.col("time") <= end_time)
 
     # Group by class and token, then calculate cumulative sum of amount
-    hist_df = actions_df.sort("time").with_columns(
-        [
-            # pl.col("amount").cum_sum().over(["class", "token", "type"]).alias("cumulative_amount")
-        ]
+    hist_lf = (
+        get_executions(actions_lf)
+        .sort("time")
+        .with_columns(
+            [
+                pl.col("amount")
+                .fill_null(0.0)
+                .cum_sum()
+                .over(["class", "token"])
+                .alias("cumulative_amount")
+            ]
+        )
     )
 
     # Get the latest cumulative value for each class-token combination
-    latest_df = hist_df.group_by(["class", "token", "type"]).agg(
+    latest_lf = hist_lf.group_by(["class", "token"]).agg(
         [
             pl.col("time").max().alias("latest_time"),
-            # pl.col("cumulative_amount").last().alias("latest_position")
+            pl.col("cumulative_amount").last().alias("latest_position"),
         ]
     )
 
+    if start_time is not None:
+        hist_lf = hist_lf.filter(pl.col("time") >= start_time)
+
+    hist_df, latest_df = pl.collect_all([hist_lf, latest_lf])
     return hist_df, latest_df
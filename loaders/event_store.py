@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import closing
+from typing import Iterable, Iterator, List, Sequence, Tuple
+from loguru import logger
+from config import event_store_path
+
+# One table per event kind, all sharing the same layout
+EVENT_KINDS = [
+    "user_fills",
+    "user_fills_no_agg",
+    "user_funding",
+    "user_ledger_updates",
+    "twap_history",
+    "user_explorer_txs",
+]
+
+
+def _canonical(event: dict) -> str:
+    return json.dumps(event, sort_keys=True, separators=(",", ":"))
+
+
+def fills_kind(aggregate_by_time: bool = True) -> str:
+    """
+    Event kind of fills fetched with or without aggregateByTime.
+
+    Both fetches share trade ids but not sizes or prices, so they are kept
+    in separate tables and only the aggregated fills are replayed.
+    """
+
+    return "user_fills" if aggregate_by_time else "user_fills_no_agg"
+
+
+def event_key(kind: str, event: dict) -> Tuple[str, int, str | None]:
+    """
+    Unique id, time (ms) and hash of a raw API event.
+
+    Ids are stable across refetches so upserts are idempotent: fills use their
+    trade id, funding the (time, coin) pair and everything else a digest of
+    the payload. TWAPs are indexed by their start time, like in the replay.
+    """
+
+    if kind in ("user_fills", "user_fills_no_agg"):
+        return str(event["tid"]), int(event["time"]), event.get("hash")
+    elif kind == "user_funding":
+        coin = event["delta"]["coin"]
+        return f"{event['time']}:{coin}", int(event["time"]), event.get("hash")
+
+    uid = hashlib.sha1(_canonical(event).encode()).hexdigest()
+    if kind == "twap_history":
+        return uid, int(event["state"]["timestamp"]), None
+    return uid, int(event["time"]), event.get("hash")
+
+
+def connect(path: str = event_store_path) -> sqlite3.Connection:
+    """
+    Open the event store, creating its tables and indexes if needed.
+
+    Args:
+        path: SQLite database file
+
+    Returns:
+        Open sqlite3 connection in WAL mode
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for kind in EVENT_KINDS:
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {kind} (
+                address TEXT NOT NULL,
+                uid TEXT NOT NULL,
+                time INTEGER NOT NULL,
+                hash TEXT,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (address, uid)
+            )
+            """
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {kind}_address_time ON {kind} (address, time)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {kind}_hash ON {kind} (hash)")
+    conn.commit()
+    return conn
+
+
+def upsert_events(
+    kind: str, address: str, events: Iterable[dict], path: str = event_store_path
+) -> int:
+    """
+    Insert or replace raw API events of an address.
+
+    Args:
+        kind: Event kind, one of EVENT_KINDS
+        address: User address the events belong to
+        events: Raw events as returned by the API
+        path: SQLite database file
+
+    Returns:
+        Number of events written
+    """
+
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"Unknown event kind: {kind}")
+
+    address = address.lower()
+    rows = []
+    for event in events:
+        try:
+            uid, time, hash = event_key(kind, event)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Skipping {kind} event without a key {event}: {e}")
+            continue
+        rows.append((address, uid, time, hash, _canonical(event)))
+
+    with closing(connect(path)) as conn, conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {kind} (address, uid, time, hash, payload) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    logger.debug(f"Upserted {len(rows)} {kind} events for address {address}")
+    return len(rows)
+
+
+def count_new_events(
+    kind: str, address: str, events: Iterable[dict], path: str = event_store_path
+) -> int:
+    """
+    Number of raw events of an address not in the event store yet.
+
+    Args:
+        kind: Event kind, one of EVENT_KINDS
+        address: User address the events belong to
+        events: Raw events as returned by the API
+        path: SQLite database file
+
+    Returns:
+        Number of distinct events an upsert would add
+    """
+
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"Unknown event kind: {kind}")
+
+    uids = set()
+    for event in events:
+        try:
+            uids.add(event_key(kind, event)[0])
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    stored = 0
+    batch = list(uids)
+    with closing(connect(path)) as conn:
+        # Stay under the SQLite bound parameter limit
+        for i in range(0, len(batch), 500):
+            chunk = batch[i : i + 500]
+            stored += conn.execute(
+                f"SELECT COUNT(*) FROM {kind} WHERE address = ? AND uid IN "
+                f"({', '.join('?' * len(chunk))})",
+                [address.lower(), *chunk],
+            ).fetchone()[0]
+    return len(uids) - stored
+
+
+def _where(
+    address: str | Sequence[str] | None,
+    start_time: int | None,
+    end_time: int | None,
+) -> Tuple[str, list]:
+    clauses, params = [], []
+    if isinstance(address, str):
+        clauses.append("address = ?")
+        params.append(address.lower())
+    elif address is not None:
+        addresses = [a.lower() for a in address]
+        clauses.append(f"address IN ({', '.join('?' * len(addresses))})")
+        params.extend(addresses)
+    if start_time is not None:
+        clauses.append("time >= ?")
+        params.append(start_time)
+    if end_time is not None:
+        clauses.append("time < ?")
+        params.append(end_time)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def read_events(
+    kind: str,
+    address: str | Sequence[str] | None = None,
+    start_time: int | None = None,
+    end_time: int | None = None,
+    path: str = event_store_path,
+) -> List[dict]:
+    """
+    Raw events of one kind within a time range, sorted by time.
+
+    Args:
+        kind: Event kind, one of EVENT_KINDS
+        address: Address, list of addresses, or None for every address
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
+        path: SQLite database file
+
+    Returns:
+        List of raw events
+    """
+
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"Unknown event kind: {kind}")
+
+    where, params = _where(address, start_time, end_time)
+    with closing(connect(path)) as conn:
+        rows = conn.execute(
+            f"SELECT payload FROM {kind}{where} ORDER BY time", params
+        ).fetchall()
+    return [json.loads(payload) for (payload,) in rows]
+
+
+def read_events_by_hash(
+    hash: str, path: str = event_store_path
+) -> List[Tuple[str, str, dict]]:
+    """
+    Every stored event sharing a transaction hash, across kinds and addresses.
+
+    Returns:
+        List of (kind, address, raw event)
+    """
+
+    query = " UNION ALL ".join(
+        f"SELECT '{kind}', address, time, payload FROM {kind} WHERE hash = ?"
+        for kind in EVENT_KINDS
+    )
+    with closing(connect(path)) as conn:
+        rows = conn.execute(
+            f"{query} ORDER BY time", [hash] * len(EVENT_KINDS)
+        ).fetchall()
+    return [(kind, address, json.loads(payload)) for kind, address, _, payload in rows]
+
+
+def stream_events(
+    address: str | Sequence[str] | None,
+    kinds: Sequence[str] = tuple(EVENT_KINDS),
+    start_time: int | None = None,
+    end_time: int | None = None,
+    path: str = event_store_path,
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Iterate over events of several kinds merged by time.
+
+    Rows are fetched lazily from a single time ordered query, so the full
+    history never has to be held in memory.
+
+    Args:
+        address: Address, list of addresses, or None for every address
+        kinds: Event kinds to merge
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
+        path: SQLite database file
+
+    Yields:
+        Tuples of (kind, raw event)
+    """
+
+    unknown = set(kinds) - set(EVENT_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown event kinds: {sorted(unknown)}")
+
+    where, params = _where(address, start_time, end_time)
+    # Ties are broken by the order of kinds, then by insertion order
+    query = " UNION ALL ".join(
+        f"SELECT '{kind}' AS kind, {rank} AS rank, rowid AS seq, time, payload FROM {kind}{where}"
+        for rank, kind in enumerate(kinds)
+    )
+    with closing(connect(path)) as conn:
+        for kind, _, _, _, payload in conn.execute(
+            f"{query} ORDER BY time, rank, seq", params * len(kinds)
+        ):
+            yield kind, json.loads(payload)
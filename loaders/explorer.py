@@ -1,19 +1,27 @@
-from typing import List
-import requests
-import json
+from typing import TYPE_CHECKING, List, Union
 import os
-import polars as pl
 from loguru import logger
 from config import cache_dir
-from models.class_models.explorer import UpdateLeverageModel
-from models.df_models.explorer import user_details_schema
+from loaders.event_store import upsert_events
+from models.class_models.explorer import UpdateIsolatedMarginModel, UpdateLeverageModel
+from utils.cache import read_cache_json, write_cache_json
+from utils.metrics import timed
+from utils.window import cached_time_window, event_time, is_windowed, time_window
+
+if TYPE_CHECKING:
+    import polars as pl
 
 # Global list of transaction types to filter out
 FILTERED_TX_TYPES = ["evmRawTx"]
 
 
+@timed("load.user_explorer", count=lambda details: len(details.get("txs", [])))
 def get_user_explorer_json(
-    address: str, use_cache: bool = True, filtered: bool = True
+    address: str,
+    use_cache: bool = True,
+    filtered: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
 ) -> dict:
     """
     Fetch user details from the Hyperliquid explorer API.
@@ -22,6 +30,8 @@ def get_user_explorer_json(
         address: User address to fetch details for
         use_cache: Whether to use cached data if available
         filtered: Whether to return filtered data (without evmRawTx) or raw data
+        start_time: Inclusive lower bound in ms on transaction times
+        end_time: Exclusive upper bound in ms on transaction times
 
     Returns:
         Dictionary containing user details from the API
@@ -36,31 +46,36 @@ def get_user_explorer_json(
     else:
         cache_path = os.path.join(user_details_dir, f"{address.lower()}_raw.json")
 
+    cached = None
     if os.path.isfile(cache_path) and use_cache:
-        with open(cache_path, "r") as f:
-            return json.load(f)
+        if is_windowed(start_time, end_time):
+            txs = cached_time_window(
+                cache_path, event_time, start_time, end_time, field="txs"
+            )
+            if txs is not None:
+                cached = {"type": "userDetails", "txs": txs}
+        else:
+            cached = read_cache_json(cache_path)
+
+    if cached is not None:
+        return cached
     else:
         # Make API request to Hyperliquid explorer
-        url = "https://rpc.hyperliquid.xyz/explorer"
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-            # 'Origin': 'https://app.hyperliquid.xyz',
-            # 'Referer': 'https://app.hyperliquid.xyz/',
-        }
         payload = {"type": "userDetails", "user": address}
 
+        # Only a cache miss pays for importing requests
+        import requests
+        from utils.http import post_info
+
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            user_details = response.json()
+            user_details = post_info(payload, endpoint="explorer")
 
             # Always cache the raw data first
             raw_cache_path = os.path.join(
                 user_details_dir, f"{address.lower()}_raw.json"
             )
-            with open(raw_cache_path, "w") as f:
-                json.dump(user_details, f, indent=4)
+            write_cache_json(raw_cache_path, user_details)
+            upsert_events("user_explorer_txs", address, user_details.get("txs", []))
 
             # Create filtered version if requested
             if filtered:
@@ -74,32 +89,48 @@ def get_user_explorer_json(
                 #     ]
 
                 # Cache the filtered data
-                with open(cache_path, "w") as f:
-                    json.dump(filtered_data, f, indent=4)
+                write_cache_json(cache_path, filtered_data)
+
+                user_details = filtered_data
 
-                return filtered_data
-            else:
-                return user_details
+            if is_windowed(start_time, end_time):
+                txs = user_details.get("txs", [])
+                txs = time_window(txs, event_time, start_time, end_time)
+                return {**user_details, "txs": txs}
+            return user_details
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch user details for {address}: {e}")
             raise
 
 
-def get_user_explorer_dataframe(address: str, use_cache: bool = True) -> pl.DataFrame:
+@timed("dataframe.user_explorer")
+def get_user_explorer_dataframe(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> "pl.DataFrame":
     """
     Load user details into a Polars DataFrame.
 
     Args:
         address: User address to fetch details for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms on transaction times
+        end_time: Exclusive upper bound in ms on transaction times
 
     Returns:
         Polars DataFrame containing user transaction details
     """
 
+    import polars as pl
+    from models.df_models.explorer import user_details_schema
+
     # Use filtered data by default (comment out filtered=True to use raw data)
-    user_details = get_user_explorer_json(address, use_cache, filtered=True)
+    user_details = get_user_explorer_json(
+        address, use_cache, filtered=True, start_time=start_time, end_time=end_time
+    )
     # user_details = get_user_details_json(address, use_cache, filtered=False)  # Uncomment for raw data
 
     # Extract transactions from the response
@@ -133,23 +164,79 @@ def get_user_explorer_dataframe(address: str, use_cache: bool = True) -> pl.Data
     return df
 
 
+def parse_user_explorer_tx(
+    tx: dict,
+) -> Union[UpdateLeverageModel, UpdateIsolatedMarginModel, None]:
+    """
+    Parse a raw explorer transaction into a margin related model.
+
+    Args:
+        tx: Transaction as returned in userDetails txs
+
+    Returns:
+        Model instance, or None if the action type is not supported
+    """
+    time = int(tx["time"])
+    user = tx["user"]
+    block = int(tx["block"])
+    hash = tx["hash"]
+    error = tx["error"] if tx["error"] is not None else None
+
+    action = tx.get("action", {})
+    action_type = action.get("type", "")
+
+    if action_type == "updateLeverage":
+        return UpdateLeverageModel(
+            time=time,
+            user=user,
+            asset=int(action.get("asset")),
+            isCross=bool(action.get("isCross")),
+            leverage=float(action.get("leverage")),
+            block=block,
+            hash=hash,
+            error=error,
+        )
+
+    elif action_type == "updateIsolatedMargin":
+        return UpdateIsolatedMarginModel(
+            time=time,
+            user=user,
+            asset=int(action.get("asset")),
+            isBuy=bool(action.get("isBuy")),
+            ntli=int(action.get("ntli")),
+            block=block,
+            hash=hash,
+            error=error,
+        )
+
+    return None
+
+
+@timed("parse.user_explorer")
 def get_user_explorer_pydantic(
-    address: str, use_cache: bool = True
-) -> List[UpdateLeverageModel]:
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> List[Union[UpdateLeverageModel, UpdateIsolatedMarginModel]]:
     """
     Load user details into a list of Pydantic models.
-    Currently only supports UpdateLeverageModel.
+    Currently supports UpdateLeverageModel and UpdateIsolatedMarginModel.
 
     Args:
         address: User address to fetch details for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms on transaction times
+        end_time: Exclusive upper bound in ms on transaction times
 
     Returns:
-        List of UpdateLeverageModel instances containing user transaction details
+        List of margin related models containing user transaction details
     """
 
     # Use filtered data by default (comment out filtered=True to use raw data)
-    user_details = get_user_explorer_json(address, use_cache, filtered=True)
+    user_details = get_user_explorer_json(
+        address, use_cache, filtered=True, start_time=start_time, end_time=end_time
+    )
     # user_details = get_user_details_json(address, use_cache, filtered=False)  # Uncomment for raw data
 
     # Extract transactions from the response
@@ -159,29 +246,11 @@ def get_user_explorer_pydantic(
         logger.warning(f"No transactions found for address {address}")
         return []
 
-    models: List[UpdateLeverageModel] = []
+    models: List[Union[UpdateLeverageModel, UpdateIsolatedMarginModel]] = []
     for tx in txs:
         try:
-            time = int(tx["time"])
-            user = tx["user"]
-            block = int(tx["block"])
-            hash = tx["hash"]
-            error = tx["error"] if tx["error"] is not None else None
-
-            action = tx.get("action", {})
-            action_type = action.get("type", "")
-
-            if action_type == "updateLeverage":
-                model = UpdateLeverageModel(
-                    time=time,
-                    user=user,
-                    asset=int(action.get("asset")),
-                    isCross=bool(action.get("isCross")),
-                    leverage=float(action.get("leverage")),
-                    block=block,
-                    hash=hash,
-                    error=error,
-                )
+            model = parse_user_explorer_tx(tx)
+            if model is not None:
                 models.append(model)
 
         except Exception as e:
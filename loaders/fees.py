@@ -0,0 +1,176 @@
+import glob
+import hashlib
+import os
+import polars as pl
+from loguru import logger
+from config import cache_dir
+from constants.coin_id import coin_id_map
+from loaders.user_fills import get_user_fills_dataframe
+from loaders.user_ledger_updates import get_user_ledger_updates_dataframe
+from models.df_models.fees import fees_schema
+from utils.cache import atomic_path, verify_checksum
+
+
+def _fill_fees(fills_df: pl.DataFrame, address: str) -> pl.DataFrame:
+    return fills_df.filter(pl.col("fee") != 0).select(
+        pl.col("time"),
+        pl.lit(address).alias("address"),
+        pl.lit("fill").alias("event_type"),
+        pl.col("coin").replace(coin_id_map),
+        pl.col("feeToken").replace(coin_id_map).alias("fee_token"),
+        pl.col("fee"),
+        pl.col("hash"),
+    )
+
+
+def _ledger_fees(ledger_df: pl.DataFrame, address: str) -> pl.DataFrame:
+    delta_type = pl.col("delta_type").cast(pl.String)
+    # only the sender pays transfer fees
+    is_sender = pl.col("user").str.to_lowercase() == address
+
+    def select(event_type: str, coin: pl.Expr, fee_token: pl.Expr, fee: pl.Expr):
+        return [
+            pl.col("time"),
+            pl.lit(address).alias("address"),
+            pl.lit(event_type).alias("event_type"),
+            coin.alias("coin"),
+            fee_token.replace(coin_id_map).alias("fee_token"),
+            fee.alias("fee"),
+            pl.col("hash"),
+        ]
+
+    frames = [
+        ledger_df.filter(delta_type == "withdraw").select(
+            *select("withdraw", pl.lit(None, pl.String), pl.lit("USDC"), pl.col("fee"))
+        ),
+        ledger_df.filter((delta_type == "internalTransfer") & is_sender).select(
+            *select(
+                "internalTransfer", pl.lit(None, pl.String), pl.lit("USDC"), pl.col("fee")
+            )
+        ),
+        ledger_df.filter(
+            (delta_type == "spotTransfer") & is_sender & (pl.col("feeToken") != "")
+        ).select(
+            *select(
+                "spotTransfer",
+                pl.col("token").replace(coin_id_map),
+                pl.col("feeToken"),
+                pl.col("fee"),
+            )
+        ),
+        ledger_df.filter((delta_type == "spotTransfer") & is_sender).select(
+            *select(
+                "spotTransferNative",
+                pl.col("token").replace(coin_id_map),
+                pl.lit("HYPE"),
+                pl.col("nativeTokenFee"),
+            )
+        ),
+        ledger_df.filter(delta_type == "accountActivationGas").select(
+            *select(
+                "accountActivationGas",
+                pl.lit(None, pl.String),
+                pl.col("token"),
+                pl.col("amount"),
+            )
+        ),
+    ]
+
+    return pl.concat(frames).filter(pl.col("fee").is_not_null() & (pl.col("fee") != 0))
+
+
+def _input_key(address: str) -> str:
+    # Modification times of the fills and ledger caches the fees are read from
+    fills = os.path.join(cache_dir, "user_fills", f"{address}_user_fills_agg")
+    paths = [
+        f"{fills}.json",
+        *glob.glob(os.path.join(fills, "*.json")),
+        os.path.join(
+            cache_dir, "user_ledger_updates", f"{address}_ledger_updates.json"
+        ),
+    ]
+
+    digest = hashlib.sha256()
+    for path in sorted(path for path in paths if os.path.isfile(path)):
+        digest.update(f"{path}:{os.stat(path).st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _sidecar_path(address: str) -> str:
+    file_name = f"{address}_fees_{_input_key(address)}.parquet"
+    return os.path.join(cache_dir, "fees", file_name)
+
+
+def get_fees_dataframe(address: str, use_cache: bool = True) -> pl.DataFrame:
+    """
+    Extract every fee paid by an address into one typed table.
+
+    Covers trading fees from fills and the fees charged on withdrawals,
+    internal transfers, spot transfers (token and native HYPE fee) and account
+    activation gas. The table is persisted as Parquet so rollups never need
+    the per-event replay, keyed by the modification times of the fills and
+    ledger caches so it is extracted again whenever they are refreshed.
+
+    Args:
+        address: User address to extract fees for
+        use_cache: Whether to use cached data if available
+
+    Returns:
+        Polars DataFrame following fees_schema, sorted by time
+    """
+
+    address = address.lower()
+    fees_dir = os.path.join(cache_dir, "fees")
+    os.makedirs(fees_dir, exist_ok=True)
+
+    if use_cache:
+        cache_path = _sidecar_path(address)
+        if verify_checksum(cache_path):
+            return pl.read_parquet(cache_path)
+
+    fills_df = get_user_fills_dataframe(address, use_cache)
+    ledger_df = get_user_ledger_updates_dataframe(address, use_cache)
+
+    df = (
+        pl.concat([_fill_fees(fills_df, address), _ledger_fees(ledger_df, address)])
+        .cast(fees_schema)
+        .sort("time")
+    )
+
+    # Key after loading, loaders may have just refreshed the caches
+    cache_path = _sidecar_path(address)
+    with atomic_path(cache_path) as tmp_path:
+        df.write_parquet(tmp_path)
+
+    # Drop tables extracted from previous versions of the caches
+    for stale in os.listdir(fees_dir):
+        if stale.startswith(f"{address}_fees") and not stale.startswith(
+            os.path.basename(cache_path)
+        ):
+            os.remove(os.path.join(fees_dir, stale))
+
+    logger.debug(f"Fees DataFrame shape: {df.shape}")
+    return df
+
+
+def scan_fees(addresses: list[str]) -> pl.LazyFrame:
+    """
+    Lazily scan the persisted fee tables of several addresses.
+
+    Args:
+        addresses: User addresses whose fees were extracted by get_fees_dataframe
+
+    Returns:
+        Polars LazyFrame following fees_schema
+    """
+
+    paths = [_sidecar_path(address.lower()) for address in addresses]
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        logger.warning(f"No up to date extracted fees found at {missing}")
+
+    paths = [path for path in paths if path not in missing]
+    if not paths:
+        return pl.LazyFrame(schema=fees_schema)
+
+    return pl.scan_parquet(paths)
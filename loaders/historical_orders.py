@@ -1,21 +1,35 @@
 from typing import List
 import requests
-import json
 import os
 import polars as pl
 from loguru import logger
 from config import cache_dir
 from models.df_models.historical_orders import historical_orders_schema
 from models.class_models.historical_orders import HistoricalOrderModel
+from utils.cache import read_cache_json, write_cache_json
+from utils.http import post_info
+from utils.window import cached_time_window, is_windowed, time_window
 
 
-def get_historical_orders_json(address: str, use_cache: bool = True) -> list:
+def order_status_time(order_entry: dict) -> int:
+    """Status time in ms of a raw historical order entry."""
+    return int(order_entry["statusTimestamp"])
+
+
+def get_historical_orders_json(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> list:
     """
     Fetch historical orders from the Hyperliquid API.
 
     Args:
         address: User address to fetch historical orders for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms on status times
+        end_time: Exclusive upper bound in ms on status times
 
     Returns:
         List containing historical orders data from the API
@@ -26,47 +40,58 @@ def get_historical_orders_json(address: str, use_cache: bool = True) -> list:
 
     cache_path = os.path.join(historical_orders_dir, f"{address.lower()}_historical_orders.json")
 
+    cached = None
     if os.path.isfile(cache_path) and use_cache:
-        with open(cache_path, "r") as f:
-            return json.load(f)
+        if is_windowed(start_time, end_time):
+            cached = cached_time_window(
+                cache_path, order_status_time, start_time, end_time
+            )
+        else:
+            cached = read_cache_json(cache_path)
+
+    if cached is not None:
+        return cached
     else:
         # Make API request to Hyperliquid API
-        url = "https://api-ui.hyperliquid.xyz/info"
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-        }
         payload = {"type": "historicalOrders", "user": address}
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            historical_orders = response.json()
+            historical_orders = post_info(payload)
 
             # Cache the data
-            with open(cache_path, "w") as f:
-                json.dump(historical_orders, f, indent=4)
+            write_cache_json(cache_path, historical_orders)
 
-            return historical_orders
+            return time_window(
+                historical_orders, order_status_time, start_time, end_time
+            )
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch historical orders for {address}: {e}")
             raise
 
 
-def get_historical_orders_dataframe(address: str, use_cache: bool = True) -> pl.DataFrame:
+def get_historical_orders_dataframe(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> pl.DataFrame:
     """
     Load historical orders into a Polars DataFrame.
 
     Args:
         address: User address to fetch historical orders for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms on status times
+        end_time: Exclusive upper bound in ms on status times
 
     Returns:
         Polars DataFrame containing historical orders data
     """
 
-    historical_orders = get_historical_orders_json(address, use_cache)
+    historical_orders = get_historical_orders_json(
+        address, use_cache, start_time, end_time
+    )
 
     if not historical_orders:
         logger.warning(f"No historical orders found for address {address}")
@@ -106,18 +131,27 @@ def get_historical_orders_dataframe(address: str, use_cache: bool = True) -> pl.
     return df
 
 
-def get_historical_orders_pydantic(address: str, use_cache: bool = True) -> List[HistoricalOrderModel]:
+def get_historical_orders_pydantic(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> List[HistoricalOrderModel]:
     """
     Load historical orders into a list of Pydantic models.
 
     Args:
         address: User address to fetch historical orders for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms on status times
+        end_time: Exclusive upper bound in ms on status times
 
     Returns:
         List of HistoricalOrderModel instances containing historical orders data
     """
-    historical_orders = get_historical_orders_json(address, use_cache)
+    historical_orders = get_historical_orders_json(
+        address, use_cache, start_time, end_time
+    )
 
     if not historical_orders:
         logger.warning(f"No historical orders found for address {address}")
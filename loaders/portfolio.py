@@ -1,11 +1,11 @@
-from hyperliquid.info import Info
-from hyperliquid.utils import constants
 from loguru import logger
 import polars as pl
 import os
-import json
 from config import cache_dir
 from models.df_models.portfolio import portfolio_schema
+from utils.cache import read_cache_json, write_cache_json
+from utils.http import post_info
+from utils.metrics import timed
 
 
 def get_portfolio_json(address: str, use_cache: bool = True) -> dict:
@@ -25,19 +25,18 @@ def get_portfolio_json(address: str, use_cache: bool = True) -> dict:
     os.makedirs(portfolio_dir, exist_ok=True)
     cache_path = os.path.join(portfolio_dir, f"{address.lower()}.json")
 
-    if os.path.isfile(cache_path) and use_cache:
-        with open(cache_path, "r") as f:
-            return json.load(f)
+    cached = read_cache_json(cache_path) if use_cache else None
+    if cached is not None:
+        return cached
     else:
-        info = Info(constants.MAINNET_API_URL, skip_ws=True)
-        user_state = info.portfolio(address.lower())
+        user_state = post_info({"type": "portfolio", "user": address.lower()})
 
-        with open(cache_path, "w") as f:
-            json.dump(user_state, f, indent=4)
+        write_cache_json(cache_path, user_state)
 
     return user_state
 
 
+@timed("dataframe.portfolio")
 def get_portfolio(address: str, use_cache: bool = True) -> pl.DataFrame:
     rows = []
     user_state = get_portfolio_json(address, use_cache)
@@ -59,7 +58,7 @@ def get_portfolio(address: str, use_cache: bool = True) -> pl.DataFrame:
                 }
             )
 
-    df_exploded = pl.DataFrame(rows, schema_overrides=portfolio_schema)
+    df_exploded = pl.DataFrame(rows, schema=portfolio_schema)
     # logger.debug(f"Portfolio DataFrame:\n{df_exploded.tail()}")
     return df_exploded
 
@@ -1,22 +1,37 @@
-from math import e
-from typing import List
-import requests
-import json
+from typing import TYPE_CHECKING, List
 import os
-import polars as pl
 from loguru import logger
 from config import cache_dir
+from loaders.event_store import upsert_events
 from models.class_models.twap import TWAPModel
-from models.df_models.twap import twap_schema
+from utils.cache import read_cache_json, write_cache_json
+from utils.metrics import timed
+from utils.window import cached_time_window, is_windowed, time_window
 
+if TYPE_CHECKING:
+    import polars as pl
 
-def get_twap_history_json(address: str, use_cache: bool = True) -> list:
+
+def twap_time(entry: dict) -> int:
+    """Start time in ms of a raw TWAP history entry, as used by the replay."""
+    return int(entry["state"]["timestamp"])
+
+
+@timed("load.twap_history")
+def get_twap_history_json(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> list:
     """
     Fetch TWAP history from the Hyperliquid API.
 
     Args:
         address: User address to fetch TWAP history for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         List containing TWAP history data from the API
@@ -27,47 +42,63 @@ def get_twap_history_json(address: str, use_cache: bool = True) -> list:
 
     cache_path = os.path.join(twap_dir, f"{address.lower()}_twap_history.json")
 
+    windowed = is_windowed(start_time, end_time)
+
+    cached = None
     if os.path.isfile(cache_path) and use_cache:
-        with open(cache_path, "r") as f:
-            return json.load(f)
+        if windowed:
+            cached = cached_time_window(cache_path, twap_time, start_time, end_time)
+        else:
+            cached = read_cache_json(cache_path)
+
+    if cached is not None:
+        return cached
     else:
         # Make API request to Hyperliquid API
-        url = "https://api-ui.hyperliquid.xyz/info"
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-        }
         payload = {"type": "twapHistory", "user": address}
 
+        # Only a cache miss pays for importing requests
+        import requests
+        from utils.http import post_info
+
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            twap_history = response.json()
+            twap_history = post_info(payload)
 
             # Cache the data
-            with open(cache_path, "w") as f:
-                json.dump(twap_history, f, indent=4)
+            write_cache_json(cache_path, twap_history)
+            upsert_events("twap_history", address, twap_history)
 
-            return twap_history
+            return time_window(twap_history, twap_time, start_time, end_time)
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch TWAP history for {address}: {e}")
             raise
 
 
-def get_twap_history_dataframe(address: str, use_cache: bool = True) -> pl.DataFrame:
+@timed("dataframe.twap_history")
+def get_twap_history_dataframe(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> "pl.DataFrame":
     """
     Load TWAP history into a Polars DataFrame.
 
     Args:
         address: User address to fetch TWAP history for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         Polars DataFrame containing TWAP history data
     """
 
-    twap_history = get_twap_history_json(address, use_cache)
+    import polars as pl
+    from models.df_models.twap import twap_schema
+
+    twap_history = get_twap_history_json(address, use_cache, start_time, end_time)
 
     if not twap_history:
         logger.warning(f"No TWAP history found for address {address}")
@@ -103,18 +134,57 @@ def get_twap_history_dataframe(address: str, use_cache: bool = True) -> pl.DataF
     return df
 
 
-def get_twap_history_pydantic(address: str, use_cache: bool = True) -> List[TWAPModel]:
+def parse_twap(entry: dict) -> TWAPModel:
+    """
+    Parse a raw TWAP history entry from the API into a TWAPModel.
+
+    Args:
+        entry: Entry as returned by twapHistory
+
+    Returns:
+        TWAPModel instance
+    """
+    state = entry.get("state")
+    status = entry.get("status")
+
+    return TWAPModel(
+        # time=int(entry["time"]) * 1000,
+        time=int(state.get("timestamp")),
+        coin=state.get("coin"),
+        user=state.get("user"),
+        side=state.get("side").lower(),
+        sz=float(state.get("sz")),
+        executedSz=float(state.get("executedSz")),
+        executedNtl=float(state.get("executedNtl")),
+        minutes=int(state.get("minutes")),
+        reduceOnly=state.get("reduceOnly"),
+        randomize=state.get("randomize"),
+        timestamp=int(state.get("timestamp")),
+        status=status.get("status"),
+        twapId=entry.get("twapId", None),
+    )
+
+
+@timed("parse.twap_history")
+def get_twap_history_pydantic(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> List[TWAPModel]:
     """
     Load TWAP history into a list of Pydantic models.
 
     Args:
         address: User address to fetch TWAP history for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         List of TWAPModel instances containing TWAP history data
     """
-    twap_history = get_twap_history_json(address, use_cache)
+    twap_history = get_twap_history_json(address, use_cache, start_time, end_time)
 
     if not twap_history:
         logger.warning(f"No TWAP history found for address {address}")
@@ -123,26 +193,7 @@ def get_twap_history_pydantic(address: str, use_cache: bool = True) -> List[TWAP
     models: List[TWAPModel] = []
     for entry in twap_history:
         try:
-            state = entry.get("state")
-            status = entry.get("status")
-
-            model = TWAPModel(
-                # time=int(entry["time"]) * 1000,
-                time=int(state.get("timestamp")),
-                coin=state.get("coin"),
-                user=state.get("user"),
-                side=state.get("side").lower(),
-                sz=float(state.get("sz")),
-                executedSz=float(state.get("executedSz")),
-                executedNtl=float(state.get("executedNtl")),
-                minutes=int(state.get("minutes")),
-                reduceOnly=state.get("reduceOnly"),
-                randomize=state.get("randomize"),
-                timestamp=int(state.get("timestamp")),
-                status=status.get("status"),
-                twapId=entry.get("twapId", None),
-            )
-            models.append(model)
+            models.append(parse_twap(entry))
         except Exception as e:
             logger.error(f"Error parsing TWAP entry for address {address}: {e}")
             continue
@@ -1,27 +1,54 @@
-from typing import List
-import requests
-import json
+from typing import TYPE_CHECKING, List
 import os
-import polars as pl
 from loguru import logger
 from config import cache_dir
+from loaders.event_store import event_key, fills_kind, upsert_events
 from models.class_models.user_fills import UserFillsModel
-from models.df_models.user_fills import user_fills_schema
+from utils.metrics import timed
+from utils.partitions import (
+    append_partitions,
+    migrate_partitions,
+    month_key,
+    open_from,
+    read_manifest,
+    read_partitions,
+    write_partitions,
+)
+from utils.window import event_time, is_windowed, time_window
 
+if TYPE_CHECKING:
+    import polars as pl
 
+# Most fills the API returns per request
+FILLS_ROW_CAP = 2000
+
+
+@timed("load.user_fills")
 def get_user_fills_json(
-    address: str, use_cache: bool = True, aggregate_by_time: bool = True
+    address: str,
+    use_cache: bool = True,
+    aggregate_by_time: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
 ) -> list:
     """
     Fetch user fills from the Hyperliquid API.
 
+    Fills are cached in one file per calendar month. Reads only open the
+    months a window touches, and refreshes only refetch the open months.
+    Without a cache, a window is requested from userFillsByTime and is not
+    cached, since it does not hold the full history.
+
     Args:
         address: User address to fetch fills for
         use_cache: Whether to use cached data if available
         aggregate_by_time: Whether to aggregate fills by time (matches API parameter)
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
-        List containing user fills data from the API
+        List containing user fills data from the API, sorted by time when
+        served from the cache
     """
 
     user_fills_dir = os.path.join(cache_dir, "user_fills")
@@ -32,42 +59,106 @@ def get_user_fills_json(
     cache_path = os.path.join(
         user_fills_dir, f"{address.lower()}_user_fills{agg_suffix}.json"
     )
+    partition_dir = os.path.join(
+        user_fills_dir, f"{address.lower()}_user_fills{agg_suffix}"
+    )
+
+    windowed = is_windowed(start_time, end_time)
+    manifest = migrate_partitions(partition_dir, cache_path, event_time)
 
-    if os.path.isfile(cache_path) and use_cache:
-        with open(cache_path, "r") as f:
-            return json.load(f)
+    cached = None
+    if manifest is not None and use_cache:
+        cached = read_partitions(partition_dir, event_time, start_time, end_time)
+        if cached is None:
+            # Refetch from the reopened months
+            manifest = read_manifest(partition_dir)
+
+    if cached is not None:
+        return cached
     else:
         # Make API request to Hyperliquid API
-        url = "https://api-ui.hyperliquid.xyz/info"
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-        }
         payload = {
             "aggregateByTime": aggregate_by_time,
             "type": "userFills",
             "user": address,
         }
+        if manifest is not None:
+            # Closed months never change, only the open ones are refetched
+            payload["type"] = "userFillsByTime"
+            payload["startTime"] = open_from(manifest)
+        elif windowed:
+            payload["type"] = "userFillsByTime"
+            payload["startTime"] = start_time or 0
+            if end_time is not None:
+                payload["endTime"] = end_time - 1
+
+        # Only a cache miss pays for importing requests
+        import requests
+        from utils.http import post_info
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            user_fills = response.json()
+            user_fills = post_info(payload)
+            upsert_events(fills_kind(aggregate_by_time), address, user_fills)
 
-            # Cache the data
-            with open(cache_path, "w") as f:
-                json.dump(user_fills, f, indent=4)
+            if manifest is None and windowed:
+                return time_window(user_fills, event_time, start_time, end_time)
 
-            return user_fills
+            # A response cut at the row cap misses fills past its edge month,
+            # the oldest for userFills and the newest for userFillsByTime
+            partial_month = None
+            if len(user_fills) >= FILLS_ROW_CAP:
+                edge = min if payload["type"] == "userFills" else max
+                partial_month = month_key(edge(map(event_time, user_fills)))
+
+            # Cache the data
+            write_partitions(
+                partition_dir, user_fills, event_time, partial_month=partial_month
+            )
+            return read_partitions(partition_dir, event_time, start_time, end_time)
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch user fills for {address}: {e}")
             raise
 
 
+def append_user_fills(
+    address: str, user_fills: list, aggregate_by_time: bool = True
+) -> int | None:
+    """
+    Add fills received live to the event store and cache.
+
+    Args:
+        address: User address the fills belong to
+        user_fills: Raw fills
+        aggregate_by_time: Whether the fills are aggregated by time
+
+    Returns:
+        Number of fills added to the cache, or None if the address has no
+        cache yet
+    """
+
+    upsert_events(fills_kind(aggregate_by_time), address, user_fills)
+
+    agg_suffix = "_agg" if aggregate_by_time else "_no_agg"
+    partition_dir = os.path.join(
+        cache_dir, "user_fills", f"{address.lower()}_user_fills{agg_suffix}"
+    )
+    return append_partitions(
+        partition_dir,
+        user_fills,
+        event_time,
+        lambda fill: event_key("user_fills", fill)[0],
+    )
+
+
+@timed("dataframe.user_fills")
 def get_user_fills_dataframe(
-    address: str, use_cache: bool = True, aggregate_by_time: bool = True
-) -> pl.DataFrame:
+    address: str,
+    use_cache: bool = True,
+    aggregate_by_time: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> "pl.DataFrame":
     """
     Load user fills into a Polars DataFrame.
 
@@ -75,12 +166,19 @@ def get_user_fills_dataframe(
         address: User address to fetch fills for
         use_cache: Whether to use cached data if available
         aggregate_by_time: Whether to aggregate fills by time
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         Polars DataFrame containing user fills data
     """
 
-    user_fills = get_user_fills_json(address, use_cache, aggregate_by_time)
+    import polars as pl
+    from models.df_models.user_fills import user_fills_schema
+
+    user_fills = get_user_fills_json(
+        address, use_cache, aggregate_by_time, start_time, end_time
+    )
 
     if not user_fills:
         logger.warning(f"No user fills found for address {address}")
@@ -114,8 +212,44 @@ def get_user_fills_dataframe(
     return df
 
 
+def parse_user_fill(fill: dict) -> UserFillsModel:
+    """
+    Parse a raw fill from the API into a UserFillsModel.
+
+    Args:
+        fill: Fill as returned by userFills / userFillsByTime
+
+    Returns:
+        UserFillsModel instance
+    """
+    return UserFillsModel(
+        time=int(fill["time"]),
+        coin=fill.get("coin"),
+        px=float(fill.get("px")),
+        sz=float(fill.get("sz")),
+        side=fill.get("side").lower(),
+        startPosition=float(fill.get("startPosition")),
+        dir=fill.get("dir"),
+        closedPnl=float(fill.get("closedPnl")),
+        hash=fill.get("hash"),
+        oid=int(fill.get("oid")) if fill.get("oid") is not None else None,
+        crossed=fill.get("crossed"),
+        fee=float(fill.get("fee")),
+        tid=int(fill.get("tid")),
+        feeToken=fill.get("feeToken"),
+        twapId=(
+            int(fill.get("twapId")) if fill.get("twapId") is not None else None
+        ),
+    )
+
+
+@timed("parse.user_fills")
 def get_user_fills_pydantic(
-    address: str, use_cache: bool = True, aggregate_by_time: bool = True
+    address: str,
+    use_cache: bool = True,
+    aggregate_by_time: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
 ) -> List[UserFillsModel]:
     """
     Load user fills into a list of Pydantic models.
@@ -124,12 +258,16 @@ def get_user_fills_pydantic(
         address: User address to fetch fills for
         use_cache: Whether to use cached data if available
         aggregate_by_time: Whether to aggregate fills by time
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         List of UserFillsModel instances
     """
 
-    user_fills = get_user_fills_json(address, use_cache, aggregate_by_time)
+    user_fills = get_user_fills_json(
+        address, use_cache, aggregate_by_time, start_time, end_time
+    )
 
     if not user_fills:
         logger.warning(f"No user fills found for address {address}")
@@ -139,26 +277,7 @@ def get_user_fills_pydantic(
     models: List[UserFillsModel] = []
     for fill in user_fills:
         try:
-            model = UserFillsModel(
-                time=int(fill["time"]),
-                coin=fill.get("coin"),
-                px=float(fill.get("px")),
-                sz=float(fill.get("sz")),
-                side=fill.get("side").lower(),
-                startPosition=float(fill.get("startPosition")),
-                dir=fill.get("dir"),
-                closedPnl=float(fill.get("closedPnl")),
-                hash=fill.get("hash"),
-                oid=int(fill.get("oid")) if fill.get("oid") is not None else None,
-                crossed=fill.get("crossed"),
-                fee=float(fill.get("fee")),
-                tid=int(fill.get("tid")),
-                feeToken=fill.get("feeToken"),
-                twapId=(
-                    int(fill.get("twapId")) if fill.get("twapId") is not None else None
-                ),
-            )
-            models.append(model)
+            models.append(parse_user_fill(fill))
         except Exception as e:
             logger.error(f"Error parsing Fill entry into model: {e}")
 
@@ -1,16 +1,24 @@
 from typing import List
 import requests
-import json
 import os
 import polars as pl
 from loguru import logger
 from config import cache_dir
+from loaders.event_store import fills_kind, upsert_events
+from loaders.user_fills import parse_user_fill
 from models.class_models.user_fills import UserFillsModel
 from models.df_models.user_fills import user_fills_schema
+from utils.cache import read_cache_json, write_cache_json
+from utils.http import post_info
+from utils.window import cached_time_window, event_time, is_windowed, time_window
 
 
 def get_user_fills_extended_json(
-    address: str, use_cache: bool = True, aggregate_by_time: bool = True
+    address: str,
+    use_cache: bool = True,
+    aggregate_by_time: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
 ) -> list:
     """
     Fetch user fills from the Hyperliquid API.
@@ -19,6 +27,8 @@ def get_user_fills_extended_json(
         address: User address to fetch fills for
         use_cache: Whether to use cached data if available
         aggregate_by_time: Whether to aggregate fills by time (matches API parameter)
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         List containing user fills data from the API
@@ -33,16 +43,19 @@ def get_user_fills_extended_json(
         user_fills_dir, f"{address.lower()}_user_fills{agg_suffix}.json"
     )
 
+    windowed = is_windowed(start_time, end_time)
+
+    cached = None
     if os.path.isfile(cache_path) and use_cache:
-        with open(cache_path, "r") as f:
-            return json.load(f)
+        if windowed:
+            cached = cached_time_window(cache_path, event_time, start_time, end_time)
+        else:
+            cached = read_cache_json(cache_path)
+
+    if cached is not None:
+        return cached
     else:
         # Make API request to Hyperliquid API
-        url = "https://api-ui.hyperliquid.xyz/info"
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-        }
         payload = {
             "aggregateByTime": aggregate_by_time,
             "type": "userFillsByTime",
@@ -51,17 +64,20 @@ def get_user_fills_extended_json(
             # "endTime": 9999999999 * 1000,
             "endTime": 1747224124296,
         }
+        if windowed:
+            payload["startTime"] = start_time or 0
+            if end_time is not None:
+                payload["endTime"] = end_time - 1
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            user_fills = response.json()
+            user_fills = post_info(payload)
 
             # Cache the data
-            with open(cache_path, "w") as f:
-                json.dump(user_fills, f, indent=4)
+            if not windowed:
+                write_cache_json(cache_path, user_fills)
+            upsert_events(fills_kind(aggregate_by_time), address, user_fills)
 
-            return user_fills
+            return time_window(user_fills, event_time, start_time, end_time)
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch user fills for {address}: {e}")
@@ -69,7 +85,11 @@ def get_user_fills_extended_json(
 
 
 def get_user_fills_extended_pydantic(
-    address: str, use_cache: bool = True, aggregate_by_time: bool = True
+    address: str,
+    use_cache: bool = True,
+    aggregate_by_time: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
 ) -> List[UserFillsModel]:
     """
     Load user fills into a list of Pydantic models.
@@ -78,12 +98,16 @@ def get_user_fills_extended_pydantic(
         address: User address to fetch fills for
         use_cache: Whether to use cached data if available
         aggregate_by_time: Whether to aggregate fills by time
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         List of UserFillsModel instances
     """
 
-    user_fills = get_user_fills_extended_json(address, use_cache, aggregate_by_time)
+    user_fills = get_user_fills_extended_json(
+        address, use_cache, aggregate_by_time, start_time, end_time
+    )
 
     if not user_fills:
         logger.warning(f"No user fills found for address {address}")
@@ -93,26 +117,7 @@ def get_user_fills_extended_pydantic(
     models: List[UserFillsModel] = []
     for fill in user_fills:
         try:
-            model = UserFillsModel(
-                time=int(fill["time"]),
-                coin=fill.get("coin"),
-                px=float(fill.get("px")),
-                sz=float(fill.get("sz")),
-                side=fill.get("side").lower(),
-                startPosition=float(fill.get("startPosition")),
-                dir=fill.get("dir"),
-                closedPnl=float(fill.get("closedPnl")),
-                hash=fill.get("hash"),
-                oid=int(fill.get("oid")) if fill.get("oid") is not None else None,
-                crossed=fill.get("crossed"),
-                fee=float(fill.get("fee")),
-                tid=int(fill.get("tid")),
-                feeToken=fill.get("feeToken"),
-                twapId=(
-                    int(fill.get("twapId")) if fill.get("twapId") is not None else None
-                ),
-            )
-            models.append(model)
+            models.append(parse_user_fill(fill))
         except Exception as e:
             logger.error(f"Error parsing Fill entry into model: {e}")
 
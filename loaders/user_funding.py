@@ -1,21 +1,42 @@
-from typing import List
-import requests
-import json
+from typing import TYPE_CHECKING, List
 import os
-import polars as pl
 from loguru import logger
 from config import cache_dir
+from loaders.event_store import event_key, upsert_events
 from models.class_models.user_funding import UserFundingModel
-from models.df_models.user_funding import user_funding_schema
-
-
-def get_user_funding_json(address: str, use_cache: bool = True) -> list:
+from utils.metrics import timed
+from utils.partitions import (
+    append_partitions,
+    migrate_partitions,
+    open_from,
+    read_manifest,
+    read_partitions,
+    write_partitions,
+)
+from utils.window import event_time, is_windowed, time_window
+
+if TYPE_CHECKING:
+    import polars as pl
+
+
+@timed("load.user_funding")
+def get_user_funding_json(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> list:
     """
     Fetch user funding from the Hyperliquid API.
 
+    Funding is cached in month partitions like fills; closed months are
+    never refetched.
+
     Args:
         address: User address to fetch funding for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         List containing user funding data from the API
@@ -25,48 +46,100 @@ def get_user_funding_json(address: str, use_cache: bool = True) -> list:
     os.makedirs(user_funding_dir, exist_ok=True)
 
     cache_path = os.path.join(user_funding_dir, f"{address.lower()}_user_funding.json")
+    partition_dir = os.path.join(user_funding_dir, f"{address.lower()}_user_funding")
+
+    windowed = is_windowed(start_time, end_time)
+    manifest = migrate_partitions(partition_dir, cache_path, event_time)
 
-    if os.path.isfile(cache_path) and use_cache:
-        with open(cache_path, "r") as f:
-            return json.load(f)
+    cached = None
+    if manifest is not None and use_cache:
+        cached = read_partitions(partition_dir, event_time, start_time, end_time)
+        if cached is None:
+            # Refetch from the reopened months
+            manifest = read_manifest(partition_dir)
+
+    if cached is not None:
+        return cached
     else:
         # Make API request to Hyperliquid API
-        url = "https://api-ui.hyperliquid.xyz/info"
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-        }
         payload = {"type": "userFunding", "user": address}
+        if manifest is not None:
+            payload["startTime"] = open_from(manifest)
+        elif windowed:
+            payload["startTime"] = start_time or 0
+            if end_time is not None:
+                payload["endTime"] = end_time - 1
+
+        # Only a cache miss pays for importing requests
+        import requests
+        from utils.http import post_info
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            user_funding = response.json()
+            user_funding = post_info(payload)
+            upsert_events("user_funding", address, user_funding)
 
-            # Cache the data
-            with open(cache_path, "w") as f:
-                json.dump(user_funding, f, indent=4)
+            if manifest is None and windowed:
+                return time_window(user_funding, event_time, start_time, end_time)
 
-            return user_funding
+            # Cache the data
+            write_partitions(partition_dir, user_funding, event_time)
+            return read_partitions(partition_dir, event_time, start_time, end_time)
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch user funding for {address}: {e}")
             raise
 
 
-def get_user_funding_dataframe(address: str, use_cache: bool = True) -> pl.DataFrame:
+def append_user_funding(address: str, user_funding: list) -> int | None:
+    """
+    Add funding received live to the event store and cache.
+
+    Args:
+        address: User address the funding belongs to
+        user_funding: Raw funding events
+
+    Returns:
+        Number of events added to the cache, or None if the address has no
+        cache yet
+    """
+
+    upsert_events("user_funding", address, user_funding)
+
+    partition_dir = os.path.join(
+        cache_dir, "user_funding", f"{address.lower()}_user_funding"
+    )
+    return append_partitions(
+        partition_dir,
+        user_funding,
+        event_time,
+        lambda funding: event_key("user_funding", funding)[0],
+    )
+
+
+@timed("dataframe.user_funding")
+def get_user_funding_dataframe(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> "pl.DataFrame":
     """
     Load user funding into a Polars DataFrame.
 
     Args:
         address: User address to fetch funding for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         Polars DataFrame containing user funding data
     """
 
-    user_funding = get_user_funding_json(address, use_cache)
+    import polars as pl
+    from models.df_models.user_funding import user_funding_schema
+
+    user_funding = get_user_funding_json(address, use_cache, start_time, end_time)
 
     if not user_funding:
         logger.warning(f"No user funding found for address {address}")
@@ -95,8 +168,37 @@ def get_user_funding_dataframe(address: str, use_cache: bool = True) -> pl.DataF
     return df
 
 
+def parse_user_funding(funding: dict) -> UserFundingModel:
+    """
+    Parse a raw funding payment from the API into a UserFundingModel.
+
+    Args:
+        funding: Funding record as returned by userFunding
+
+    Returns:
+        UserFundingModel instance
+    """
+    delta = funding.get("delta")
+    return UserFundingModel(
+        time=int(funding.get("time")),
+        hash=funding.get("hash"),
+        delta_type=delta.get("type"),
+        coin=delta.get("coin"),
+        usdc=float(delta.get("usdc")),
+        szi=float(delta.get("szi")),
+        fundingRate=float(delta.get("fundingRate")),
+        nSamples=(
+            delta.get("nSamples") if delta.get("nSamples") is not None else None
+        ),
+    )
+
+
+@timed("parse.user_funding")
 def get_user_funding_pydantic(
-    address: str, use_cache: bool = True
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
 ) -> List[UserFundingModel]:
     """
     Load user funding into a list of Pydantic models.
@@ -104,12 +206,14 @@ def get_user_funding_pydantic(
     Args:
         address: User address to fetch funding for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         List of UserFundingModel instances containing user funding data
     """
 
-    user_funding = get_user_funding_json(address, use_cache)
+    user_funding = get_user_funding_json(address, use_cache, start_time, end_time)
 
     if not user_funding:
         logger.warning(f"No user funding found for address {address}")
@@ -119,21 +223,7 @@ def get_user_funding_pydantic(
     funding_models = []
     for funding in user_funding:
         try:
-            delta = funding.get("delta")
-            # print(delta.get("nSamples"))
-            model = UserFundingModel(
-                time=int(funding.get("time")),
-                hash=funding.get("hash"),
-                delta_type=delta.get("type"),
-                coin=delta.get("coin"),
-                usdc=float(delta.get("usdc")),
-                szi=float(delta.get("szi")),
-                fundingRate=float(delta.get("fundingRate")),
-                nSamples=(
-                    delta.get("nSamples") if delta.get("nSamples") is not None else None
-                ),
-            )
-            funding_models.append(model)
+            funding_models.append(parse_user_funding(funding))
         except Exception as e:
             logger.error(f"Error parsing Funding record for address {address}: {e}")
             continue
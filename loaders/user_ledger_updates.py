@@ -1,11 +1,8 @@
-from turtle import mode
-from typing import List
-import requests
-import json
+from typing import TYPE_CHECKING, List
 import os
-import polars as pl
 from loguru import logger
 from config import cache_dir
+from loaders.event_store import event_key, upsert_events
 from models.class_models.user_ledger_updates import (
     AccountActivationGasTxModel,
     AccountClassTransferTxModel,
@@ -18,16 +15,35 @@ from models.class_models.user_ledger_updates import (
     VaultWithdrawTxModel,
     WithdrawTxModel,
 )
-from models.df_models.user_ledger_updates import user_ledger_updates_schema
+from utils.cache import cache_lock, read_cache_json, write_cache_json
+from utils.metrics import timed
+from utils.window import (
+    cached_time_window,
+    event_time,
+    is_windowed,
+    merge_events,
+    time_window,
+)
+
+if TYPE_CHECKING:
+    import polars as pl
 
 
-def get_user_ledger_updates_json(address: str, use_cache: bool = True) -> list:
+@timed("load.user_ledger_updates")
+def get_user_ledger_updates_json(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> list:
     """
     Fetch user non-funding ledger updates from the Hyperliquid API.
 
     Args:
         address: User address to fetch ledger updates for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         List containing user ledger updates data from the API
@@ -40,49 +56,105 @@ def get_user_ledger_updates_json(address: str, use_cache: bool = True) -> list:
         ledger_updates_dir, f"{address.lower()}_ledger_updates.json"
     )
 
+    windowed = is_windowed(start_time, end_time)
+
+    cached = None
     if os.path.isfile(cache_path) and use_cache:
-        with open(cache_path, "r") as f:
-            return json.load(f)
+        if windowed:
+            cached = cached_time_window(cache_path, event_time, start_time, end_time)
+        else:
+            cached = read_cache_json(cache_path)
+
+    if cached is not None:
+        return cached
     else:
         # Make API request to Hyperliquid API
-        url = "https://api-ui.hyperliquid.xyz/info"
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-        }
         payload = {"type": "userNonFundingLedgerUpdates", "user": address}
+        if windowed:
+            payload["startTime"] = start_time or 0
+            if end_time is not None:
+                payload["endTime"] = end_time - 1
+
+        # Only a cache miss pays for importing requests
+        import requests
+        from utils.http import post_info
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            ledger_updates = response.json()
+            ledger_updates = post_info(payload)
 
             # Cache the data
-            with open(cache_path, "w") as f:
-                json.dump(ledger_updates, f, indent=4)
+            if not windowed:
+                write_cache_json(cache_path, ledger_updates)
+            upsert_events("user_ledger_updates", address, ledger_updates)
 
-            return ledger_updates
+            return time_window(ledger_updates, event_time, start_time, end_time)
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch user ledger updates for {address}: {e}")
             raise
 
 
+def append_user_ledger_updates(address: str, ledger_updates: list) -> int | None:
+    """
+    Add ledger updates received live to the event store and cache.
+
+    Args:
+        address: User address the updates belong to
+        ledger_updates: Raw non-funding ledger updates
+
+    Returns:
+        Number of updates added to the cache, or None if the address has no
+        cache yet
+    """
+
+    upsert_events("user_ledger_updates", address, ledger_updates)
+
+    cache_path = os.path.join(
+        cache_dir, "user_ledger_updates", f"{address.lower()}_ledger_updates.json"
+    )
+    with cache_lock(cache_path):
+        cached = read_cache_json(cache_path)
+        if cached is None:
+            return None
+
+        merged, added = merge_events(
+            cached,
+            ledger_updates,
+            event_time,
+            lambda update: event_key("user_ledger_updates", update)[0],
+        )
+        if added:
+            write_cache_json(cache_path, merged)
+
+    return added
+
+
+@timed("dataframe.user_ledger_updates")
 def get_user_ledger_updates_dataframe(
-    address: str, use_cache: bool = True
-) -> pl.DataFrame:
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> "pl.DataFrame":
     """
     Load user non-funding ledger updates into a Polars DataFrame.
 
     Args:
         address: User address to fetch ledger updates for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
 
     Returns:
         Polars DataFrame containing user ledger updates data
     """
 
-    ledger_updates = get_user_ledger_updates_json(address, use_cache)
+    import polars as pl
+    from models.df_models.user_ledger_updates import user_ledger_updates_schema
+
+    ledger_updates = get_user_ledger_updates_json(
+        address, use_cache, start_time, end_time
+    )
 
     if not ledger_updates:
         logger.warning(f"No user ledger updates found for address {address}")
@@ -137,8 +209,148 @@ def get_user_ledger_updates_dataframe(
     return df
 
 
+def parse_user_ledger_update(update: dict) -> TxModel | None:
+    """
+    Parse a raw non-funding ledger update from the API into a TxModel.
+
+    Args:
+        update: Ledger update as returned by userNonFundingLedgerUpdates
+
+    Returns:
+        TxModel instance, or None if the delta type is unknown
+    """
+
+    time = int(update.get("time"))
+    hash = update.get("hash")
+    delta = update.get("delta")
+    type = delta.get("type")
+
+    if type == "deposit":
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=DepositTxModel(
+                type="deposit", usdc=float(delta.get("usdc", 0.0))
+            ),
+        )
+
+    elif type == "withdraw":
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=WithdrawTxModel(
+                type="withdraw",
+                usdc=float(delta.get("usdc", 0.0)),
+                nonce=delta.get("nonce"),
+                fee=float(delta.get("fee", 0.0)),
+            ),
+        )
+        
+    elif type == "vaultDeposit":
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=VaultDepositTxModel(
+                type="vaultDeposit",
+                vault=delta.get("vault"),
+                usdc=float(delta.get("usdc", 0.0)),
+            ),
+        )
+        
+    elif type == "vaultWithdraw":
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=VaultWithdrawTxModel(
+                type="vaultWithdraw",
+                vault=delta.get("vault"),
+                user=delta.get("user"),
+                requestedUsd=float(delta.get("requestedUsd")),
+                commission=float(delta.get("commission")),
+                closingCost=float(delta.get("closingCost")),
+                basis=float(delta.get("basis")),
+                netWithdrawnUsd=float(delta.get("netWithdrawnUsd")),
+            ),
+        )
+
+    elif type == "internalTransfer":
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=InternalTransferTxModel(
+                type="internalTransfer",
+                usdc=float(delta.get("usdc", 0.0)),
+                user=delta.get("user"),
+                destination=delta.get("destination"),
+                fee=float(delta.get("fee", 0.0)),
+            ),
+        )
+
+    elif type == "accountClassTransfer":
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=AccountClassTransferTxModel(
+                type="accountClassTransfer",
+                usdc=float(delta.get("usdc", 0.0)),
+                toPerp=delta.get("toPerp"),
+            ),
+        )
+
+    elif type == "spotTransfer":
+        feeToken = delta.get("feeToken")
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=SpotTransferTxModel(
+                type="spotTransfer",
+                token=delta.get("token"),
+                amount=float(delta.get("amount", 0.0)),
+                usdcValue=float(delta.get("usdcValue", 0.0)),
+                user=delta.get("user"),
+                destination=delta.get("destination"),
+                fee=float(delta.get("fee", 0.0)),
+                nativeTokenFee=float(delta.get("nativeTokenFee", 0.0)),
+                feeToken=feeToken if feeToken else None,
+            ),
+        )
+
+    elif type == "cStakingTransfer":
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=CStakingTransferTxModel(
+                type="cStakingTransfer",
+                token=delta.get("token"),
+                amount=float(delta.get("amount", 0.0)),
+                isDeposit=delta.get("isDeposit"),
+            ),
+        )
+
+    elif type == "accountActivationGas":
+        return TxModel(
+            time=time,
+            hash=hash,
+            delta=AccountActivationGasTxModel(
+                type="accountActivationGas",
+                amount=float(delta.get("amount", 0.0)),
+                token=delta.get("token"),
+            ),
+        )
+
+    else:
+        logger.error(
+            f"Unknown ledger update type: {type} in transaction {hash}"
+        )
+        return None
+
+
+@timed("parse.user_ledger_updates")
 def get_user_ledger_updates_pydantic(
-    address: str, use_cache: bool = True
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
 ) -> List[TxModel]:
     """
     Load user non-funding ledger updates into a list of Pydantic models.
@@ -146,11 +358,15 @@ def get_user_ledger_updates_pydantic(
     Args:
         address: User address to fetch ledger updates for
         use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
     Returns:
         List of TxModel instances containing user ledger updates data
     """
 
-    ledger_updates = get_user_ledger_updates_json(address, use_cache)
+    ledger_updates = get_user_ledger_updates_json(
+        address, use_cache, start_time, end_time
+    )
 
     if not ledger_updates:
         logger.warning(f"No user ledger updates found for address {address}")
@@ -160,148 +376,10 @@ def get_user_ledger_updates_pydantic(
     for update in ledger_updates:
         try:
 
-            time = int(update.get("time"))
-            hash = update.get("hash")
-            delta = update.get("delta")
-            type = delta.get("type")
-
-            if type == "deposit":
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=DepositTxModel(
-                        type="deposit", usdc=float(delta.get("usdc", 0.0))
-                    ),
-                )
-
-                models.append(model)
-
-            elif type == "withdraw":
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=WithdrawTxModel(
-                        type="withdraw",
-                        usdc=float(delta.get("usdc", 0.0)),
-                        nonce=delta.get("nonce"),
-                        fee=float(delta.get("fee", 0.0)),
-                    ),
-                )
-
-                models.append(model)
-                
-            elif type == "vaultDeposit":
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=VaultDepositTxModel(
-                        type="vaultDeposit",
-                        vault=delta.get("vault"),
-                        usdc=float(delta.get("usdc", 0.0)),
-                    ),
-                )
-
-                models.append(model)
-                
-            elif type == "vaultWithdraw":
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=VaultWithdrawTxModel(
-                        type="vaultWithdraw",
-                        vault=delta.get("vault"),
-                        user=delta.get("user"),
-                        requestedUsd=float(delta.get("requestedUsd")),
-                        commission=float(delta.get("commission")),
-                        closingCost=float(delta.get("closingCost")),
-                        basis=float(delta.get("basis")),
-                        netWithdrawnUsd=float(delta.get("netWithdrawnUsd")),
-                    ),
-                )
-
+            model = parse_user_ledger_update(update)
+            if model is not None:
                 models.append(model)
 
-            elif type == "internalTransfer":
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=InternalTransferTxModel(
-                        type="internalTransfer",
-                        usdc=float(delta.get("usdc", 0.0)),
-                        user=delta.get("user"),
-                        destination=delta.get("destination"),
-                        fee=float(delta.get("fee", 0.0)),
-                    ),
-                )
-
-                models.append(model)
-
-            elif type == "accountClassTransfer":
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=AccountClassTransferTxModel(
-                        type="accountClassTransfer",
-                        usdc=float(delta.get("usdc", 0.0)),
-                        toPerp=delta.get("toPerp"),
-                    ),
-                )
-
-                models.append(model)
-
-            elif type == "spotTransfer":
-                feeToken = delta.get("feeToken")
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=SpotTransferTxModel(
-                        type="spotTransfer",
-                        token=delta.get("token"),
-                        amount=float(delta.get("amount", 0.0)),
-                        usdcValue=float(delta.get("usdcValue", 0.0)),
-                        user=delta.get("user"),
-                        destination=delta.get("destination"),
-                        fee=float(delta.get("fee", 0.0)),
-                        nativeTokenFee=float(delta.get("nativeTokenFee", 0.0)),
-                        feeToken=feeToken if feeToken else None,
-                    ),
-                )
-
-                models.append(model)
-
-            elif type == "cStakingTransfer":
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=CStakingTransferTxModel(
-                        type="cStakingTransfer",
-                        token=delta.get("token"),
-                        amount=float(delta.get("amount", 0.0)),
-                        isDeposit=delta.get("isDeposit"),
-                    ),
-                )
-
-                models.append(model)
-
-            elif type == "accountActivationGas":
-                model = TxModel(
-                    time=time,
-                    hash=hash,
-                    delta=AccountActivationGasTxModel(
-                        type="accountActivationGas",
-                        amount=float(delta.get("amount", 0.0)),
-                        token=delta.get("token"),
-                    ),
-                )
-
-                models.append(model)
-
-            else:
-                logger.error(
-                    f"Unknown ledger update type: {type} in transaction {hash}"
-                )
-                continue
-
         except Exception as e:
             logger.error(f"Error processing ledger update {update}: {e}")
             continue
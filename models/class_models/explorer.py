@@ -21,3 +21,27 @@ class UpdateLeverageModel(BaseModel):
     @property
     def datetime(self):
         return datetime.fromtimestamp(self.time / 1000, tz=timezone.utc)
+
+
+class UpdateIsolatedMarginModel(BaseModel):
+    """
+    User Update Isolated Margin Model
+    """
+
+    name: str = "updateIsolatedMargin"
+    time: int = Field(..., description="Timestamp in milliseconds")
+    user: str = Field(..., description="User address")
+    asset: int = Field(..., description="Asset ID")
+    isBuy: bool = Field(..., description="Side of the isolated position")
+    ntli: int = Field(..., description="Margin added (negative when removed) in micro USDC")
+    block: int = Field(..., description="Block number")
+    hash: str = Field(..., description="Transaction hash")
+    error: Union[str, None] = Field(None, description="Error message if any")
+
+    @property
+    def usdc(self) -> float:
+        return self.ntli / 1e6
+
+    @property
+    def datetime(self):
+        return datetime.fromtimestamp(self.time / 1000, tz=timezone.utc)
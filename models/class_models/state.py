@@ -31,6 +31,17 @@ class PerpPositionModel(BaseModel):
     usdc_value: float = Field(..., description="The USDC value of the perp position.")
 
 
+class MarginModel(BaseModel):
+    """
+    Represents the margin settings and usage of a user for a perp asset.
+    """
+
+    token: str = Field(..., description="The token symbol of the perp asset.")
+    leverage: float = Field(10, description="The leverage set for the asset.")
+    is_cross: bool = Field(True, description="Whether the asset uses cross margin.")
+    margin_used: float = Field(0.0, description="The USDC margin posted for the asset.")
+
+
 class StateModel(BaseModel):
     """
     Represents the state of a user in the system.
@@ -49,6 +60,9 @@ class StateModel(BaseModel):
     vault_positions: Dict[str, VaultPositionModel] = Field(
         default_factory=dict, description="Vault positions indexed by vault identifier."
     )
+    margins: Dict[str, MarginModel] = Field(
+        default_factory=dict, description="Margin settings indexed by token symbol."
+    )
 
 
 class StateUpdateModel(BaseModel):
@@ -49,3 +49,36 @@ class TWAPModel(BaseModel):
     @property
     def datetime(self):
         return datetime.fromtimestamp(self.time / 1000, tz=timezone.utc)
+
+
+class TwapFillMismatchModel(BaseModel):
+    """
+    Mismatch between a TWAP's reported totals and the sum of its child fills
+
+    Attributes:
+        twapId (int): The TWAP order ID.
+        coin (str): The coin symbol.
+        executedSz (float): The executed size reported by the TWAP.
+        filledSz (float): The summed size of the linked fills.
+        executedNtl (float): The executed notional reported by the TWAP.
+        filledNtl (float): The summed notional of the linked fills.
+        fills (int): The number of linked fills.
+    """
+
+    twapId: int = Field(..., description="TWAP order ID")
+    coin: str = Field(..., description="Coin symbol")
+    executedSz: float = Field(..., description="Executed size reported by the TWAP")
+    filledSz: float = Field(..., description="Summed size of the linked fills")
+    executedNtl: float = Field(..., description="Executed notional reported by the TWAP")
+    filledNtl: float = Field(..., description="Summed notional of the linked fills")
+    fills: int = Field(..., description="Number of linked fills")
+
+    @property
+    def size_gap(self) -> float:
+        """Executed size not covered by the linked fills"""
+        return self.executedSz - self.filledSz
+
+    @property
+    def notional_gap(self) -> float:
+        """Executed notional not covered by the linked fills"""
+        return self.executedNtl - self.filledNtl
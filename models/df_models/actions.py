@@ -17,6 +17,9 @@ actions_type_enum = pl.Enum(
         "Auto-Deleveraging",
         "InternalTransfer",
         "Open Short",
+        "Close Short",
+        "Open Long",
+        "Close Long",
         "Sell",
         "Buy",
         "Withdraw",
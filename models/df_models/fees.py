@@ -0,0 +1,25 @@
+import polars as pl
+
+fee_event_enum = pl.Enum(
+    [
+        "fill",
+        "withdraw",
+        "internalTransfer",
+        "spotTransfer",
+        "spotTransferNative",
+        "accountActivationGas",
+    ]
+)
+
+# Schema for fees extracted from fills and ledger updates
+fees_schema = pl.Schema(
+    {
+        "time": pl.Datetime("ms"),
+        "address": pl.String,
+        "event_type": fee_event_enum,
+        "coin": pl.String,
+        "fee_token": pl.String,
+        "fee": pl.Float64,
+        "hash": pl.String,
+    }
+)
@@ -9,6 +9,8 @@ delta_type_enum = pl.Enum(
         "internalTransfer",
         "deposit",
         "accountActivationGas",
+        "vaultDeposit",
+        "vaultWithdraw",
     ]
 )
 # Schema for user non-funding ledger updates data
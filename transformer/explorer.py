@@ -1,8 +1,8 @@
 from loguru import logger
-from models.class_models.explorer import UpdateLeverageModel
-from models.class_models.state import PerpPositionModel, StateModel, StateUpdateModel
-from models.class_models.user_ledger_updates import TxModel
+from models.class_models.explorer import UpdateIsolatedMarginModel, UpdateLeverageModel
+from models.class_models.state import StateModel, StateUpdateModel
 from transformer.state import state_update
+from transformer.margin import margin_update, set_leverage
 from constants.coin_id import coin_id_map
 
 
@@ -10,17 +10,35 @@ def user_leverage_update(
     state: StateModel, leverage_update: UpdateLeverageModel
 ) -> StateModel:
     time = leverage_update.datetime
-    token = coin_id_map.get(str(leverage_update.asset), leverage_update.asset)
-    new_state_update = StateUpdateModel(
+    asset = str(leverage_update.asset)
+    token = coin_id_map.get(asset, asset)
+
+    # No change in size or balance, leverage lives in the margin component
+    return set_leverage(
+        state,
+        token,
+        leverage=leverage_update.leverage,
+        is_cross=leverage_update.isCross,
         time=int(time.timestamp() * 1000),
-        token=token,
-        is_perp=True,
-        delta=0.0,  # No change in size or balance, just updating leverage
     )
-    # state_updates = [new_state_update]
-    new_state = state_update(state, new_state_update)
 
-    # Update the leverage in the perp position if it exists
-    new_state.perp_positions[token].leverage = leverage_update.leverage
 
-    return new_state
+def user_isolated_margin_update(
+    state: StateModel, margin_update_tx: UpdateIsolatedMarginModel
+) -> StateModel:
+    time = margin_update_tx.datetime
+    asset = str(margin_update_tx.asset)
+    token = coin_id_map.get(asset, asset)
+    usdc = margin_update_tx.usdc
+
+    # margin moves between perp_usdc and the isolated position
+    new_state = state_update(
+        state,
+        StateUpdateModel(
+            time=int(time.timestamp() * 1000),
+            token="USDC",
+            is_perp=True,
+            delta=-usdc,
+        ),
+    )
+    return margin_update(new_state, token, usdc)
@@ -0,0 +1,226 @@
+import heapq
+import time
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from models.class_models.state import (
+    MarginModel,
+    PerpPositionModel,
+    SpotPositionModel,
+    StateModel,
+    VaultPositionModel,
+)
+from models.class_models.user_ledger_updates import TxModel
+from transformer.replay import UpdateModel, apply_update, get_user_updates
+from transformer.state import init_state
+from utils.metrics import record, timed
+
+# Ledger updates moving funds from one user to another
+TRANSFER_TYPES = ("internalTransfer", "spotTransfer")
+
+
+def get_group_updates(
+    addresses: Iterable[str], use_cache: bool = True
+) -> Dict[str, List[UpdateModel]]:
+    """
+    Load the time sorted updates of every member of a group.
+
+    Args:
+        addresses: Member addresses
+        use_cache: Whether to use cached data if available
+
+    Returns:
+        Dictionary of lowercased member address to its updates
+    """
+
+    return {
+        address.lower(): get_user_updates(address, use_cache) for address in addresses
+    }
+
+
+def _tagged(
+    address: str, updates: List[UpdateModel]
+) -> Iterator[Tuple[str, UpdateModel]]:
+    for update in updates:
+        yield address, update
+
+
+def merge_member_updates(
+    updates: Dict[str, List[UpdateModel]],
+) -> Iterator[Tuple[str, UpdateModel]]:
+    """
+    K-way merge of the time sorted updates of every member.
+
+    Args:
+        updates: Member address to its updates sorted by time
+
+    Returns:
+        Iterator of (member address, update) in time order, ties in member order
+    """
+
+    return heapq.merge(
+        *(_tagged(address, updates[address]) for address in updates),
+        key=lambda item: item[1].time,
+    )
+
+
+def internal_transfer(
+    update: UpdateModel, members: Set[str]
+) -> Tuple[str, str] | None:
+    """
+    Sender and receiver of a transfer between two members of a group.
+
+    Args:
+        update: Any update
+        members: Lowercased member addresses
+
+    Returns:
+        Tuple of (sender, receiver), or None if the update is not a transfer
+        within the group
+    """
+
+    if not isinstance(update, TxModel) or update.delta.type not in TRANSFER_TYPES:
+        return None
+    sender = update.delta.user.lower()
+    receiver = update.delta.destination.lower()
+    if sender in members and receiver in members and sender != receiver:
+        return sender, receiver
+    return None
+
+
+def consolidate_states(
+    group: str, states: Dict[str, StateModel], time: int
+) -> StateModel:
+    """
+    Sum the states of every member into the state of the group.
+
+    Balances, sizes and margin used are summed per token. Leverage and margin
+    mode are those of the last member holding the asset, and the entry price
+    of a perp position is the size weighted average of the members'.
+
+    Args:
+        group: Name of the group, used as the user of the state
+        states: Member address to its state
+        time: Time of the consolidated state
+
+    Returns:
+        Consolidated state
+    """
+
+    spot: Dict[str, SpotPositionModel] = {}
+    perp: Dict[str, PerpPositionModel] = {}
+    vaults: Dict[str, VaultPositionModel] = {}
+    margins: Dict[str, MarginModel] = {}
+
+    for state in states.values():
+        for token, position in state.spot_positions.items():
+            total = spot.setdefault(
+                token, SpotPositionModel(token=token, balance=0.0, usdc_value=0.0)
+            )
+            total.balance += position.balance
+            total.usdc_value += position.usdc_value
+
+        for token, position in state.perp_positions.items():
+            total = perp.get(token)
+            if total is None:
+                perp[token] = position.model_copy()
+                continue
+            size = total.size + position.size
+            cost = total.entry_price * total.size + position.entry_price * position.size
+            total.entry_price = cost / size if size else 0.0
+            total.size = size
+            total.leverage = position.leverage
+            total.usdc_value += position.usdc_value
+
+        for vault, position in state.vault_positions.items():
+            total = vaults.setdefault(
+                vault, VaultPositionModel(vault=vault, balance=0.0, usdc_value=0.0)
+            )
+            total.balance += position.balance
+            total.usdc_value += position.usdc_value
+
+        for token, margin in state.margins.items():
+            total = margins.get(token)
+            if total is None:
+                margins[token] = margin.model_copy()
+                continue
+            total.margin_used += margin.margin_used
+            total.leverage = margin.leverage
+            total.is_cross = margin.is_cross
+
+    return StateModel(
+        user=group,
+        time=time,
+        spot_usdc=sum(state.spot_usdc for state in states.values()),
+        perp_usdc=sum(state.perp_usdc for state in states.values()),
+        spot_positions=spot,
+        perp_positions=perp,
+        vault_positions=vaults,
+        margins=margins,
+    )
+
+
+@timed("replay_group", count=lambda result: len(result[2]))
+def replay_group(
+    group: str, updates: Dict[str, List[UpdateModel]]
+) -> Tuple[StateModel, Dict[str, StateModel], List[dict]]:
+    """
+    Replay the updates of every member of a group in a single pass.
+
+    A transfer between two members is listed by both, it is applied to both
+    members at its first occurrence and skipped at the second, so the group
+    state only ever sees its fees. Timeline entries of such transfers are
+    flagged internal to tell them apart from flows in and out of the group.
+
+    Args:
+        group: Name of the group, e.g. a key of constants.strategies.strategies
+        updates: Lowercased member address to its updates sorted by time
+
+    Returns:
+        Tuple of (consolidated final state, member address to its final
+        state, timeline of {time, member, internal, update, new_state,
+        member_states} dumps where new_state is consolidated and
+        member_states holds the members the update changed)
+    """
+
+    members = {address: init_state(address, 0) for address in updates}
+    addresses = set(members)
+    applied: Set[str] = set()
+    out = []
+    dump_seconds = 0.0
+
+    for address, update in merge_member_updates(updates):
+        transfer = internal_transfer(update, addresses)
+        if transfer is not None:
+            if update.hash in applied:
+                continue
+            applied.add(update.hash)
+            touched = transfer
+        else:
+            touched = (address,)
+
+        changed = {}
+        for member in touched:
+            state = apply_update(members[member], update)
+            if state is not None:
+                members[member] = changed[member] = state
+        if not changed:
+            continue
+
+        start = time.perf_counter()
+        consolidated = consolidate_states(group, members, update.time)
+        out.append(
+            {
+                "time": update.time,
+                "member": address,
+                "internal": transfer is not None,
+                "update": update.model_dump(),
+                "new_state": consolidated.model_dump(),
+                "member_states": {
+                    member: state.model_dump() for member, state in changed.items()
+                },
+            }
+        )
+        dump_seconds += time.perf_counter() - start
+
+    record("replay_group.dump", dump_seconds, group, events=len(out), calls=len(out))
+    last_time = out[-1]["time"] if out else 0
+    return consolidate_states(group, members, last_time), members, out
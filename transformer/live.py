@@ -0,0 +1,367 @@
+"""
+Live state of an address, updated from websocket messages as they arrive.
+
+    python -m transformer.live 0x1c020f03305acd09994c1910d440646e4a5f91b0
+"""
+
+import argparse
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Set, Tuple
+from loguru import logger
+import config
+from config import REFRESH
+from loaders.event_store import event_key
+from loaders.user_fills import append_user_fills, get_user_fills_json
+from loaders.user_funding import append_user_funding, get_user_funding_json
+from loaders.user_ledger_updates import (
+    append_user_ledger_updates,
+    get_user_ledger_updates_json,
+)
+from models.class_models.state import StateModel
+from transformer.memo import replay_address
+from transformer.replay import (
+    EVENT_PARSERS,
+    UpdateModel,
+    apply_update,
+    get_user_updates,
+    replay_updates,
+)
+from utils.window import event_time
+
+if TYPE_CHECKING:
+    from hyperliquid.websocket_manager import WebsocketManager
+
+# Websocket channel of each live event kind and the data field holding its events
+LIVE_CHANNELS = {
+    "userFills": ("user_fills", "fills"),
+    "userFundings": ("user_funding", "fundings"),
+    "userNonFundingLedgerUpdates": ("user_ledger_updates", "nonFundingLedgerUpdates"),
+}
+
+# Funding has no transaction, the API reports it with an all zero hash
+FUNDING_HASH = "0x" + "0" * 64
+
+# Loaders reading and appending the cached history of each live event kind
+LIVE_LOADERS: Dict[str, Callable[..., list]] = {
+    "user_fills": get_user_fills_json,
+    "user_funding": get_user_funding_json,
+    "user_ledger_updates": get_user_ledger_updates_json,
+}
+LIVE_APPENDERS: Dict[str, Callable[[str, list], int | None]] = {
+    "user_fills": append_user_fills,
+    "user_funding": append_user_funding,
+    "user_ledger_updates": append_user_ledger_updates,
+}
+
+
+def live_subscriptions(address: str) -> List[dict]:
+    """Websocket subscriptions carrying the state changing events of an address."""
+    return [
+        {"type": "userFills", "user": address, "aggregateByTime": True},
+        {"type": "userFundings", "user": address},
+        {"type": "userNonFundingLedgerUpdates", "user": address},
+    ]
+
+
+def normalize_ws_funding(funding: dict) -> dict:
+    """
+    Reshape a websocket funding event like the userFunding endpoint returns it.
+
+    Args:
+        funding: Funding event from the userFundings channel
+
+    Returns:
+        Raw funding event accepted by parse_user_funding
+    """
+
+    return {
+        "time": funding["time"],
+        "hash": funding.get("hash", FUNDING_HASH),
+        "delta": {
+            "type": "funding",
+            "coin": funding["coin"],
+            "usdc": funding["usdc"],
+            "szi": funding["szi"],
+            "fundingRate": funding["fundingRate"],
+            "nSamples": funding.get("nSamples"),
+        },
+    }
+
+
+def normalize_ws_events(channel: str, data: dict) -> Tuple[str, list] | None:
+    """
+    Event kind and raw API shaped events of a websocket message.
+
+    Args:
+        channel: Channel of the message
+        data: Data of the message
+
+    Returns:
+        Tuple of (event kind, raw events), or None for other channels
+    """
+
+    if channel not in LIVE_CHANNELS:
+        return None
+    kind, field = LIVE_CHANNELS[channel]
+    events = data.get(field) or []
+    if kind == "user_funding":
+        events = [normalize_ws_funding(funding) for funding in events]
+    return kind, events
+
+
+class LiveReplay:
+    """
+    State of an address kept current from websocket messages.
+
+    The state is seeded from a replay of the cached history, then every
+    fill, funding and non-funding ledger update is parsed into the same
+    models as the replay and applied with apply_update as it arrives.
+    Received events are appended to the event store and cache from a
+    background thread, so disk writes never delay the state.
+
+    Each event kind keeps a watermark: events before it are dropped and
+    events at it only applied once, so the snapshot sent on (re)connect
+    never applies an event twice.
+
+    TWAP residuals and explorer margin updates have no user channel and
+    only reach the state through the next replay.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        use_cache: bool = True,
+        persist: bool = True,
+        flush_interval: float = 1.0,
+        on_update: Callable[[StateModel, UpdateModel], None] | None = None,
+    ):
+        """
+        Args:
+            address: User address to follow
+            use_cache: Whether to seed from cached data if available
+            persist: Whether to append received events to the event cache
+            flush_interval: Seconds between appends to the event cache
+            on_update: Called with the new state and update after each update
+        """
+
+        self.address = address
+        self.use_cache = use_cache
+        self.persist = persist
+        self.flush_interval = flush_interval
+        self.on_update = on_update
+
+        self.applied = 0
+        self._state: StateModel | None = None
+        self._lock = threading.Lock()
+        # Kind -> (time of the latest applied event, ids of the events at that time)
+        self._watermarks: Dict[str, Tuple[int, Set[str]]] = {}
+        self._pending: Dict[str, list] = {kind: [] for kind in LIVE_LOADERS}
+        self._ws: "WebsocketManager | None" = None
+        self._stop = threading.Event()
+        self._flusher: threading.Thread | None = None
+
+    @property
+    def state(self) -> StateModel | None:
+        """Current state, transformers never mutate a state they return."""
+        with self._lock:
+            return self._state
+
+    def seed(self, end_time: int | None = None) -> StateModel:
+        """
+        Replay the history of the address up to now or to end_time.
+
+        Args:
+            end_time: Exclusive upper bound in ms of the seeding replay
+
+        Returns:
+            Seeded state
+        """
+
+        if end_time is None:
+            state, _ = replay_address(self.address, self.use_cache)
+        else:
+            updates = get_user_updates(
+                self.address, self.use_cache, end_time=end_time
+            )
+            state, _ = replay_updates(self.address, updates)
+
+        # Latest replayed event of each kind, read back from the caches the
+        # replay just loaded or refreshed rather than fetched a second time
+        watermarks = {}
+        for kind, loader in LIVE_LOADERS.items():
+            events = loader(self.address, use_cache=True, end_time=end_time)
+            last_time = max(map(event_time, events), default=0)
+            watermarks[kind] = (
+                last_time,
+                {
+                    event_key(kind, event)[0]
+                    for event in events
+                    if event_time(event) == last_time
+                },
+            )
+
+        with self._lock:
+            self._state = state
+            self._watermarks = watermarks
+        logger.info(
+            f"Seeded live state of {self.address} up to "
+            f"{max(mark[0] for mark in watermarks.values())}"
+        )
+        return state
+
+    def _fresh(self, kind: str, events: list) -> list:
+        """Events not applied yet, in time order."""
+        mark_time, mark_ids = self._watermarks.get(kind, (0, set()))
+        fresh = []
+        for event in sorted(events, key=event_time):
+            time_ms = event_time(event)
+            if time_ms < mark_time:
+                continue
+            uid = event_key(kind, event)[0]
+            if time_ms == mark_time and uid in mark_ids:
+                continue
+            if time_ms > mark_time:
+                mark_time, mark_ids = time_ms, set()
+            mark_ids.add(uid)
+            fresh.append(event)
+        self._watermarks[kind] = (mark_time, mark_ids)
+        return fresh
+
+    def on_message(self, message: dict) -> int:
+        """
+        Apply the events of a websocket message to the state.
+
+        Args:
+            message: Decoded websocket message
+
+        Returns:
+            Number of updates applied
+        """
+
+        normalized = normalize_ws_events(
+            message.get("channel"), message.get("data") or {}
+        )
+        if normalized is None:
+            return 0
+        kind, events = normalized
+
+        applied = 0
+        with self._lock:
+            if self._state is None:
+                raise RuntimeError("Live state must be seeded before applying messages")
+
+            for event in self._fresh(kind, events):
+                try:
+                    update = EVENT_PARSERS[kind](event)
+                except Exception as e:
+                    logger.error(f"Failed to parse live {kind} event {event}: {e}")
+                    continue
+                if update is None:
+                    continue
+
+                new_state = apply_update(self._state, update)
+                if new_state is None:
+                    continue
+                self._state = new_state
+                self._pending[kind].append(event)
+                applied += 1
+
+                if self.on_update is not None:
+                    self.on_update(new_state, update)
+
+            self.applied += applied
+
+        if applied:
+            logger.debug(f"Applied {applied} live {kind} updates for {self.address}")
+        return applied
+
+    def flush(self) -> Dict[str, int | None]:
+        """
+        Append the events received since the last flush to the event cache.
+
+        Returns:
+            Dictionary of event kind to number of events added to the cache
+        """
+
+        with self._lock:
+            pending = self._pending
+            self._pending = {kind: [] for kind in LIVE_LOADERS}
+
+        return {
+            kind: LIVE_APPENDERS[kind](self.address, events)
+            for kind, events in pending.items()
+            if events
+        }
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to append live events for {self.address}: {e}")
+
+    def start(self, base_url: str | None = None) -> None:
+        """
+        Seed the state if needed and subscribe to the live channels.
+
+        Args:
+            base_url: API URL the websocket is derived from, config.ws_api_url
+                by default
+        """
+
+        # The SDK pulls in its eth dependencies, only live mode needs it
+        from hyperliquid.websocket_manager import WebsocketManager
+
+        if self._state is None:
+            self.seed()
+
+        self._stop.clear()
+        self._ws = WebsocketManager(base_url or config.ws_api_url)
+        self._ws.start()
+        for subscription in live_subscriptions(self.address):
+            self._ws.subscribe(subscription, self.on_message)
+
+        if self.persist:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def stop(self) -> None:
+        """Close the websocket and append whatever is still pending."""
+        if self._ws is not None:
+            self._ws.stop()
+            self._ws = None
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        if self.persist:
+            self.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("address")
+    parser.add_argument("--url", default=None, help="API URL of the websocket")
+    parser.add_argument("--no-persist", action="store_true")
+    args = parser.parse_args()
+
+    live = LiveReplay(
+        args.address,
+        use_cache=not REFRESH,
+        persist=not args.no_persist,
+        on_update=lambda state, update: logger.info(
+            f"{type(update).__name__} at {update.time}: perp {state.perp_usdc:.2f} USDC, "
+            f"spot {state.spot_usdc:.2f} USDC, {len(state.perp_positions)} perp positions"
+        ),
+    )
+    live.start(args.url)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        live.stop()
+
+
+if __name__ == "__main__":
+    main()
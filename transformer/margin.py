@@ -0,0 +1,107 @@
+from models.class_models.state import MarginModel, StateModel
+from transformer.state import DEFAULT_LEVERAGE
+
+
+def get_leverage(state: StateModel, token: str) -> float:
+    """Leverage set for a perp asset, falling back to the exchange default."""
+    margin = state.margins.get(token)
+    return margin.leverage if margin is not None else DEFAULT_LEVERAGE
+
+
+def get_margin_used(state: StateModel, token: str) -> float:
+    """USDC margin posted for a perp asset, 0 when none is."""
+    margin = state.margins.get(token)
+    return margin.margin_used if margin is not None else 0.0
+
+
+def position_margin(
+    margin_used: float, size: float, delta: float, px: float, leverage: float
+) -> float:
+    """
+    Margin used by a perp position after a fill.
+
+    Fills growing the position post margin for their notional at the leverage
+    of the asset, reducing fills release the posted margin pro rata to the
+    size they close, and a fill flipping the position posts margin for the
+    size on the new side, so no margin is used once the position is flat.
+
+    Args:
+        margin_used: Margin used before the fill
+        size: Signed position size before the fill
+        delta: Signed size of the fill
+        px: Fill price
+        leverage: Leverage of the asset
+
+    Returns:
+        Margin used after the fill
+    """
+    new_size = size + delta
+    if size == 0 or size * new_size < 0:
+        return abs(new_size) * px / leverage
+    if abs(new_size) >= abs(size):
+        return margin_used + abs(delta) * px / leverage
+    return margin_used * abs(new_size) / abs(size)
+
+
+def set_leverage(
+    state: StateModel, token: str, leverage: float, is_cross: bool, time: int
+) -> StateModel:
+    """
+    Set the leverage and margin mode of a perp asset without touching positions.
+
+    Args:
+        state: Current state
+        token: Standardized token symbol
+        leverage: New leverage
+        is_cross: Whether the asset uses cross margin
+        time: Timestamp of the update in milliseconds
+
+    Returns:
+        New state with the margin settings updated
+    """
+    old_margin = state.margins.get(token)
+    new_margins = state.margins.copy()
+    new_margins[token] = MarginModel(
+        token=token,
+        leverage=leverage,
+        is_cross=is_cross,
+        margin_used=old_margin.margin_used if old_margin is not None else 0.0,
+    )
+
+    new_perp_positions = state.perp_positions
+    position = state.perp_positions.get(token)
+    if position is not None:
+        new_perp_positions = state.perp_positions.copy()
+        new_perp_positions[token] = position.model_copy(update={"leverage": leverage})
+
+    return state.model_copy(
+        update={
+            "time": time,
+            "margins": new_margins,
+            "perp_positions": new_perp_positions,
+        }
+    )
+
+
+def margin_update(state: StateModel, token: str, delta: float) -> StateModel:
+    """
+    Add to the USDC margin posted for a perp asset.
+
+    Args:
+        state: Current state
+        token: Standardized token symbol
+        delta: Change in margin used, positive when margin is posted
+
+    Returns:
+        New state with the margin usage updated
+    """
+    old_margin = state.margins.get(token)
+    new_margins = state.margins.copy()
+    if old_margin is not None:
+        new_margins[token] = old_margin.model_copy(
+            update={"margin_used": old_margin.margin_used + delta}
+        )
+    else:
+        new_margins[token] = MarginModel(token=token, margin_used=delta)
+
+    return state.model_copy(update={"margins": new_margins})
@@ -0,0 +1,125 @@
+import glob
+import hashlib
+import os
+from functools import lru_cache
+from typing import List, Tuple
+from loguru import logger
+from config import cache_dir
+from models.class_models.state import StateModel
+from transformer.replay import get_user_updates, replay_updates
+from utils.cache import read_cache_json, write_cache_json
+from utils.metrics import timed
+
+# Cache folders the replay reads from, see get_user_updates
+REPLAY_INPUTS = [
+    "user_fills",
+    "user_funding",
+    "user_ledger_updates",
+    "twap",
+    "user_explorer",
+]
+
+# Source files whose changes invalidate stored replays
+REPLAY_CODE = [
+    "transformer/*.py",
+    "models/class_models/*.py",
+    "loaders/user_fills.py",
+    "loaders/user_funding.py",
+    "loaders/user_ledger_updates.py",
+    "loaders/twap.py",
+    "loaders/explorer.py",
+    "constants/coin_id.py",
+    "utils/window.py",
+    "utils/partitions.py",
+]
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _hash_files(paths: List[str], root: str) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.relpath(path, root).encode())
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """Digest of the loader, model and transformer sources used by the replay."""
+    paths = [
+        path
+        for pattern in REPLAY_CODE
+        for path in glob.glob(os.path.join(ROOT_DIR, pattern))
+    ]
+    return _hash_files(paths, ROOT_DIR)
+
+
+def input_digest(address: str) -> str:
+    """
+    Digest of every cached input of an address together with the code version.
+
+    Args:
+        address: User address
+
+    Returns:
+        Hex digest that changes whenever a cache file or the replay code does
+    """
+
+    address = address.lower()
+    paths = []
+    for folder in REPLAY_INPUTS:
+        for path in glob.glob(os.path.join(cache_dir, folder, f"{address}_*")):
+            if os.path.isdir(path):
+                paths.extend(glob.glob(os.path.join(path, "*.json")))
+            elif path.endswith(".json"):
+                paths.append(path)
+
+    digest = hashlib.sha256(code_version().encode())
+    digest.update(_hash_files(paths, cache_dir).encode())
+    return digest.hexdigest()
+
+
+@timed("replay_address", count=lambda result: len(result[1]))
+def replay_address(
+    address: str, use_cache: bool = True
+) -> Tuple[StateModel, List[dict]]:
+    """
+    Replay an address, reusing the stored result when nothing changed.
+
+    Results are stored under cache/replay/ keyed by input_digest, so editing
+    a transformer or refreshing one address only replays what is affected.
+
+    Args:
+        address: User address to replay
+        use_cache: Whether to use cached data and stored replays
+
+    Returns:
+        Tuple of (final state, timeline of {time, update, new_state} dumps)
+    """
+
+    replay_dir = os.path.join(cache_dir, "replay")
+    os.makedirs(replay_dir, exist_ok=True)
+    prefix = f"{address.lower()}_"
+
+    if use_cache:
+        replay_path = os.path.join(replay_dir, f"{prefix}{input_digest(address)}.json")
+        stored = read_cache_json(replay_path)
+        if stored is not None:
+            logger.debug(f"Reusing stored replay {replay_path}")
+            return StateModel.model_validate(stored["final_state"]), stored["out"]
+
+    updates = get_user_updates(address, use_cache=use_cache)
+    final_state, out = replay_updates(address, updates)
+
+    # Digest after loading, loaders may have just written the cache
+    replay_path = os.path.join(replay_dir, f"{prefix}{input_digest(address)}.json")
+    for stale in glob.glob(os.path.join(replay_dir, f"{prefix}*.json*")):
+        if not stale.startswith(replay_path):
+            os.remove(stale)
+    write_cache_json(
+        replay_path, {"final_state": final_state.model_dump(), "out": out}, indent=None
+    )
+
+    return final_state, out
@@ -0,0 +1,251 @@
+import time
+from typing import Callable, Dict, List, Tuple, Union
+from loguru import logger
+from loaders.event_store import stream_events, upsert_events
+from loaders.explorer import (
+    get_user_explorer_json,
+    get_user_explorer_pydantic,
+    parse_user_explorer_tx,
+)
+from loaders.twap import get_twap_history_json, get_twap_history_pydantic, parse_twap
+from loaders.user_fills import (
+    get_user_fills_json,
+    get_user_fills_pydantic,
+    parse_user_fill,
+)
+from loaders.user_funding import (
+    get_user_funding_json,
+    get_user_funding_pydantic,
+    parse_user_funding,
+)
+from loaders.user_ledger_updates import (
+    get_user_ledger_updates_json,
+    get_user_ledger_updates_pydantic,
+    parse_user_ledger_update,
+)
+from models.class_models.explorer import UpdateIsolatedMarginModel, UpdateLeverageModel
+from models.class_models.state import StateModel
+from models.class_models.twap import TWAPModel
+from models.class_models.user_fills import UserFillsModel
+from models.class_models.user_funding import UserFundingModel
+from models.class_models.user_ledger_updates import TxModel
+from transformer.explorer import user_isolated_margin_update, user_leverage_update
+from transformer.funding import funding_state_update
+from transformer.state import init_state
+from transformer.twap import build_twap_fill_index, link_twap_fills, twap_state_update
+from transformer.user_fills import user_fill_state_update
+from transformer.user_ledger_updates import user_ledger_update
+from utils.metrics import record, stage, timed
+
+UpdateModel = Union[
+    TxModel,
+    TWAPModel,
+    UserFillsModel,
+    UpdateLeverageModel,
+    UpdateIsolatedMarginModel,
+    UserFundingModel,
+]
+
+# Parser turning a raw event of each store table into an update model, in the
+# order get_user_updates breaks ties between events of the same time
+EVENT_PARSERS: Dict[str, Callable[[dict], UpdateModel | None]] = {
+    "twap_history": parse_twap,
+    "user_funding": parse_user_funding,
+    "user_fills": parse_user_fill,
+    "user_ledger_updates": parse_user_ledger_update,
+    "user_explorer_txs": parse_user_explorer_tx,
+}
+
+
+def get_user_updates(
+    address: str,
+    use_cache: bool = True,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> List[UpdateModel]:
+    """
+    Load every state changing event of an address, sorted by time.
+
+    Args:
+        address: User address to load events for
+        use_cache: Whether to use cached data if available
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
+
+    Returns:
+        List of update models ready to be replayed
+    """
+
+    window = dict(use_cache=use_cache, start_time=start_time, end_time=end_time)
+    twaps = get_twap_history_pydantic(address, **window)
+    user_fills = get_user_fills_pydantic(address, **window)
+    user_funding = get_user_funding_pydantic(address, **window)
+    user_ledger_updates = get_user_ledger_updates_pydantic(address, **window)
+    margin_updates = get_user_explorer_pydantic(address, **window)
+
+    with stage("merge", address) as measurement:
+        # TWAP exposure is carried by its child fills, only residuals are replayed
+        twap_fills = build_twap_fill_index(user_fills)
+        twaps, twap_mismatches = link_twap_fills(twaps, twap_fills)
+        if twap_mismatches:
+            logger.warning(
+                f"{len(twap_mismatches)} TWAPs do not match their fills for {address}"
+            )
+
+        updates = [
+            *twaps,
+            *user_funding,
+            *user_fills,
+            *user_ledger_updates,
+            *margin_updates,
+        ]
+        measurement.add(events=len(updates))
+
+        return sorted(updates, key=lambda x: x.time)
+
+
+def sync_event_store(address: str, use_cache: bool = True) -> Dict[str, int]:
+    """
+    Upsert every endpoint of an address into the event store.
+
+    Loaders already upsert what they fetch from the API; this also indexes
+    histories that only exist as cached JSON files.
+
+    Args:
+        address: User address to index
+        use_cache: Whether to use cached data if available
+
+    Returns:
+        Dictionary of event kind to number of events written
+    """
+
+    raw = {
+        "user_fills": get_user_fills_json(address, use_cache),
+        "user_funding": get_user_funding_json(address, use_cache),
+        "user_ledger_updates": get_user_ledger_updates_json(address, use_cache),
+        "twap_history": get_twap_history_json(address, use_cache),
+        "user_explorer_txs": get_user_explorer_json(address, use_cache).get("txs", []),
+    }
+    return {kind: upsert_events(kind, address, events) for kind, events in raw.items()}
+
+
+def get_user_updates_from_store(
+    address: str,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> List[UpdateModel]:
+    """
+    Load the updates of an address from the event store, sorted by time.
+
+    Same output as get_user_updates, but restricted to a time range and
+    served from indexed reads instead of the per endpoint JSON files.
+
+    Args:
+        address: User address to load events for
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
+
+    Returns:
+        List of update models ready to be replayed
+    """
+
+    updates: List[UpdateModel] = []
+    for kind, event in stream_events(
+        address, list(EVENT_PARSERS), start_time, end_time
+    ):
+        try:
+            update = EVENT_PARSERS[kind](event)
+        except Exception as e:
+            logger.error(f"Failed to parse {kind} event {event}: {e}")
+            continue
+        if update is not None:
+            updates.append(update)
+
+    fills = [update for update in updates if isinstance(update, UserFillsModel)]
+    twaps = [update for update in updates if isinstance(update, TWAPModel)]
+    twaps, twap_mismatches = link_twap_fills(twaps, build_twap_fill_index(fills))
+    if twap_mismatches:
+        logger.warning(
+            f"{len(twap_mismatches)} TWAPs do not match their fills for {address}"
+        )
+
+    updates = [
+        *twaps,
+        *[update for update in updates if not isinstance(update, TWAPModel)],
+    ]
+    return sorted(updates, key=lambda x: x.time)
+
+
+def apply_update(state: StateModel, update: UpdateModel) -> StateModel | None:
+    """
+    Dispatch a single update to its transformer.
+
+    Returns:
+        The new state, or None if the update type is unknown
+    """
+
+    if isinstance(update, TxModel):
+        return user_ledger_update(state, update)
+    elif isinstance(update, TWAPModel):
+        return twap_state_update(state, update)
+    elif isinstance(update, UserFillsModel):
+        return user_fill_state_update(state, update)
+    elif isinstance(update, UpdateLeverageModel):
+        return user_leverage_update(state, update)
+    elif isinstance(update, UpdateIsolatedMarginModel):
+        return user_isolated_margin_update(state, update)
+    elif isinstance(update, UserFundingModel):
+        return funding_state_update(state, update)
+
+    logger.error(f"Unknown update type: {type(update)}")
+    return None
+
+
+@timed("replay", count=lambda result: len(result[1]))
+def replay_updates(
+    address: str, updates: List[UpdateModel]
+) -> Tuple[StateModel, List[dict]]:
+    """
+    Replay sorted updates from an empty state.
+
+    Time spent in each transformer is recorded as a transform.<update type>
+    stage and dumping the states as replay.dump.
+
+    Args:
+        address: User address the updates belong to
+        updates: Updates sorted by time
+
+    Returns:
+        Tuple of (final state, timeline of {time, update, new_state} dumps)
+    """
+
+    new_state = init_state(address.lower(), 0)
+    out = []
+    # Update type -> [seconds, updates], summed to keep the loop cheap
+    transform_times: Dict[str, list] = {}
+    dump_seconds = 0.0
+    for update in updates:
+        start = time.perf_counter()
+        state = apply_update(new_state, update)
+        applied = time.perf_counter()
+        totals = transform_times.setdefault(type(update).__name__, [0.0, 0])
+        totals[0] += applied - start
+        totals[1] += 1
+        if state is None:
+            continue
+        new_state = state
+
+        out.append(
+            {
+                "time": update.time,
+                "update": update.model_dump(),
+                "new_state": new_state.model_dump(),
+            }
+        )
+        dump_seconds += time.perf_counter() - applied
+
+    for name, (seconds, count) in transform_times.items():
+        record(f"transform.{name}", seconds, address, events=count, calls=count)
+    record("replay.dump", dump_seconds, address, events=len(out), calls=len(out))
+
+    return new_state, out
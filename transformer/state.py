@@ -7,6 +7,8 @@ from models.class_models.state import (
 )
 from constants.coin_id import coin_id_map
 
+DEFAULT_LEVERAGE = 10.0
+
 
 def init_state(user: str, time: int) -> StateModel:
     return StateModel(
@@ -17,6 +19,7 @@ def init_state(user: str, time: int) -> StateModel:
         spot_positions={},
         perp_positions={},
         vault_positions={},
+        margins={},
     )
 
 
@@ -48,8 +51,13 @@ def state_update(state: StateModel, update: StateUpdateModel) -> StateModel:
                     usdc_value=old_pos.usdc_value,
                 )
             else:
+                margin = state.margins.get(token)
                 new_perp_positions[token] = PerpPositionModel(
-                    token=token, size=update.delta, leverage= 10, entry_price=0.0, usdc_value=0.0
+                    token=token,
+                    size=update.delta,
+                    leverage=margin.leverage if margin is not None else DEFAULT_LEVERAGE,
+                    entry_price=0.0,
+                    usdc_value=0.0,
                 )
         else:
             if token in state.spot_positions:
@@ -87,4 +95,5 @@ def state_update(state: StateModel, update: StateUpdateModel) -> StateModel:
         spot_positions=new_spot_positions,
         perp_positions=new_perp_positions,
         vault_positions=new_vault_positions,
+        margins=state.margins,
     )
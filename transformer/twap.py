@@ -1,7 +1,16 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
 from loguru import logger
-from models.class_models.twap import TWAPModel
+from models.class_models.twap import TWAPModel, TwapFillMismatchModel
+from models.class_models.user_fills import UserFillsModel
 from models.class_models.state import StateModel, StateUpdateModel
 from transformer.state import state_update
+from transformer.margin import (
+    get_leverage,
+    get_margin_used,
+    margin_update,
+    position_margin,
+)
 from constants.coin_id import coin_id_map
 
 
@@ -21,18 +30,15 @@ def twap_state_update(state: StateModel, twap: TWAPModel) -> StateModel:
 
     usdc_ntl = 0
     if is_perp:
-        leverage = 10
-        current_position = 0
-        try:
-            leverage = state.perp_positions.get(token_std).leverage
-            current_position = state.perp_positions.get(token_std).size
-        except: 
-            pass
-        # if current position and delta have opposite signs we're reducing exposure -> flip executed notional sign
-        usdc_ntl = -twap.executedNtl / leverage
-        if (current_position < 0 and delta > 0) or (current_position > 0 and delta < 0):
-            print(usdc_ntl, "flipped")
-            usdc_ntl = -usdc_ntl
+        position = state.perp_positions.get(token_std)
+        current_position = position.size if position is not None else 0
+        px = twap.executedNtl / twap.executedSz if twap.executedSz else 0.0
+        used = get_margin_used(state, token_std)
+        margin = position_margin(
+            used, current_position, delta, px, get_leverage(state, token_std)
+        )
+        # margin posted leaves perp_usdc, margin released returns to it
+        usdc_ntl = used - margin
     else:
         usdc_ntl = -twap.executedNtl if side == "b" else twap.executedNtl
 
@@ -49,4 +55,101 @@ def twap_state_update(state: StateModel, twap: TWAPModel) -> StateModel:
     for update in state_updates:
         new_state = state_update(new_state, update)
 
+    if is_perp:
+        new_state = margin_update(new_state, token_std, margin - used)
+
     return new_state
+
+
+def build_twap_fill_index(
+    fills: List[UserFillsModel],
+) -> Dict[int, List[UserFillsModel]]:
+    """
+    Group TWAP child fills by twapId in a single pass.
+
+    Args:
+        fills: User fills, in any order
+
+    Returns:
+        Dictionary mapping twapId to its fills, in input order
+    """
+    index: Dict[int, List[UserFillsModel]] = defaultdict(list)
+    for fill in fills:
+        if fill.twapId is not None:
+            index[fill.twapId].append(fill)
+
+    return dict(index)
+
+
+def link_twap_fills(
+    twaps: List[TWAPModel],
+    twap_fills: Dict[int, List[UserFillsModel]],
+    rel_tolerance: float = 1e-6,
+) -> Tuple[List[TWAPModel], List[TwapFillMismatchModel]]:
+    """
+    Reconcile TWAPs against their child fills so executions are applied once.
+
+    Fills linked to a TWAP already carry its exposure slice by slice at the
+    real fill times, so the TWAP itself only needs to apply whatever its
+    reported totals are not covered by those fills (e.g. fills beyond the
+    userFills row cap). TWAPs whose fills cover the totals are dropped.
+
+    Args:
+        twaps: TWAP history models
+        twap_fills: Index built by build_twap_fill_index
+        rel_tolerance: Relative tolerance when comparing sizes
+
+    Returns:
+        Tuple of (TWAPs still to apply, mismatches between TWAP totals and fills)
+    """
+    remaining: List[TWAPModel] = []
+    mismatches: List[TwapFillMismatchModel] = []
+
+    for twap in twaps:
+        fills = twap_fills.get(twap.twapId) if twap.twapId is not None else None
+        if not fills:
+            remaining.append(twap)
+            continue
+
+        if twap.status == "activated":
+            # start record of the TWAP, its executed totals are always zero
+            # and the slices arrive as fills
+            continue
+
+        filled_sz = sum(fill.sz for fill in fills)
+        filled_ntl = sum(fill.sz * fill.px for fill in fills)
+        size_gap = twap.executedSz - filled_sz
+
+        if abs(size_gap) <= rel_tolerance * max(abs(twap.executedSz), 1.0):
+            continue
+
+        mismatch = TwapFillMismatchModel(
+            twapId=twap.twapId,
+            coin=twap.coin,
+            executedSz=twap.executedSz,
+            filledSz=filled_sz,
+            executedNtl=twap.executedNtl,
+            filledNtl=filled_ntl,
+            fills=len(fills),
+        )
+        mismatches.append(mismatch)
+
+        if size_gap < 0:
+            logger.warning(
+                f"TWAP {twap.twapId} fills exceed executed size by {-size_gap} {twap.coin}"
+            )
+            continue
+
+        logger.warning(
+            f"TWAP {twap.twapId} has {size_gap} {twap.coin} not covered by fills, applying residual"
+        )
+        remaining.append(
+            twap.model_copy(
+                update={
+                    "executedSz": size_gap,
+                    "executedNtl": twap.executedNtl - filled_ntl,
+                }
+            )
+        )
+
+    return remaining, mismatches
@@ -1,6 +1,12 @@
 from models.class_models.user_fills import UserFillsModel
 from models.class_models.state import StateModel, StateUpdateModel
 from transformer.state import state_update
+from transformer.margin import (
+    get_leverage,
+    get_margin_used,
+    margin_update,
+    position_margin,
+)
 from constants.coin_id import coin_id_map
 
 
@@ -25,15 +31,12 @@ def user_fill_state_update(state: StateModel, fill: UserFillsModel) -> StateMode
 
     usdc_ntl = 0
     if is_perp:
-        leverage = 10
-        try:
-            leverage = state.perp_positions.get(token).leverage
-        except: 
-            pass
-        usdc_ntl = -(sz * fill.px) / leverage
-        if (start_position < 0 and delta > 0) or (start_position > 0 and delta < 0):
-            print(usdc_ntl, "flipped")
-            usdc_ntl = -usdc_ntl
+        used = get_margin_used(state, token)
+        margin = position_margin(
+            used, start_position, delta, fill.px, get_leverage(state, token)
+        )
+        # margin posted leaves perp_usdc, margin released returns to it
+        usdc_ntl = used - margin
     else:
         usdc_ntl = -(fill.sz * fill.px) if side == "b" else (fill.sz * fill.px)
 
@@ -65,4 +68,7 @@ def user_fill_state_update(state: StateModel, fill: UserFillsModel) -> StateMode
     for update in state_updates:
         new_state = state_update(new_state, update)
 
+    if is_perp:
+        new_state = margin_update(new_state, token, margin - used)
+
     return new_state
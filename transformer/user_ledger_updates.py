@@ -1,4 +1,3 @@
-from turtle import st
 from loguru import logger
 from models.class_models.state import StateModel, StateUpdateModel
 from models.class_models.user_ledger_updates import TxModel
@@ -0,0 +1,185 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator
+from loguru import logger
+from utils.metrics import stage
+
+CHECKSUM_SUFFIX = ".sha256"
+LOCK_SUFFIX = ".lock"
+
+# Locks held by the current thread, so nested cache_lock calls do not deadlock
+_held = threading.local()
+
+
+def _held_locks() -> dict:
+    if not hasattr(_held, "locks"):
+        _held.locks = {}
+    return _held.locks
+
+
+@contextmanager
+def cache_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """
+    Hold an advisory lock on a cache key across processes.
+
+    The lock lives in a `<path>.lock` file next to the cache file. Writers
+    take it exclusively, readers shared. Nested calls on the same key from
+    the same thread reuse the lock already held.
+
+    Args:
+        path: Cache file the lock protects
+        shared: Whether to take a shared (read) lock
+    """
+
+    key = os.path.abspath(path)
+    held = _held_locks()
+    if key in held:
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+
+    os.makedirs(os.path.dirname(key), exist_ok=True)
+    with open(f"{key}{LOCK_SUFFIX}", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        held[key] = 1
+        try:
+            yield
+        finally:
+            del held[key]
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def file_checksum(path: str) -> str:
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _replace_durably(tmp_path: str, path: str) -> None:
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    """
+    Temporary path whose content atomically replaces `path` on success.
+
+    The temporary file is fsynced, renamed over the target and a checksum
+    sidecar is written the same way, all under the key's exclusive lock.
+    On error the target is left untouched.
+
+    Args:
+        path: Cache file to replace
+
+    Yields:
+        Path to write the new content to
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    with cache_lock(path):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+        )
+        os.close(fd)
+        try:
+            yield tmp_path
+            checksum = file_checksum(tmp_path)
+            _replace_durably(tmp_path, path)
+
+            checksum_tmp = f"{tmp_path}{CHECKSUM_SUFFIX}"
+            with open(checksum_tmp, "w") as f:
+                f.write(checksum)
+            _replace_durably(checksum_tmp, f"{path}{CHECKSUM_SUFFIX}")
+        finally:
+            for leftover in (tmp_path, f"{tmp_path}{CHECKSUM_SUFFIX}"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+
+def verify_checksum(path: str) -> bool:
+    """
+    Whether a cache file exists and matches its checksum sidecar.
+
+    Files written before checksums existed have no sidecar and are trusted.
+    """
+
+    if not os.path.isfile(path):
+        return False
+
+    checksum_path = f"{path}{CHECKSUM_SUFFIX}"
+    if not os.path.isfile(checksum_path):
+        return True
+
+    with open(checksum_path, "r") as f:
+        expected = f.read().strip()
+    if file_checksum(path) != expected:
+        logger.warning(f"Checksum mismatch for cache file {path}, ignoring it")
+        return False
+    return True
+
+
+def write_cache_json(path: str, data: Any, indent: int | None = 4) -> None:
+    """
+    Atomically write a JSON cache file with its checksum.
+
+    Args:
+        path: Cache file to write
+        data: JSON serializable data
+        indent: Indentation passed to json.dump
+    """
+
+    with stage("cache.write") as measurement, atomic_path(path) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=indent)
+        measurement.add(bytes=os.path.getsize(tmp_path))
+
+
+def read_cache_json(path: str) -> Any | None:
+    """
+    Read a JSON cache file, validating it against its checksum.
+
+    Args:
+        path: Cache file to read
+
+    Returns:
+        Parsed content, or None if the file is missing, does not match its
+        checksum or is not valid JSON
+    """
+
+    if not os.path.isfile(path):
+        return None
+
+    with stage("cache.read") as measurement, cache_lock(path, shared=True):
+        if not verify_checksum(path):
+            return None
+        measurement.add(bytes=os.path.getsize(path))
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Unreadable cache file {path}, ignoring it: {e}")
+            return None
@@ -0,0 +1,258 @@
+import json
+import os
+import random
+import time
+from typing import Any
+import requests
+from loguru import logger
+import config
+from config import (
+    cache_dir,
+    rate_limit_weight_per_minute,
+    request_max_retries,
+    request_timeout,
+)
+from utils.cache import cache_lock
+from utils.metrics import stage
+
+HEADERS = {
+    "Accept": "*/*",
+    "Content-Type": "application/json",
+}
+
+# Weights of info requests, every other type weighs DEFAULT_INFO_WEIGHT
+INFO_WEIGHTS = {
+    "l2Book": 2,
+    "allMids": 2,
+    "clearinghouseState": 2,
+    "orderStatus": 2,
+    "spotClearinghouseState": 2,
+    "exchangeStatus": 2,
+    "userRole": 60,
+}
+DEFAULT_INFO_WEIGHT = 20
+EXPLORER_WEIGHT = 40
+
+# Request types charged one more unit of weight per ITEMS_PER_WEIGHT returned items
+ITEM_WEIGHTED_TYPES = {
+    "userFills",
+    "userFillsByTime",
+    "historicalOrders",
+    "userFunding",
+    "userNonFundingLedgerUpdates",
+    "twapHistory",
+    "userTwapSliceFills",
+    "fundingHistory",
+    "recentTrades",
+}
+ITEMS_PER_WEIGHT = 20
+
+# Consecutive failures that open an endpoint's circuit, and how long it stays open
+CIRCUIT_FAILURES = 5
+CIRCUIT_COOLDOWN = 60.0
+
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+LIMITER_STATE_PATH = os.path.join(cache_dir, "rate_limiter.json")
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+def endpoint_url(endpoint: str) -> str:
+    """
+    URL of the "info" or "explorer" endpoint.
+
+    Resolved on every call from config.api_url and config.explorer_url, so
+    they can be pointed at a stand-in server at runtime.
+    """
+
+    base = config.explorer_url if endpoint == "explorer" else config.api_url
+    return f"{base.rstrip('/')}/{endpoint}"
+
+
+def request_weight(payload: dict, endpoint: str = "info") -> int:
+    """Weight charged before sending a request."""
+    if endpoint == "explorer":
+        return EXPLORER_WEIGHT
+    return INFO_WEIGHTS.get(payload.get("type"), DEFAULT_INFO_WEIGHT)
+
+
+def response_weight(payload: dict, data: Any) -> int:
+    """Extra weight charged for the number of items a request returned."""
+    if payload.get("type") in ITEM_WEIGHTED_TYPES and isinstance(data, list):
+        return len(data) // ITEMS_PER_WEIGHT
+    return 0
+
+
+def _read_state(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_state(path: str, state: dict) -> None:
+    with open(path, "w") as f:
+        json.dump(state, f)
+
+
+def _bucket(state: dict, now: float) -> dict:
+    """Refill the shared bucket up to one minute of weight."""
+    capacity = float(rate_limit_weight_per_minute)
+    bucket = state.setdefault("bucket", {"tokens": capacity, "updated": now})
+    elapsed = max(now - bucket["updated"], 0.0)
+    bucket["tokens"] = min(capacity, bucket["tokens"] + elapsed * capacity / 60)
+    bucket["updated"] = now
+    return bucket
+
+
+def acquire(weight: int, path: str = LIMITER_STATE_PATH) -> None:
+    """
+    Block until `weight` tokens are available in the shared bucket.
+
+    The bucket lives in a small state file under a cross-process lock, so
+    every worker on the machine draws from the same budget.
+
+    Args:
+        weight: Weight of the request about to be sent
+        path: Shared limiter state file
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    while True:
+        with cache_lock(path):
+            now = time.time()
+            state = _read_state(path)
+            bucket = _bucket(state, now)
+            if bucket["tokens"] >= weight:
+                bucket["tokens"] -= weight
+                _write_state(path, state)
+                return
+            wait = (weight - bucket["tokens"]) * 60 / rate_limit_weight_per_minute
+            _write_state(path, state)
+        logger.debug(f"Rate limited, waiting {wait:.2f}s for {weight} weight")
+        time.sleep(wait)
+
+
+def charge(weight: int, path: str = LIMITER_STATE_PATH) -> None:
+    """Take weight known only after a response, the bucket may go negative."""
+    if weight <= 0:
+        return
+    with cache_lock(path):
+        state = _read_state(path)
+        _bucket(state, time.time())["tokens"] -= weight
+        _write_state(path, state)
+
+
+def _check_circuit(url: str, path: str) -> None:
+    with cache_lock(path):
+        circuit = _read_state(path).get("circuits", {}).get(url)
+    if circuit and circuit["open_until"] > time.time():
+        raise CircuitOpenError(
+            f"Circuit open for {url} until {time.ctime(circuit['open_until'])}"
+        )
+
+
+def _record_result(url: str, ok: bool, path: str) -> None:
+    with cache_lock(path):
+        state = _read_state(path)
+        circuits = state.setdefault("circuits", {})
+        circuit = circuits.setdefault(url, {"failures": 0, "open_until": 0.0})
+        if ok:
+            circuit["failures"] = 0
+            circuit["open_until"] = 0.0
+        else:
+            circuit["failures"] += 1
+            if circuit["failures"] >= CIRCUIT_FAILURES:
+                # Half open after the cooldown, one more failure reopens it
+                circuit["open_until"] = time.time() + CIRCUIT_COOLDOWN
+                circuit["failures"] = CIRCUIT_FAILURES - 1
+                logger.error(f"Opening circuit for {url} for {CIRCUIT_COOLDOWN}s")
+        _write_state(path, state)
+
+
+def _backoff(attempt: int, response: requests.Response | None) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    # Full jitter keeps parallel workers from retrying in lockstep
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def post_info(
+    payload: dict,
+    endpoint: str = "info",
+    max_retries: int = request_max_retries,
+    path: str = LIMITER_STATE_PATH,
+    timeout: float = request_timeout,
+) -> Any:
+    """
+    POST a request to the Hyperliquid API under the shared rate limit.
+
+    Each attempt first waits for its weight in the shared token bucket.
+    Rate limited, server error, connection failures and timed out requests
+    are retried with jittered exponential backoff, and repeated failures open the endpoint's
+    circuit so other workers stop calling it for a while.
+
+    Args:
+        payload: JSON request body
+        endpoint: Endpoint to call, "info" or "explorer"
+        max_retries: Retries after the first attempt
+        path: Shared limiter state file
+        timeout: Seconds to wait for a connection or a response
+
+    Returns:
+        Decoded JSON response
+
+    Raises:
+        CircuitOpenError: If the endpoint's circuit is open
+        requests.RequestException: If the request still fails after retrying
+    """
+
+    url = endpoint_url(endpoint)
+    with stage(f"fetch.{payload.get('type')}", payload.get("user")) as measurement:
+        for attempt in range(max_retries + 1):
+            _check_circuit(url, path)
+            acquire(request_weight(payload, endpoint), path)
+
+            response = None
+            try:
+                response = requests.post(
+                    url, headers=HEADERS, json=payload, timeout=timeout
+                )
+                response.raise_for_status()
+                data = response.json()
+            except requests.RequestException as e:
+                status = response.status_code if response is not None else None
+                # Timeouts and connection errors come without a response
+                retryable = (
+                    isinstance(e, requests.Timeout)
+                    or status is None
+                    or status in RETRY_STATUS
+                )
+                _record_result(url, not retryable, path)
+                if not retryable or attempt == max_retries:
+                    raise
+                wait = _backoff(attempt, response)
+                logger.warning(
+                    f"{payload.get('type')} request failed ({e}), retry {attempt + 1}/{max_retries} in {wait:.2f}s"
+                )
+                time.sleep(wait)
+                continue
+
+            _record_result(url, True, path)
+            charge(response_weight(payload, data), path)
+            measurement.add(
+                events=len(data) if isinstance(data, list) else 0,
+                bytes=len(response.content),
+            )
+            return data
@@ -0,0 +1,519 @@
+"""
+Wall time, event counts and bytes of the pipeline stages, per address.
+
+Stages are recorded with the `stage` context manager or the `timed`
+decorator, nest freely and are thread safe. Each stage keeps its inclusive
+time and its self time, which excludes the stages nested in it, so the
+self time of a parse stage is model validation alone while its inclusive
+time also covers reading and decoding the cache.
+
+Memory profiling is opt-in, see enable_memory_profiling: stages then also
+record their peak and retained traced allocations and the process RSS, and
+selected stages the allocation sites behind what they retained.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from loguru import logger
+
+PROMETHEUS_PREFIX = "hyliq_stage"
+
+
+@dataclass
+class StageMetrics:
+    """Totals of every run of a stage for one address."""
+
+    calls: int = 0
+    seconds: float = 0.0
+    self_seconds: float = 0.0
+    max_seconds: float = 0.0
+    events: int = 0
+    bytes: int = 0
+    # Memory profiling only: highest allocation above the stage's start in
+    # one run, allocations still alive at its end and RSS at its end
+    peak_memory: int = 0
+    retained_memory: int = 0
+    max_rss: int = 0
+
+
+class Measurement:
+    """A running stage, counts events and bytes until it exits."""
+
+    def __init__(self, name: str, address: str):
+        self.name = name
+        self.address = address
+        self.events = 0
+        self.bytes = 0
+        self.nested_seconds = 0.0
+        # Memory profiling state, peak is absolute and includes nested stages
+        self.start_memory = 0
+        self.peak = 0
+        self.snapshot: tracemalloc.Snapshot | None = None
+
+    def add(self, events: int = 0, bytes: int = 0) -> None:
+        """Count events or bytes processed by the stage."""
+        self.events += events
+        self.bytes += bytes
+
+
+_metrics: Dict[Tuple[str, str], StageMetrics] = {}
+# Stage name -> top allocation sites retained by its largest run
+_sites: Dict[str, Tuple[int, List[dict]]] = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+# Memory profiling settings, None while disabled
+_memory: dict | None = None
+
+
+def _stack() -> List[Measurement]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_address() -> str:
+    """Address of the innermost running stage or track_address block."""
+    return getattr(_local, "address", "")
+
+
+@contextmanager
+def track_address(address: str) -> Iterator[None]:
+    """Attribute the stages run in this block to an address by default."""
+    previous = current_address()
+    _local.address = address.lower()
+    try:
+        yield
+    finally:
+        _local.address = previous
+
+
+def _add(
+    name: str,
+    address: str,
+    seconds: float,
+    self_seconds: float,
+    events: int,
+    bytes: int,
+    calls: int,
+    peak_memory: int = 0,
+    retained_memory: int = 0,
+    rss: int = 0,
+) -> None:
+    with _lock:
+        metrics = _metrics.setdefault((name, address), StageMetrics())
+        metrics.calls += calls
+        metrics.seconds += seconds
+        metrics.self_seconds += self_seconds
+        metrics.max_seconds = max(metrics.max_seconds, seconds / max(calls, 1))
+        metrics.events += events
+        metrics.bytes += bytes
+        metrics.peak_memory = max(metrics.peak_memory, peak_memory)
+        metrics.retained_memory += retained_memory
+        metrics.max_rss = max(metrics.max_rss, rss)
+
+
+def record(
+    name: str,
+    seconds: float,
+    address: str | None = None,
+    events: int = 0,
+    bytes: int = 0,
+    calls: int = 1,
+) -> None:
+    """
+    Add a measurement taken inline, e.g. summed over a hot loop, to a stage.
+
+    Args:
+        name: Stage name
+        seconds: Wall time in seconds
+        address: Address the work belongs to, the current address by default
+        events: Events processed
+        bytes: Bytes read, written or received
+        calls: Runs the measurement covers
+    """
+
+    stack = _stack()
+    if stack:
+        stack[-1].nested_seconds += seconds
+    address = (address if address is not None else current_address()).lower()
+    _add(name, address, seconds, seconds, events, bytes, calls)
+
+
+def rss_bytes() -> int:
+    """Resident set size of the process, or its peak where /proc is missing."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        import resource
+        import sys
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def enable_memory_profiling(
+    snapshot_stages: Tuple[str, ...] = ("merge", "replay", "parse."),
+    top: int = 10,
+    frames: int = 1,
+) -> None:
+    """
+    Also record the memory of every stage from now on.
+
+    Traced allocations are process wide, so memory figures are only
+    attributable to a stage when stages do not run concurrently. Taking
+    snapshots costs time proportional to the live allocations, which is why
+    allocation sites are only collected for the snapshot stages, and the
+    snapshots count towards the peaks of the stages around them.
+
+    Args:
+        snapshot_stages: Names or name prefixes of the stages whose retained
+            allocation sites are reported
+        top: Allocation sites reported per stage
+        frames: Frames stored per traced allocation
+    """
+
+    global _memory
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _memory = {"snapshot_stages": snapshot_stages, "top": top}
+    logger.info("Memory profiling enabled, stages will run slower")
+
+
+def disable_memory_profiling() -> None:
+    """Stop tracing allocations."""
+    global _memory
+    _memory = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _snapshots(name: str) -> bool:
+    return any(
+        name == prefix or (prefix.endswith(".") and name.startswith(prefix))
+        for prefix in _memory["snapshot_stages"]
+    )
+
+
+def _start_memory(measurement: Measurement, parent: Measurement | None) -> None:
+    current, peak = tracemalloc.get_traced_memory()
+    if parent is not None:
+        # Resetting the peak below would lose the parent's peak so far
+        parent.peak = max(parent.peak, peak)
+    if _snapshots(measurement.name):
+        measurement.snapshot = tracemalloc.take_snapshot()
+        current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    measurement.start_memory = current
+    measurement.peak = current
+
+
+def _stop_memory(
+    measurement: Measurement, parent: Measurement | None
+) -> Tuple[int, int, int]:
+    current, peak = tracemalloc.get_traced_memory()
+    peak = max(peak, measurement.peak)
+    if parent is not None:
+        parent.peak = max(parent.peak, peak)
+    retained = current - measurement.start_memory
+
+    if measurement.snapshot is not None:
+        diffs = tracemalloc.take_snapshot().compare_to(measurement.snapshot, "lineno")
+        measurement.snapshot = None
+        # Filtering the snapshots instead is far slower on millions of traces
+        ignored = {tracemalloc.__file__, __file__}
+        sites = [
+            {
+                "site": str(diff.traceback),
+                "size": diff.size_diff,
+                "count": diff.count_diff,
+            }
+            for diff in diffs
+            if diff.traceback[0].filename not in ignored
+        ][: _memory["top"]]
+        with _lock:
+            largest = _sites.get(measurement.name)
+            if largest is None or retained > largest[0]:
+                _sites[measurement.name] = (retained, sites)
+
+    return peak - measurement.start_memory, retained, rss_bytes()
+
+
+@contextmanager
+def stage(name: str, address: str | None = None) -> Iterator[Measurement]:
+    """
+    Time a block as a pipeline stage.
+
+    Args:
+        name: Stage name, dotted by family, e.g. "parse.user_fills"
+        address: Address the work belongs to, the current address by default
+
+    Yields:
+        Measurement to count the events and bytes the block processed
+    """
+
+    address = (address if address is not None else current_address()).lower()
+    measurement = Measurement(name, address)
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    profiling = _memory is not None and tracemalloc.is_tracing()
+    if profiling:
+        _start_memory(measurement, parent)
+    stack.append(measurement)
+    previous = current_address()
+    _local.address = address
+    start = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        seconds = time.perf_counter() - start
+        _local.address = previous
+        stack.pop()
+        memory = (0, 0, 0)
+        if profiling and tracemalloc.is_tracing():
+            memory = _stop_memory(measurement, parent)
+        if parent is not None:
+            parent.nested_seconds += seconds
+        _add(
+            name,
+            address,
+            seconds,
+            seconds - measurement.nested_seconds,
+            measurement.events,
+            measurement.bytes,
+            1,
+            *memory,
+        )
+
+
+def _sized(result: Any) -> int:
+    try:
+        return len(result)
+    except TypeError:
+        return 0
+
+
+def timed(
+    name: str, count: Callable[[Any], int] = _sized
+) -> Callable[[Callable], Callable]:
+    """
+    Decorator recording every call of a function as a stage.
+
+    The address is taken from an `address` argument, the first positional
+    argument, when there is one.
+
+    Args:
+        name: Stage name
+        count: Function of the return value giving the events processed,
+            its length by default
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            address = kwargs.get("address")
+            if address is None and args and isinstance(args[0], str):
+                address = args[0]
+            with stage(name, address) as measurement:
+                result = func(*args, **kwargs)
+                measurement.add(events=count(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def reset_metrics() -> None:
+    """Forget every recorded stage."""
+    with _lock:
+        _metrics.clear()
+        _sites.clear()
+
+
+def _rates(metrics: StageMetrics) -> dict:
+    row = asdict(metrics)
+    row["events_per_second"] = metrics.events / metrics.seconds if metrics.seconds else 0.0
+    row["bytes_per_second"] = metrics.bytes / metrics.seconds if metrics.seconds else 0.0
+    return row
+
+
+def _totals() -> Tuple[Dict[str, StageMetrics], Dict[str, Dict[str, StageMetrics]]]:
+    """Recorded stages totalled over addresses, and per address."""
+    with _lock:
+        snapshot = {key: StageMetrics(**asdict(value)) for key, value in _metrics.items()}
+
+    totals: Dict[str, StageMetrics] = {}
+    addresses: Dict[str, Dict[str, StageMetrics]] = {}
+    for (name, address), metrics in sorted(snapshot.items()):
+        total = totals.setdefault(name, StageMetrics())
+        total.calls += metrics.calls
+        total.seconds += metrics.seconds
+        total.self_seconds += metrics.self_seconds
+        total.max_seconds = max(total.max_seconds, metrics.max_seconds)
+        total.events += metrics.events
+        total.bytes += metrics.bytes
+        total.peak_memory = max(total.peak_memory, metrics.peak_memory)
+        total.retained_memory += metrics.retained_memory
+        total.max_rss = max(total.max_rss, metrics.max_rss)
+        if address:
+            addresses.setdefault(address, {})[name] = metrics
+    return totals, addresses
+
+
+def check_budgets(budgets: Dict[str, float]) -> List[str]:
+    """
+    Stages whose total time exceeds their budget.
+
+    Args:
+        budgets: Stage name to budget in total seconds
+
+    Returns:
+        Descriptions of the stages over budget
+    """
+
+    totals, _ = _totals()
+    over = []
+    for name, budget in budgets.items():
+        metrics = totals.get(name)
+        if metrics is not None and metrics.seconds > budget:
+            over.append(f"{name}: {metrics.seconds:.2f}s over its {budget:.2f}s budget")
+    return over
+
+
+def metrics_report(budgets: Dict[str, float] | None = None) -> dict:
+    """
+    Recorded stages, totalled over addresses and per address.
+
+    Args:
+        budgets: Stage name to budget in total seconds
+
+    Returns:
+        Report with the stage totals, the per address breakdown, the stages
+        over budget and, when memory profiling, the allocation sites
+    """
+
+    totals, addresses = _totals()
+    with _lock:
+        sites = {name: entry[1] for name, entry in sorted(_sites.items())}
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "stages": {name: _rates(metrics) for name, metrics in totals.items()},
+        "addresses": {
+            address: {name: _rates(metrics) for name, metrics in stages.items()}
+            for address, stages in addresses.items()
+        },
+        "budgets": budgets or {},
+        "over_budget": check_budgets(budgets or {}),
+        "memory": {"enabled": _memory is not None, "allocation_sites": sites},
+    }
+
+
+def write_metrics_json(path: str, report: dict | None = None) -> dict:
+    """
+    Write the metrics report as JSON.
+
+    Args:
+        path: File to write
+        report: Report to write, metrics_report() by default
+
+    Returns:
+        Written report
+    """
+
+    report = report if report is not None else metrics_report()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.debug(f"Wrote metrics report {path}")
+    return report
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+# Exported fields of StageMetrics as (metric suffix, type, help, field)
+PROMETHEUS_SERIES = [
+    ("seconds_total", "counter", "Wall time spent in the stage", "seconds"),
+    ("self_seconds_total", "counter", "Wall time outside nested stages", "self_seconds"),
+    ("max_seconds", "gauge", "Longest single run of the stage", "max_seconds"),
+    ("calls_total", "counter", "Runs of the stage", "calls"),
+    ("events_total", "counter", "Events processed by the stage", "events"),
+    ("bytes_total", "counter", "Bytes processed by the stage", "bytes"),
+]
+PROMETHEUS_MEMORY_SERIES = [
+    ("peak_memory_bytes", "gauge", "Highest allocation above the stage's start", "peak_memory"),
+    ("retained_memory_bytes", "gauge", "Allocations still alive at the stage's end", "retained_memory"),
+    ("max_rss_bytes", "gauge", "Largest process RSS at the stage's end", "max_rss"),
+]
+
+
+def prometheus_text(report: dict) -> str:
+    """
+    Metrics report in the Prometheus text exposition format.
+
+    Stage totals are exported as hyliq_stage_* and the per address breakdown
+    as hyliq_address_stage_*, so summing a family never counts a stage twice.
+    """
+
+    series = PROMETHEUS_SERIES
+    if report.get("memory", {}).get("enabled"):
+        series = [*series, *PROMETHEUS_MEMORY_SERIES]
+
+    lines = []
+    for suffix, kind, help_text, field in series:
+        metric = f"{PROMETHEUS_PREFIX}_{suffix}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, row in report["stages"].items():
+            lines.append(f'{metric}{{stage="{_label(name)}"}} {row[field]}')
+
+    for suffix, kind, help_text, field in series:
+        metric = f"hyliq_address_stage_{suffix}"
+        lines.append(f"# HELP {metric} {help_text}, per address")
+        lines.append(f"# TYPE {metric} {kind}")
+        for address, stages in report["addresses"].items():
+            for name, row in stages.items():
+                lines.append(
+                    f'{metric}{{stage="{_label(name)}",address="{address}"}} {row[field]}'
+                )
+
+    if report["budgets"]:
+        metric = f"{PROMETHEUS_PREFIX}_budget_seconds"
+        lines.append(f"# HELP {metric} Budget of the stage's total wall time")
+        lines.append(f"# TYPE {metric} gauge")
+        for name, budget in report["budgets"].items():
+            lines.append(f'{metric}{{stage="{_label(name)}"}} {budget}')
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, report: dict | None = None) -> None:
+    """
+    Write the metrics report for the Prometheus node exporter textfile collector.
+
+    The file is replaced atomically so the collector never reads half of it.
+
+    Args:
+        path: .prom file to write
+        report: Report to write, metrics_report() by default
+    """
+
+    report = report if report is not None else metrics_report()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_text(report))
+    os.replace(tmp_path, path)
+    logger.debug(f"Wrote Prometheus metrics {path}")
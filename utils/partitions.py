@@ -0,0 +1,244 @@
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+from loguru import logger
+from utils.cache import cache_lock, read_cache_json, write_cache_json
+from utils.window import TimeKey, cached_time_window, merge_events
+
+MANIFEST_FILE = "manifest.json"
+
+
+def month_key(time_ms: int) -> str:
+    """Calendar month (UTC) of a time in ms, as YYYY-MM."""
+    return datetime.fromtimestamp(time_ms / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+def month_bounds(month: str) -> Tuple[int, int]:
+    """Start (inclusive) and end (exclusive) of a YYYY-MM month in ms."""
+    year, number = map(int, month.split("-"))
+    start = datetime(year, number, 1, tzinfo=timezone.utc)
+    end = datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+def read_manifest(partition_dir: str) -> dict | None:
+    """
+    Manifest of a partitioned cache, or None if it was never written.
+
+    The manifest maps each month to its row count, first and last event
+    time and whether the month is closed.
+    """
+
+    return read_cache_json(os.path.join(partition_dir, MANIFEST_FILE))
+
+
+def write_partitions(
+    partition_dir: str,
+    events: list,
+    key: TimeKey,
+    now: int | None = None,
+    force: bool = False,
+    partial_month: str | None = None,
+) -> dict:
+    """
+    Write events into one file per calendar month.
+
+    Months before the month of `now` are closed: they are written once and
+    never rewritten. The current month stays open and is replaced by every
+    write that contains it, and so does a month the events only cover in
+    part, e.g. the edge of a response cut at the API row cap.
+
+    Args:
+        partition_dir: Directory holding the month files and the manifest
+        events: Raw events
+        key: Function returning the time of an event in ms
+        now: Time in ms the events were fetched at, defaults to now
+        force: Also rewrite closed months, for events known to be the
+            complete history of the months they cover
+        partial_month: YYYY-MM month the events do not cover completely,
+            left open whatever its age
+
+    Returns:
+        Updated manifest
+    """
+
+    os.makedirs(partition_dir, exist_ok=True)
+    now = int(time.time() * 1000) if now is None else now
+    current = month_key(now)
+
+    months: Dict[str, list] = {}
+    for event in sorted(events, key=key):
+        months.setdefault(month_key(key(event)), []).append(event)
+
+    manifest_path = os.path.join(partition_dir, MANIFEST_FILE)
+    written = 0
+    with cache_lock(manifest_path):
+        manifest = read_manifest(partition_dir) or {"months": {}}
+        for month, rows in months.items():
+            entry = manifest["months"].get(month)
+            if entry is not None and entry["closed"] and not force:
+                continue
+
+            write_cache_json(os.path.join(partition_dir, f"{month}.json"), rows)
+            manifest["months"][month] = {
+                "rows": len(rows),
+                "first_time": key(rows[0]),
+                "last_time": key(rows[-1]),
+                "closed": month < current and month != partial_month,
+            }
+            written += 1
+
+        manifest["months"] = dict(sorted(manifest["months"].items()))
+        manifest["updated"] = now
+        write_cache_json(manifest_path, manifest)
+
+    logger.debug(f"Wrote {written} of {len(months)} month partitions to {partition_dir}")
+    return manifest
+
+
+def migrate_partitions(partition_dir: str, cache_path: str, key: TimeKey) -> dict | None:
+    """
+    Manifest of a partitioned cache, splitting a single file cache if needed.
+
+    The single file is left in place. Its modification time decides which
+    months it covered completely.
+
+    Args:
+        partition_dir: Directory holding the month files and the manifest
+        cache_path: Single JSON file cache of the same history
+        key: Function returning the time of an event in ms
+
+    Returns:
+        Manifest, or None if neither cache exists
+    """
+
+    manifest = read_manifest(partition_dir)
+    if manifest is not None or not os.path.isfile(cache_path):
+        return manifest
+
+    events = read_cache_json(cache_path)
+    if events is None:
+        return None
+    fetched_at = int(os.stat(cache_path).st_mtime * 1000)
+    logger.info(f"Partitioning {cache_path} into {partition_dir}")
+    return write_partitions(partition_dir, events, key, now=fetched_at)
+
+
+def open_from(manifest: dict) -> int:
+    """
+    Start time in ms of the part of a history that may still change.
+
+    That is the start of the first open month, or the end of the last closed
+    month when every month is closed.
+    """
+
+    months = manifest["months"]
+    for month, entry in months.items():
+        if not entry["closed"]:
+            return month_bounds(month)[0]
+    if months:
+        return month_bounds(list(months)[-1])[1]
+    return 0
+
+
+def read_partitions(
+    partition_dir: str,
+    key: TimeKey,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> List[dict]:
+    """
+    Events within [start_time, end_time), opening only the months it touches.
+
+    Args:
+        partition_dir: Directory holding the month files and the manifest
+        key: Function returning the time of an event in ms
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
+
+    Returns:
+        List of events sorted by time, or None if a partition is unreadable.
+        Unreadable months are reopened so the next refresh refetches them.
+    """
+
+    manifest = read_manifest(partition_dir) or {"months": {}}
+    events: List[dict] = []
+    unreadable = []
+    for month in manifest["months"]:
+        month_start, month_end = month_bounds(month)
+        if start_time is not None and month_end <= start_time:
+            continue
+        if end_time is not None and month_start >= end_time:
+            continue
+        month_path = os.path.join(partition_dir, f"{month}.json")
+        rows = None
+        if os.path.isfile(month_path):
+            rows = cached_time_window(month_path, key, start_time, end_time)
+        if rows is None:
+            unreadable.append(month)
+        else:
+            events.extend(rows)
+
+    if unreadable:
+        manifest_path = os.path.join(partition_dir, MANIFEST_FILE)
+        with cache_lock(manifest_path):
+            manifest = read_manifest(partition_dir) or {"months": {}}
+            for month in unreadable:
+                if month in manifest["months"]:
+                    manifest["months"][month]["closed"] = False
+            write_cache_json(manifest_path, manifest)
+        logger.warning(f"Reopened unreadable partitions {unreadable} in {partition_dir}")
+        return None
+
+    return events
+
+
+def append_partitions(
+    partition_dir: str,
+    events: list,
+    key: TimeKey,
+    uid: Callable[[dict], str],
+    now: int | None = None,
+) -> int | None:
+    """
+    Add events to the open months of a partitioned cache.
+
+    Only the open months are read back, merged with the new events and
+    rewritten, the same way a refresh from open_from rewrites them.
+
+    Args:
+        partition_dir: Directory holding the month files and the manifest
+        events: Raw events to add
+        key: Function returning the time of an event in ms
+        uid: Function returning the unique id of an event
+        now: Time in ms up to which the history is complete, defaults to
+            the latest event since a stream is only known complete up to there
+
+    Returns:
+        Number of events added, or None if there is no readable cache to
+        append to, in which case the next refresh fetches them
+    """
+
+    if not events:
+        return 0
+    now = max(map(key, events)) if now is None else now
+
+    manifest_path = os.path.join(partition_dir, MANIFEST_FILE)
+    with cache_lock(manifest_path):
+        manifest = read_manifest(partition_dir)
+        if manifest is None:
+            return None
+
+        start_time = open_from(manifest)
+        stored = read_partitions(partition_dir, key, start_time=start_time)
+        if stored is None:
+            return None
+
+        merged, added = merge_events(
+            stored, [event for event in events if key(event) >= start_time], key, uid
+        )
+        if added:
+            write_partitions(partition_dir, merged, key, now)
+
+    return added
@@ -0,0 +1,144 @@
+import bisect
+import os
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+from utils.cache import read_cache_json
+
+TimeKey = Callable[[dict], int]
+
+# Sorted time indexes of cached JSON files, keyed by path and invalidated by mtime
+MAX_TIME_INDEXES = 32
+_time_indexes: "OrderedDict[str, Tuple[int, List[int], list]]" = OrderedDict()
+
+
+def event_time(event: dict) -> int:
+    """Time in ms of a raw API event with a top level "time" field."""
+    return int(event["time"])
+
+
+def is_windowed(start_time: int | None, end_time: int | None) -> bool:
+    """Whether a time range restricts anything."""
+    return start_time is not None or end_time is not None
+
+
+def build_time_index(events: list, key: TimeKey) -> Tuple[List[int], list]:
+    """
+    Sort events by time, keeping the original order between equal times.
+
+    Args:
+        events: Raw events
+        key: Function returning the time of an event in ms
+
+    Returns:
+        Tuple of (sorted times, events in the same order)
+    """
+
+    ordered = sorted(events, key=key)
+    return [key(event) for event in ordered], ordered
+
+
+def slice_time_index(
+    times: List[int],
+    events: list,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> list:
+    """
+    Events within [start_time, end_time) located by binary search.
+
+    Args:
+        times: Sorted times from build_time_index
+        events: Events from build_time_index
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
+
+    Returns:
+        Slice of events
+    """
+
+    lo = 0 if start_time is None else bisect.bisect_left(times, start_time)
+    hi = len(times) if end_time is None else bisect.bisect_left(times, end_time)
+    return events[lo:hi]
+
+
+def time_window(
+    events: list,
+    key: TimeKey,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> list:
+    """
+    Events within [start_time, end_time), or all events if no bound is given.
+    """
+
+    if not is_windowed(start_time, end_time):
+        return events
+    return slice_time_index(*build_time_index(events, key), start_time, end_time)
+
+
+def cached_time_window(
+    cache_path: str,
+    key: TimeKey,
+    start_time: int | None = None,
+    end_time: int | None = None,
+    field: str | None = None,
+) -> list | None:
+    """
+    Events of a cached JSON file within [start_time, end_time).
+
+    The file is parsed and sorted once per modification; later windows over
+    the same file only cost a binary search and a slice.
+
+    Args:
+        cache_path: Cached JSON file holding a list of events
+        key: Function returning the time of an event in ms
+        start_time: Inclusive lower bound in ms
+        end_time: Exclusive upper bound in ms
+        field: Key of the event list if the file holds an object
+
+    Returns:
+        List of events sorted by time, or None if the file is unreadable
+    """
+
+    mtime = os.stat(cache_path).st_mtime_ns
+    cached = _time_indexes.get(cache_path)
+
+    if cached is None or cached[0] != mtime:
+        data = read_cache_json(cache_path)
+        if data is None:
+            return None
+        events = data.get(field, []) if field else data
+        cached = (mtime, *build_time_index(events, key))
+        _time_indexes[cache_path] = cached
+        if len(_time_indexes) > MAX_TIME_INDEXES:
+            _time_indexes.popitem(last=False)
+    else:
+        _time_indexes.move_to_end(cache_path)
+
+    return slice_time_index(cached[1], cached[2], start_time, end_time)
+
+
+def merge_events(
+    events: list, new_events: list, key: TimeKey, uid: Callable[[dict], str]
+) -> Tuple[list, int]:
+    """
+    Merge new events into a history, dropping the ones already in it.
+
+    Args:
+        events: Raw events already stored
+        new_events: Raw events to add
+        key: Function returning the time of an event in ms
+        uid: Function returning the unique id of an event
+
+    Returns:
+        Tuple of (merged events sorted by time, number of events added)
+    """
+
+    seen = {uid(event) for event in events}
+    added = []
+    for event in new_events:
+        event_uid = uid(event)
+        if event_uid not in seen:
+            seen.add(event_uid)
+            added.append(event)
+    return sorted([*events, *added], key=key), len(added)
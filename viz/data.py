@@ -0,0 +1,80 @@
+import hashlib
+import io
+import os
+import tempfile
+from typing import TYPE_CHECKING
+import polars as pl
+from loguru import logger
+
+if TYPE_CHECKING:
+    import altair as alt
+
+CHART_DATA_FORMATS = ("json", "csv")
+
+
+def _serialize(df: pl.DataFrame, data_format: str) -> bytes:
+    # Vega reads epoch milliseconds as dates, polars writes datetimes as strings
+    df = df.with_columns(
+        pl.col(name).dt.epoch("ms")
+        for name, dtype in df.schema.items()
+        if dtype.is_temporal()
+    )
+    buffer = io.BytesIO()
+    if data_format == "json":
+        df.write_json(buffer)
+    else:
+        df.write_csv(buffer)
+    return buffer.getvalue()
+
+
+def chart_data(
+    df: pl.DataFrame,
+    name: str,
+    data_dir: str | None = None,
+    data_format: str = "json",
+) -> "pl.DataFrame | alt.UrlData":
+    """
+    Data of a chart, inline or as an external file referenced by URL.
+
+    External files are named after a digest of their content, so charts
+    rendered again from the same data reuse the file and a chart never points
+    at data from another run. The URL is data_dir joined with the file name,
+    relative to the page the chart is saved to.
+
+    Args:
+        df: Chart data
+        name: Prefix of the file name
+        data_dir: Directory to write the file to, None to embed the data
+        data_format: "json" records, or "csv" which is about half the size
+
+    Returns:
+        The frame itself when embedding, otherwise Altair URL data
+    """
+
+    if data_dir is None:
+        return df
+
+    import altair as alt
+
+    if data_format not in CHART_DATA_FORMATS:
+        raise ValueError(
+            f"Unknown chart data format {data_format}, expected one of {CHART_DATA_FORMATS}"
+        )
+
+    content = _serialize(df, data_format)
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    file_name = f"{name}-{digest}.{data_format}"
+    path = os.path.join(data_dir, file_name)
+
+    if not os.path.isfile(path):
+        os.makedirs(data_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=data_dir, prefix=f".{file_name}.")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        logger.debug(f"Wrote {len(df)} chart rows to {path}")
+
+    return alt.UrlData(
+        url=f"{data_dir.rstrip('/')}/{file_name}",
+        format=alt.DataFormat(type=data_format),
+    )
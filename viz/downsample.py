@@ -0,0 +1,181 @@
+from typing import List
+import polars as pl
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+# Points per LTTB bucket from which scanning with polars beats plain Python
+_SERIES_BUCKET_SIZE = 64
+
+
+def _as_float(series: pl.Series) -> pl.Series:
+    # Datetimes are compared on their epoch value
+    if series.dtype.is_temporal():
+        series = series.to_physical()
+    return series.cast(pl.Float64)
+
+
+def lttb_indices(x: pl.Series, y: pl.Series, n_out: int) -> List[int]:
+    """
+    Rows kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last rows are always kept. The rows in between are split in
+    n_out - 2 buckets of equal count, and each bucket keeps the row forming
+    the largest triangle with the row kept in the previous bucket and the
+    average of the next bucket.
+
+    Args:
+        x: Sorted x values, numeric or temporal
+        y: Y values without nulls
+        n_out: Number of rows to keep
+
+    Returns:
+        Sorted row indices
+    """
+
+    n = len(x)
+    if n_out >= n:
+        return list(range(n))
+    if n_out < 3:
+        return [0, n - 1]
+
+    x = _as_float(x)
+    y = _as_float(y)
+    every = (n - 2) / (n_out - 2)
+    bounds = [1 + int(i * every) for i in range(n_out - 2)] + [n - 1]
+
+    # Averages of every bucket up front, only the anchor is sequential
+    bucket = (
+        pl.DataFrame({"x": x, "y": y})
+        .slice(1, n - 2)
+        .with_columns(
+            (
+                pl.Series(bounds[:-1]).search_sorted(
+                    pl.int_range(1, n - 1, eager=True), side="right"
+                )
+                - 1
+            ).alias("bucket")
+        )
+        .group_by("bucket")
+        .agg(pl.col("x").mean(), pl.col("y").mean())
+        .sort("bucket")
+    )
+    avg_x = bucket["x"].to_list() + [x[-1]]
+    avg_y = bucket["y"].to_list() + [y[-1]]
+
+    # Small buckets are cheaper to scan in Python than with a Series call each
+    if every < _SERIES_BUCKET_SIZE:
+        x, y = x.to_list(), y.to_list()
+
+    indices = [0]
+    anchor_x, anchor_y = x[0], y[0]
+    for i in range(n_out - 2):
+        start, end = bounds[i], bounds[i + 1]
+
+        # Twice the triangle area is linear in the candidate's x and y
+        dx = anchor_x - avg_x[i + 1]
+        dy = avg_y[i + 1] - anchor_y
+        offset = dx * anchor_y + dy * anchor_x
+        if isinstance(x, list):
+            selected = max(
+                range(start, end), key=lambda j: abs(y[j] * dx + x[j] * dy - offset)
+            )
+        else:
+            area = (
+                y.slice(start, end - start) * dx
+                + x.slice(start, end - start) * dy
+                - offset
+            ).abs()
+            selected = start + area.arg_max()
+
+        indices.append(selected)
+        anchor_x, anchor_y = x[selected], y[selected]
+
+    indices.append(n - 1)
+    return indices
+
+
+def minmax_indices(y: pl.Series, n_out: int) -> List[int]:
+    """
+    Rows kept by min/max bucket downsampling.
+
+    Rows are split in n_out // 2 buckets of equal count and every bucket keeps
+    its lowest and highest row, so spikes survive at the cost of the shape in
+    between. The first and last rows are always kept.
+
+    Args:
+        y: Y values without nulls
+        n_out: Approximate number of rows to keep
+
+    Returns:
+        Sorted row indices
+    """
+
+    n = len(y)
+    if n_out >= n:
+        return list(range(n))
+
+    buckets = max(n_out // 2, 1)
+    kept = (
+        pl.DataFrame({"y": _as_float(y)})
+        .with_row_index("row")
+        .with_columns((pl.col("row") * buckets // n).alias("bucket"))
+        .group_by("bucket")
+        .agg(
+            pl.col("row").get(pl.col("y").arg_min()).alias("low"),
+            pl.col("row").get(pl.col("y").arg_max()).alias("high"),
+        )
+    )
+    return sorted(
+        {0, n - 1, *kept["low"].to_list(), *kept["high"].to_list()}
+    )
+
+
+def downsample(
+    df: pl.DataFrame,
+    x: str,
+    y: str,
+    n_out: int,
+    by: str | List[str] | None = None,
+    method: str = "lttb",
+) -> pl.DataFrame:
+    """
+    Downsample every series of a frame to about n_out rows.
+
+    Args:
+        df: Frame sorted by x within every series
+        x: Column of the x axis, numeric or temporal
+        y: Column of the values
+        n_out: Rows to keep per series
+        by: Columns identifying a series, e.g. the metric of a long frame
+        method: "lttb" to keep the visual shape, "minmax" to keep extremes
+
+    Returns:
+        Frame with the same columns and at most about n_out rows per series,
+        null values of y are dropped
+    """
+
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(
+            f"Unknown downsampling method {method}, expected one of {DOWNSAMPLE_METHODS}"
+        )
+
+    series = (
+        df.filter(pl.col(y).is_not_null()).partition_by(by, maintain_order=True)
+        if by
+        else [df.filter(pl.col(y).is_not_null())]
+    )
+
+    sampled = []
+    for part in series:
+        if len(part) <= n_out:
+            sampled.append(part)
+            continue
+        if method == "lttb":
+            indices = lttb_indices(part[x], part[y], n_out)
+        else:
+            indices = minmax_indices(part[y], n_out)
+        sampled.append(part[indices])
+
+    if not sampled:
+        return df.clear()
+    return pl.concat(sampled)
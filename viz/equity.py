@@ -0,0 +1,236 @@
+from typing import TYPE_CHECKING, List, Tuple
+import polars as pl
+from config import (
+    chart_data_dir,
+    chart_data_format,
+    chart_downsample_method,
+    chart_height,
+    chart_max_points,
+    chart_width,
+)
+from analytics.equity import replay_prices, state_timeline, value_state_timeline
+from viz.data import chart_data
+from viz.downsample import downsample
+from viz.portfolio import USD_LABEL_EXPR
+
+if TYPE_CHECKING:
+    import altair as alt
+
+EQUITY_METRICS = ["Total", "Spot", "Perp"]
+
+
+def bucket_every(time: pl.Series, buckets: int) -> str:
+    """
+    Duration splitting the span of a time column in at most `buckets` windows.
+
+    Args:
+        time: Datetime column
+        buckets: Maximum number of windows
+
+    Returns:
+        Polars duration string in milliseconds, e.g. "3600000ms"
+    """
+
+    span = (time.max() - time.min()).total_seconds() * 1000 if len(time) else 0
+    return f"{max(int(span // buckets) + 1, 1)}ms"
+
+
+def equity_timeline(
+    cash: pl.DataFrame, balances: pl.DataFrame, prices: pl.DataFrame
+) -> pl.DataFrame:
+    """
+    Spot, perp and total equity after every replayed event.
+
+    Spot equity is spot USDC plus spot balances at the last trade price, perp
+    equity is perp USDC plus margin in use, and total equity also counts
+    vault balances. Perp unrealized PnL is not included, see
+    analytics.equity.value_state_timeline.
+
+    Args:
+        cash: Cash frame from state_timeline
+        balances: Balance frame from state_timeline
+        prices: Frame with time, token and px
+
+    Returns:
+        Long frame with event, time, metric and value
+    """
+
+    valued = value_state_timeline(cash, balances, prices)
+
+    return valued.select(
+        "event",
+        "time",
+        pl.col("equity").alias("Total"),
+        (pl.col("spot_usdc") + pl.col("spot_value")).alias("Spot"),
+        (pl.col("perp_usdc") + pl.col("margin_used")).alias("Perp"),
+    ).unpivot(
+        index=["event", "time"],
+        on=EQUITY_METRICS,
+        variable_name="metric",
+        value_name="value",
+    )
+
+
+def exposure_timeline(
+    balances: pl.DataFrame, prices: pl.DataFrame, buckets: int = chart_max_points
+) -> pl.DataFrame:
+    """
+    USD exposure per token and account kind on a common time grid.
+
+    Every series keeps its last value in each window and is forward filled, so
+    the series line up for stacking.
+
+    Args:
+        balances: Balance frame from state_timeline
+        prices: Frame with time, token and px
+        buckets: Maximum number of windows
+
+    Returns:
+        Long frame with time, series (e.g. "HYPE perp") and value
+    """
+
+    if balances.is_empty():
+        return pl.DataFrame(
+            schema={"time": pl.Datetime("ms"), "series": pl.String, "value": pl.Float64}
+        )
+
+    valued = (
+        balances.sort("time")
+        .join_asof(
+            prices.sort("time"),
+            on="time",
+            by="token",
+            strategy="backward",
+            check_sortedness=False,
+        )
+        .select(
+            "time",
+            pl.concat_str("token", "kind", separator=" ").alias("series"),
+            (pl.col("amount") * pl.col("px")).fill_null(0.0).alias("value"),
+        )
+        .sort("time")
+    )
+    last = valued.group_by_dynamic(
+        "time", every=bucket_every(valued["time"], buckets), group_by="series"
+    ).agg(pl.col("value").last())
+
+    grid = (
+        last.select("time")
+        .unique()
+        .join(last.select("series").unique(), how="cross")
+    )
+    return (
+        grid.join(last, on=["time", "series"], how="left")
+        .sort("series", "time")
+        .with_columns(pl.col("value").forward_fill().over("series").fill_null(0.0))
+    )
+
+
+def equity_frames(
+    out: List[dict],
+    prices: pl.DataFrame | None = None,
+    max_points: int | None = chart_max_points,
+    downsample_method: str = chart_downsample_method,
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Chart data of a replay timeline, reduced to about max_points per series.
+
+    Args:
+        out: Replay output as produced by replay_updates
+        prices: Frame with time, token and px, by default the trade prices
+            found in the timeline itself
+        max_points: Points kept per series, None keeps every event
+        downsample_method: "lttb" or "minmax", see viz.downsample
+
+    Returns:
+        Tuple of (equity frame with time, metric and value, exposure frame
+        with time, series and value)
+    """
+
+    cash, balances = state_timeline(out)
+    if prices is None:
+        prices = replay_prices(out)
+
+    equity = equity_timeline(cash, balances, prices).drop("event")
+    if max_points is not None:
+        equity = downsample(
+            equity, "time", "value", max_points, by="metric", method=downsample_method
+        )
+    exposure = exposure_timeline(balances, prices, max_points or max(len(out), 1))
+    return equity, exposure
+
+
+def visualize_equity(
+    out: List[dict],
+    title: str = None,
+    prices: pl.DataFrame | None = None,
+    max_points: int | None = chart_max_points,
+    downsample_method: str = chart_downsample_method,
+    data_dir: str | None = chart_data_dir,
+    data_format: str = chart_data_format,
+) -> "alt.VConcatChart":
+    """
+    Equity lines and stacked per-token exposure of a replay timeline.
+
+    Args:
+        out: Replay output as produced by replay_updates
+        title: Chart title
+        prices: Frame with time, token and px, by default the trade prices
+            found in the timeline itself
+        max_points: Points kept per series, None keeps every event
+        downsample_method: "lttb" or "minmax", see viz.downsample
+        data_dir: Directory to write the chart data to instead of embedding it
+        data_format: Format of the external data, "json" or "csv"
+
+    Returns:
+        Altair chart with the equity chart above the exposure chart
+    """
+
+    import altair as alt
+
+    equity, exposure = equity_frames(out, prices, max_points, downsample_method)
+
+    usd_axis = alt.Axis(format="~s", labelExpr=USD_LABEL_EXPR)
+    x = alt.X("time:T", title="Timestamp")
+
+    equity_chart = (
+        alt.Chart(chart_data(equity, "equity", data_dir, data_format))
+        .mark_line()
+        .encode(
+            x=x,
+            y=alt.Y("value:Q", title="Equity (USD)", axis=usd_axis),
+            color=alt.Color(
+                "metric:N",
+                title="Equity",
+                scale=alt.Scale(
+                    domain=EQUITY_METRICS, range=["blue", "orange", "green"]
+                ),
+            ),
+            tooltip=[
+                "time:T",
+                "metric:N",
+                alt.Tooltip("value:Q", title="Value (USD)", format="~s"),
+            ],
+        )
+        .properties(title="Equity", width=chart_width, height=chart_height)
+    )
+
+    exposure_chart = (
+        alt.Chart(chart_data(exposure, "exposure", data_dir, data_format))
+        .mark_area()
+        .encode(
+            x=x,
+            y=alt.Y("value:Q", title="Exposure (USD)", axis=usd_axis, stack="zero"),
+            color=alt.Color("series:N", title="Token"),
+            tooltip=[
+                "time:T",
+                "series:N",
+                alt.Tooltip("value:Q", title="Value (USD)", format="~s"),
+            ],
+        )
+        .properties(title="Exposure", width=chart_width, height=chart_height)
+    )
+
+    return alt.vconcat(equity_chart, exposure_chart).properties(
+        title=title if title else "Replayed Equity"
+    )
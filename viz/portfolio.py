@@ -1,9 +1,24 @@
-import altair as alt
+from typing import TYPE_CHECKING
 import polars as pl
 from loguru import logger
-from config import chart_width, chart_height
+from config import (
+    chart_data_dir,
+    chart_data_format,
+    chart_downsample_method,
+    chart_height,
+    chart_max_points,
+    chart_width,
+)
 from models.df_models.portfolio import portfolio_period_enum, portfolio_schema
 from utils.num import format_number
+from viz.data import chart_data
+from viz.downsample import downsample
+
+if TYPE_CHECKING:
+    import altair as alt
+
+# Axis labels in K, M and B of USD
+USD_LABEL_EXPR = "datum.value >= 1e9 ? format(datum.value / 1e9, '.1f') + 'B' : datum.value >= 1e6 ? format(datum.value / 1e6, '.1f') + 'M' : datum.value >= 1e3 ? format(datum.value / 1e3, '.1f') + 'K' : format(datum.value, '.0f')"
 
 
 def visualize_portfolio(
@@ -11,7 +26,30 @@ def visualize_portfolio(
     title: str = None,
     show_pnl: bool = True,
     show_account_value: bool = True,
-) -> alt.Chart:
+    max_points: int | None = chart_max_points,
+    downsample_method: str = chart_downsample_method,
+    data_dir: str | None = chart_data_dir,
+    data_format: str = chart_data_format,
+) -> "alt.Chart":
+    """
+    Line chart of the account value and PnL history of a portfolio frame.
+
+    Args:
+        df: Frame following portfolio_schema, of a single period
+        title: Chart title
+        show_pnl: Whether to draw the PnL line
+        show_account_value: Whether to draw the account value line
+        max_points: Points kept per line, None keeps every row
+        downsample_method: "lttb" or "minmax", see viz.downsample
+        data_dir: Directory to write the chart data to instead of embedding it
+        data_format: Format of the external data, "json" or "csv"
+
+    Returns:
+        Altair chart
+    """
+
+    # altair is slow to import, only chart building needs it
+    import altair as alt
 
     if df.schema != portfolio_schema:
         logger.error(
@@ -40,18 +78,27 @@ def visualize_portfolio(
         variable_name="metric",
         value_name="value",
     )
+    if max_points is not None:
+        df_long = downsample(
+            df_long.sort("timestamp", maintain_order=True),
+            "timestamp",
+            "value",
+            max_points,
+            by="metric",
+            method=downsample_method,
+        )
 
     chart = (
-        alt.Chart(df_long)
+        alt.Chart(chart_data(df_long, "portfolio", data_dir, data_format))
         .mark_line()
         .encode(
-            x=alt.X("timestamp", title="Timestamp"),
+            x=alt.X("timestamp:T", title="Timestamp"),
             y=alt.Y(
-                "value",
+                "value:Q",
                 title="Value (USD)",
                 axis=alt.Axis(
                     format="~s",  # SI prefix formatting (K, M, B)
-                    labelExpr="datum.value >= 1e9 ? format(datum.value / 1e9, '.1f') + 'B' : datum.value >= 1e6 ? format(datum.value / 1e6, '.1f') + 'M' : datum.value >= 1e3 ? format(datum.value / 1e3, '.1f') + 'K' : format(datum.value, '.0f')",
+                    labelExpr=USD_LABEL_EXPR,
                 ),
             ),
             color=alt.Color(
@@ -63,8 +110,8 @@ def visualize_portfolio(
                 ),
             ),
             tooltip=[
-                "timestamp",
-                "metric",
+                "timestamp:T",
+                "metric:N",
                 alt.Tooltip("value:Q", title="Value (USD)", format="~s"),
             ],
         )
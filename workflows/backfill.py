@@ -0,0 +1,506 @@
+"""
+Resumable history backfill for batches of addresses.
+
+Every (address, endpoint) pair is a unit of work tracked in a SQLite progress
+ledger together with its pagination cursor, so a backfill killed at any
+point resumes where it stopped and never refetches finished units:
+
+    python -m workflows.backfill addresses.txt
+    python -m workflows.backfill 0xabc... 0xdef... --endpoints user_fills user_funding
+    python -m workflows.backfill --status
+"""
+
+import argparse
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing
+from typing import Callable, Dict, Iterable, List, Tuple
+from loguru import logger
+from config import backfill_ledger_path, backfill_max_attempts, cache_dir
+from loaders.event_store import count_new_events, read_events, upsert_events
+from loaders.explorer import get_user_explorer_json
+from loaders.portfolio import get_portfolio_json
+from loaders.twap import get_twap_history_json
+from utils.cache import write_cache_json
+from utils.metrics import stage
+from utils.partitions import write_partitions
+from utils.window import event_time
+
+# Paginated endpoints: event kind -> (request type, extra payload fields).
+# Pages are requested by startTime, the API returns the oldest rows first.
+# Fills are aggregated by time, the rows of the user_fills kind of the store.
+PAGINATED: Dict[str, Tuple[str, dict]] = {
+    "user_fills": ("userFillsByTime", {"aggregateByTime": True}),
+    "user_funding": ("userFunding", {}),
+    "user_ledger_updates": ("userNonFundingLedgerUpdates", {}),
+}
+
+# Most rows the API returns per page of each paginated endpoint
+PAGE_SIZES: Dict[str, int] = {
+    "user_fills": 2000,
+    "user_funding": 500,
+    "user_ledger_updates": 500,
+}
+
+# Endpoints returned whole by a single request, fetched through their loader
+SINGLE_REQUEST: Dict[str, Callable[..., object]] = {
+    "twap_history": get_twap_history_json,
+    "user_explorer": get_user_explorer_json,
+    "portfolio": get_portfolio_json,
+}
+
+ENDPOINTS = [*PAGINATED, *SINGLE_REQUEST]
+
+# A running unit whose heartbeat is older than this was abandoned by a dead worker
+LEASE_SECONDS = 300.0
+
+
+def connect(path: str = backfill_ledger_path) -> sqlite3.Connection:
+    """
+    Open the progress ledger, creating it if needed.
+
+    Args:
+        path: SQLite database file
+
+    Returns:
+        Open sqlite3 connection in WAL mode
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS units (
+            address TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            cursor INTEGER NOT NULL DEFAULT 0,
+            pages INTEGER NOT NULL DEFAULT 0,
+            -- Rows added to the store so far, the size of the history once done
+            events INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            seconds REAL NOT NULL DEFAULT 0,
+            worker TEXT,
+            updated_at REAL,
+            PRIMARY KEY (address, endpoint)
+        )
+        """
+    )
+    return conn
+
+
+def add_units(
+    addresses: Iterable[str],
+    endpoints: Iterable[str] = ENDPOINTS,
+    path: str = backfill_ledger_path,
+) -> int:
+    """
+    Register the units of a backfill, keeping the progress of known ones.
+
+    Args:
+        addresses: User addresses to backfill
+        endpoints: Endpoints to backfill for every address
+        path: SQLite database file
+
+    Returns:
+        Number of new units
+    """
+
+    endpoints = list(endpoints)
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        raise ValueError(f"Unknown backfill endpoints: {sorted(unknown)}")
+
+    rows = [(address.lower(), endpoint) for address in addresses for endpoint in endpoints]
+    with closing(connect(path)) as conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO units (address, endpoint) VALUES (?, ?)", rows
+        )
+        return conn.total_changes - before
+
+
+def reset_failed(path: str = backfill_ledger_path) -> int:
+    """Give units that failed a new set of attempts, keeping their cursor."""
+    with closing(connect(path)) as conn:
+        return conn.execute(
+            "UPDATE units SET attempts = 0 WHERE status = 'retry'"
+        ).rowcount
+
+
+def worker_id() -> str:
+    """Host and process id of this worker."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def release_dead_workers(path: str = backfill_ledger_path) -> int:
+    """
+    Free the units held by dead worker processes of this host.
+
+    Units of workers on other hosts are freed once their lease expires.
+
+    Returns:
+        Number of units released
+    """
+
+    host = socket.gethostname()
+    with closing(connect(path)) as conn:
+        workers = [
+            worker
+            for (worker,) in conn.execute(
+                "SELECT DISTINCT worker FROM units WHERE status = 'running'"
+            )
+            if worker and worker.rpartition(":")[0] == host
+        ]
+        dead = []
+        for worker in workers:
+            try:
+                os.kill(int(worker.rpartition(":")[2]), 0)
+            except ProcessLookupError:
+                dead.append(worker)
+            except PermissionError:
+                pass
+        released = 0
+        for worker in dead:
+            released += conn.execute(
+                "UPDATE units SET status = 'retry' WHERE status = 'running' AND worker = ?",
+                (worker,),
+            ).rowcount
+    return released
+
+
+def claim_unit(
+    max_attempts: int = backfill_max_attempts, path: str = backfill_ledger_path
+) -> Tuple[str, str, int] | None:
+    """
+    Take the next unit to work on.
+
+    Pending units go first, then units to retry, fewest attempts first, and
+    units abandoned by a dead worker. Claiming is atomic, so several
+    workers can share a ledger.
+
+    Args:
+        max_attempts: Attempts after which a failing unit is left alone
+        path: SQLite database file
+
+    Returns:
+        Tuple of (address, endpoint, pagination cursor), or None when no
+        unit is left
+    """
+
+    now = time.time()
+    with closing(connect(path)) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            """
+            SELECT address, endpoint, cursor FROM units
+            WHERE status = 'pending'
+                OR (status = 'retry' AND attempts < ?)
+                OR (status = 'running' AND updated_at < ?)
+            ORDER BY status != 'pending', attempts, rowid
+            LIMIT 1
+            """,
+            (max_attempts, now - LEASE_SECONDS),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                """
+                UPDATE units SET status = 'running', attempts = attempts + 1,
+                    worker = ?, updated_at = ? WHERE address = ? AND endpoint = ?
+                """,
+                (worker_id(), now, row[0], row[1]),
+            )
+        conn.execute("COMMIT")
+    return row
+
+
+def _finish_attempt(
+    address: str,
+    endpoint: str,
+    path: str,
+    status: str,
+    seconds: float,
+    error: str | None = None,
+    events: int | None = None,
+) -> None:
+    with closing(connect(path)) as conn:
+        conn.execute(
+            """
+            UPDATE units SET status = ?, error = ?, events = COALESCE(?, events),
+                seconds = seconds + ?, updated_at = ?
+            WHERE address = ? AND endpoint = ?
+            """,
+            (status, error, events, seconds, time.time(), address, endpoint),
+        )
+
+
+def _save_page(
+    address: str, endpoint: str, cursor: int, events: int, path: str
+) -> None:
+    # Cursor and counters move together, a page is never counted twice
+    with closing(connect(path)) as conn:
+        conn.execute(
+            """
+            UPDATE units SET cursor = ?, pages = pages + 1, events = events + ?,
+                updated_at = ? WHERE address = ? AND endpoint = ?
+            """,
+            (cursor, events, time.time(), address, endpoint),
+        )
+
+
+def write_history_cache(kind: str, address: str, events: List[dict]) -> None:
+    """
+    Write a complete history where the loaders look for it.
+
+    Every month is rewritten, including months closed by an earlier capped
+    response or by the migration of a single file cache.
+
+    Args:
+        kind: Paginated event kind
+        address: User address
+        events: Full history of raw events
+    """
+
+    address = address.lower()
+    if kind == "user_fills":
+        partition_dir = os.path.join(
+            cache_dir, "user_fills", f"{address}_user_fills_agg"
+        )
+        write_partitions(partition_dir, events, event_time, force=True)
+    elif kind == "user_funding":
+        partition_dir = os.path.join(cache_dir, "user_funding", f"{address}_user_funding")
+        write_partitions(partition_dir, events, event_time, force=True)
+    elif kind == "user_ledger_updates":
+        write_cache_json(
+            os.path.join(cache_dir, "user_ledger_updates", f"{address}_ledger_updates.json"),
+            events,
+        )
+    else:
+        raise ValueError(f"Not a paginated event kind: {kind}")
+
+
+def backfill_paginated(
+    address: str, endpoint: str, cursor: int, path: str = backfill_ledger_path
+) -> int:
+    """
+    Page through an endpoint from a cursor, then write its cache.
+
+    Each page is upserted into the event store before the cursor moves past
+    it, so a resumed unit continues from its last saved page and refetched
+    rows are deduplicated, only rows new to the store are counted. Once a
+    page brings nothing newer than the cursor the history is complete and is
+    written to the cache from the store.
+
+    Args:
+        address: User address
+        endpoint: Paginated event kind
+        cursor: Time in ms to request the next page from
+        path: SQLite database file of the progress ledger
+
+    Returns:
+        Number of events in the written history
+
+    Raises:
+        RuntimeError: If a full page holds a single timestamp, as paging by
+            startTime cannot reach the rows past it
+    """
+
+    from utils.http import post_info
+
+    request_type, extra = PAGINATED[endpoint]
+    while True:
+        page = post_info(
+            {"type": request_type, "user": address, "startTime": cursor, **extra}
+        )
+        new = count_new_events(endpoint, address, page)
+        upsert_events(endpoint, address, page)
+        newest = max(map(event_time, page), default=cursor)
+        if newest <= cursor:
+            if len(page) >= PAGE_SIZES[endpoint]:
+                raise RuntimeError(
+                    f"{endpoint} of {address} has a full page of {len(page)} rows "
+                    f"at {cursor}, the rows after them cannot be paged to"
+                )
+            if new:
+                _save_page(address, endpoint, cursor, new, path)
+            break
+
+        # Rows at the newest time may continue on the next page, so it is
+        # requested again from that time and the repeats deduplicated
+        cursor = newest
+        _save_page(address, endpoint, cursor, new, path)
+        logger.debug(f"{endpoint} of {address}: {new} new rows up to {cursor}")
+
+    events = read_events(endpoint, address)
+    write_history_cache(endpoint, address, events)
+    return len(events)
+
+
+def run_unit(
+    address: str, endpoint: str, cursor: int, path: str = backfill_ledger_path
+) -> int:
+    """
+    Backfill one unit and record its outcome in the ledger.
+
+    Args:
+        address: User address
+        endpoint: Endpoint to backfill
+        cursor: Saved pagination cursor
+        path: SQLite database file of the progress ledger
+
+    Returns:
+        Number of events backfilled, 0 when the unit failed
+    """
+
+    start = time.perf_counter()
+    try:
+        with stage(f"backfill.{endpoint}", address) as measurement:
+            if endpoint in PAGINATED:
+                events = backfill_paginated(address, endpoint, cursor, path)
+            else:
+                result = SINGLE_REQUEST[endpoint](address, use_cache=False)
+                events = len(result.get("txs", [])) if isinstance(result, dict) else len(result)
+            measurement.add(events=events)
+    except Exception as e:
+        logger.error(f"Backfill of {endpoint} for {address} failed: {e}")
+        _finish_attempt(
+            address,
+            endpoint,
+            path,
+            "retry",
+            time.perf_counter() - start,
+            error=f"{type(e).__name__}: {e}",
+        )
+        return 0
+
+    _finish_attempt(
+        address, endpoint, path, "done", time.perf_counter() - start, events=events
+    )
+    return events
+
+
+def progress(
+    max_attempts: int = backfill_max_attempts, path: str = backfill_ledger_path
+) -> Dict[str, int]:
+    """
+    Number of units per status.
+
+    Units still to retry that ran out of attempts are reported as failed.
+    """
+
+    with closing(connect(path)) as conn:
+        rows = conn.execute(
+            """
+            SELECT CASE WHEN status = 'retry' AND attempts >= ? THEN 'failed'
+                ELSE status END, COUNT(*)
+            FROM units GROUP BY 1
+            """,
+            (max_attempts,),
+        ).fetchall()
+    counts = {"pending": 0, "running": 0, "retry": 0, "failed": 0, "done": 0}
+    counts.update(dict(rows))
+    return counts
+
+
+def run_backfill(
+    max_attempts: int = backfill_max_attempts,
+    path: str = backfill_ledger_path,
+    log_every: float = 10.0,
+) -> Dict[str, int]:
+    """
+    Work through the ledger until every unit is done or out of attempts.
+
+    Failed units are retried after the others, so one bad address never
+    blocks the batch. Throughput and an ETA are logged as units complete.
+
+    Args:
+        max_attempts: Attempts per unit before it is left as failed
+        path: SQLite database file of the progress ledger
+        log_every: Seconds between progress lines
+
+    Returns:
+        Number of units per status at the end
+    """
+
+    released = release_dead_workers(path)
+    if released:
+        logger.info(f"Resuming {released} units interrupted by a dead worker")
+
+    counts = progress(max_attempts, path)
+    remaining_at_start = counts["pending"] + counts["running"] + counts["retry"]
+    logger.info(f"Backfill of {remaining_at_start} units starting: {counts}")
+
+    started = time.perf_counter()
+    last_log = started
+    finished = events = 0
+    while True:
+        unit = claim_unit(max_attempts, path)
+        if unit is None:
+            break
+        events += run_unit(*unit, path=path)
+        finished += 1
+
+        now = time.perf_counter()
+        if now - last_log >= log_every:
+            last_log = now
+            counts = progress(max_attempts, path)
+            remaining = counts["pending"] + counts["running"] + counts["retry"]
+            elapsed = now - started
+            eta = remaining * elapsed / finished
+            logger.info(
+                f"{counts['done']} done, {remaining} to go, {counts['failed']} failed | "
+                f"{finished / elapsed:.2f} units/s, {events / elapsed:.0f} events/s | "
+                f"ETA {eta / 60:.1f} min"
+            )
+
+    counts = progress(max_attempts, path)
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Backfill finished in {elapsed:.0f}s, {events} events: {counts}"
+    )
+    return counts
+
+
+def _read_addresses(sources: List[str]) -> List[str]:
+    """Addresses given directly or one per line in files."""
+    addresses = []
+    for source in sources:
+        if os.path.isfile(source):
+            with open(source, "r") as f:
+                addresses.extend(
+                    line.strip()
+                    for line in f
+                    if line.strip() and not line.startswith("#")
+                )
+        else:
+            addresses.append(source)
+    return addresses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("addresses", nargs="*", help="Addresses or files of addresses")
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument("--ledger", default=backfill_ledger_path)
+    parser.add_argument("--max-attempts", type=int, default=backfill_max_attempts)
+    parser.add_argument("--retry-failed", action="store_true")
+    parser.add_argument("--status", action="store_true", help="Only show progress")
+    args = parser.parse_args()
+
+    if args.status:
+        logger.info(progress(args.max_attempts, args.ledger))
+        return
+
+    added = add_units(_read_addresses(args.addresses), args.endpoints, args.ledger)
+    logger.info(f"Registered {added} new units")
+    if args.retry_failed:
+        logger.info(f"Retrying {reset_failed(args.ledger)} failed units")
+    run_backfill(args.max_attempts, args.ledger)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Workflow engine running steps in parallel with content-hashed artifacts.
+
+Steps declare the steps they take their inputs from. A step runs as soon as
+its inputs are available, and its output is stored under the digest of its
+content. A step is skipped when its code, parameters and the content of its
+inputs are unchanged since a previous run, so workflows sharing a step only
+run it once and a rerun only rebuilds what changed. Code the function relies
+on outside of its own module is declared by the step.
+"""
+
+import glob
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import lru_cache
+from graphlib import TopologicalSorter
+from typing import Any, Callable, Dict, List
+import polars as pl
+from loguru import logger
+from config import artifact_dir, workflow_workers
+from utils.cache import (
+    CHECKSUM_SUFFIX,
+    LOCK_SUFFIX,
+    atomic_path,
+    file_checksum,
+    read_cache_json,
+    verify_checksum,
+    write_cache_json,
+)
+from utils.metrics import stage
+
+
+@dataclass
+class Step:
+    """
+    A unit of a workflow.
+
+    Names are "<kind>:<qualifier>", e.g. "fills:0xabc...", and steps of the
+    same name are the same step. The function receives params and the values
+    of its inputs as keyword arguments. It returns a Polars frame, a JSON
+    serializable value, or None when its result is the files in outputs.
+    """
+
+    name: str
+    run: Callable[..., Any]
+    # Argument -> name of the step, or list of step names, providing it
+    inputs: Dict[str, str | List[str]] = field(default_factory=dict)
+    # JSON serializable arguments, part of the cache key
+    params: Dict[str, Any] = field(default_factory=dict)
+    # Files written by the step
+    outputs: List[str] = field(default_factory=list)
+    # Always run, for steps reading data that changes outside the workflow
+    volatile: bool = False
+    # Modules the function relies on besides its own, part of the cache key
+    code: List[str] = field(default_factory=list)
+
+    @property
+    def dependencies(self) -> List[str]:
+        return [
+            name
+            for names in self.inputs.values()
+            for name in ([names] if isinstance(names, str) else names)
+        ]
+
+
+@dataclass
+class Artifact:
+    """Stored output of a step, its value is loaded on first use."""
+
+    digest: str
+    path: str
+    value: Any = None
+    loaded: bool = False
+
+    def load(self) -> Any:
+        if not self.loaded:
+            if self.path.endswith(".parquet"):
+                self.value = pl.read_parquet(self.path)
+            else:
+                self.value = read_cache_json(self.path)
+            self.loaded = True
+        return self.value
+
+
+@lru_cache(maxsize=None)
+def _source_digest(path: str) -> str:
+    return file_checksum(path)
+
+
+def _module_source(module: str) -> str:
+    spec = importlib.util.find_spec(module)
+    if spec is None or spec.origin is None:
+        raise ValueError(f"Cannot find the source of module {module}")
+    return spec.origin
+
+
+def step_key(step: Step, inputs: Dict[str, Artifact]) -> str:
+    """
+    Cache key of a step run.
+
+    Args:
+        step: Step to run
+        inputs: Artifacts of the steps it depends on, by step name
+
+    Returns:
+        Hex digest of the step name, the source files of its function and
+        of the modules in its code, its params and the content digests of its
+        inputs
+    """
+
+    digest = hashlib.sha256(step.name.encode())
+    sources = [inspect.getsourcefile(inspect.unwrap(step.run))]
+    sources.extend(_module_source(module) for module in step.code)
+    for source in sources:
+        digest.update(_source_digest(source).encode())
+    digest.update(json.dumps(step.params, sort_keys=True, default=str).encode())
+    for name in sorted(inputs):
+        digest.update(name.encode())
+        digest.update(inputs[name].digest.encode())
+    return digest.hexdigest()
+
+
+def _serialize(value: Any) -> tuple[bytes, str]:
+    if isinstance(value, pl.DataFrame):
+        buffer = io.BytesIO()
+        value.write_parquet(buffer, statistics=False)
+        return buffer.getvalue(), "parquet"
+    return json.dumps(value, sort_keys=True, default=str).encode(), "json"
+
+
+def store_artifact(value: Any, directory: str = artifact_dir) -> Artifact:
+    """
+    Store a step output under the digest of its content.
+
+    Args:
+        value: Polars frame or JSON serializable value
+        directory: Artifact store
+
+    Returns:
+        Stored artifact, identical outputs share one file
+    """
+
+    content, extension = _serialize(value)
+    digest = hashlib.sha256(content).hexdigest()
+    path = os.path.join(directory, f"{digest}.{extension}")
+    if not os.path.isfile(path):
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+    return Artifact(digest, path, value, loaded=True)
+
+
+def _output_checksums(step: Step) -> Dict[str, str] | None:
+    if not all(os.path.isfile(path) for path in step.outputs):
+        return None
+    return {path: file_checksum(path) for path in step.outputs}
+
+
+def _reusable(step: Step, key: str, directory: str) -> Artifact | None:
+    if step.volatile:
+        return None
+    entry = read_cache_json(os.path.join(directory, "keys", f"{key}.json"))
+    if entry is None or not verify_checksum(entry["path"]):
+        return None
+
+    artifact = Artifact(entry["digest"], entry["path"])
+    # Files written by the step must still be the ones it wrote
+    if step.outputs and artifact.load() != _output_checksums(step):
+        return None
+    return artifact
+
+
+def _run_step(step: Step, inputs: Dict[str, Artifact], directory: str) -> Artifact:
+    kwargs = dict(step.params)
+    for argument, names in step.inputs.items():
+        if isinstance(names, str):
+            kwargs[argument] = inputs[names].load()
+        else:
+            kwargs[argument] = [inputs[name].load() for name in names]
+
+    with stage(f"workflow.{step.name.split(':')[0]}"):
+        value = step.run(**kwargs)
+
+    if value is None:
+        value = _output_checksums(step)
+        if value is None and step.outputs:
+            raise RuntimeError(f"Step {step.name} did not write {step.outputs}")
+    return store_artifact(value, directory)
+
+
+def _validate(steps: List[Step], targets: List[str] | None) -> Dict[str, Step]:
+    by_name = {}
+    for step in steps:
+        known = by_name.get(step.name)
+        if known is not None and (known.run, known.params, known.code) != (
+            step.run,
+            step.params,
+            step.code,
+        ):
+            raise ValueError(f"Two different steps are named {step.name}")
+        by_name[step.name] = step
+
+    for step in by_name.values():
+        missing = [name for name in step.dependencies if name not in by_name]
+        if missing:
+            raise ValueError(f"Step {step.name} depends on unknown steps {missing}")
+
+    if targets is None:
+        return by_name
+    # Only the targets and the steps they depend on
+    needed, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in by_name:
+            raise ValueError(f"Unknown target step {name}")
+        if name not in needed:
+            needed.add(name)
+            pending.extend(by_name[name].dependencies)
+    return {name: step for name, step in by_name.items() if name in needed}
+
+
+def run_workflow(
+    steps: List[Step],
+    targets: List[str] | None = None,
+    max_workers: int = workflow_workers,
+    directory: str = artifact_dir,
+) -> Dict[str, Artifact]:
+    """
+    Run every step once its inputs are available, skipping unchanged steps.
+
+    Args:
+        steps: Steps of one or more workflows, shared steps are run once
+        targets: Names of the steps to bring up to date, all by default
+        max_workers: Steps running at the same time
+        directory: Artifact store
+
+    Returns:
+        Dictionary of step name to its artifact
+
+    Raises:
+        ValueError: If steps share a name but differ, depend on unknown
+            steps or form a cycle, or if a target is unknown
+    """
+
+    by_name = _validate(steps, targets)
+    graph = TopologicalSorter(
+        {name: step.dependencies for name, step in by_name.items()}
+    )
+    graph.prepare()
+
+    artifacts: Dict[str, Artifact] = {}
+    # Future -> (step name, cache key)
+    running: Dict[Future, tuple[str, str]] = {}
+    ran, reused = 0, 0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while graph.is_active():
+            for name in graph.get_ready():
+                step = by_name[name]
+                inputs = {dep: artifacts[dep] for dep in step.dependencies}
+                key = step_key(step, inputs)
+
+                artifact = _reusable(step, key, directory)
+                if artifact is not None:
+                    logger.debug(f"Reusing {name}")
+                    artifacts[name] = artifact
+                    reused += 1
+                    graph.done(name)
+                    continue
+
+                future = executor.submit(_run_step, step, inputs, directory)
+                running[future] = (name, key)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, key = running.pop(future)
+                try:
+                    artifact = future.result()
+                except Exception:
+                    logger.error(f"Step {name} failed")
+                    raise
+                if not by_name[name].volatile:
+                    write_cache_json(
+                        os.path.join(directory, "keys", f"{key}.json"),
+                        {"digest": artifact.digest, "path": artifact.path},
+                    )
+                artifacts[name] = artifact
+                ran += 1
+                graph.done(name)
+                logger.debug(f"Ran {name}")
+
+    logger.info(
+        f"Workflow of {len(by_name)} steps done in {time.perf_counter() - start:.1f}s, "
+        f"{ran} ran, {reused} reused"
+    )
+    return artifacts
+
+
+def prune_artifacts(keep: Dict[str, Artifact], directory: str = artifact_dir) -> int:
+    """
+    Delete stored artifacts and cache keys not referenced by a workflow run.
+
+    Args:
+        keep: Artifacts returned by run_workflow
+        directory: Artifact store
+
+    Returns:
+        Number of artifact and key files deleted
+    """
+
+    paths = {artifact.path for artifact in keep.values()}
+    stale = [
+        path
+        for pattern in ("*.parquet", "*.json")
+        for path in glob.glob(os.path.join(directory, pattern))
+        if path not in paths
+    ]
+    for path in glob.glob(os.path.join(directory, "keys", "*.json")):
+        entry = read_cache_json(path)
+        if entry is None or entry["path"] not in paths:
+            stale.append(path)
+
+    for path in stale:
+        for leftover in (path, f"{path}{CHECKSUM_SUFFIX}", f"{path}{LOCK_SUFFIX}"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return len(stale)
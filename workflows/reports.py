@@ -0,0 +1,237 @@
+"""
+Strategy reports as one workflow of cached, parallel steps.
+
+Every member EOA of a strategy gets its frames loaded, debug CSVs written and
+its allTime portfolio charted next to the combined strategy portfolio. Loads
+shared between strategies run once and unchanged outputs are not rebuilt:
+
+    python -m workflows.reports dnhype dnpump hbusdt
+    python -m workflows.reports --refresh --prune
+"""
+
+import argparse
+import os
+from typing import List
+import polars as pl
+from config import REFRESH
+from constants.strategies import strategies
+from loaders.portfolio import combine_portfolios, get_portfolio
+from loaders.twap import get_twap_history_dataframe
+from loaders.user_fills import get_user_fills_dataframe
+from loaders.user_funding import get_user_funding_dataframe
+from loaders.user_ledger_updates import get_user_ledger_updates_dataframe
+from viz.portfolio import visualize_portfolio
+from workflows.dag import Step, prune_artifacts, run_workflow
+
+# Frame -> loader of the per EOA frames written to debug/
+FRAME_LOADERS = {
+    "twap": get_twap_history_dataframe,
+    "fills": get_user_fills_dataframe,
+    "funding": get_user_funding_dataframe,
+    "ledger_updates": get_user_ledger_updates_dataframe,
+}
+
+# Frame -> columns whose distinct values are written to debug/unique/
+UNIQUE_COLUMNS = {
+    "twap": ["coin", "side"],
+    "fills": ["coin", "side"],
+    "ledger_updates": [
+        "delta_type",
+        "token",
+        "user",
+        "destination",
+        "toPerp",
+        "isDeposit",
+    ],
+}
+
+# Modules the portfolio chart is drawn with, config holds its sizing
+CHART_CODE = ["config", "viz.portfolio", "viz.data", "viz.downsample", "utils.num"]
+
+
+def file_uid(label: str) -> str:
+    """File name prefix of an EOA label, e.g. "dn_hype_short"."""
+    return label.strip().replace(" ", "_").lower()
+
+
+def all_time_portfolio(address: str, use_cache: bool = True) -> pl.DataFrame:
+    """allTime period of the portfolio of an address."""
+    return get_portfolio(address=address, use_cache=use_cache).filter(
+        pl.col("period") == "allTime"
+    )
+
+
+def write_debug_csvs(uid: str, **frames: pl.DataFrame) -> None:
+    """Write every frame of an EOA to debug/<uid>_<frame>.csv."""
+    os.makedirs("debug", exist_ok=True)
+    for name, df in frames.items():
+        df.write_csv(f"debug/{uid}_{name}.csv")
+
+
+def write_unique_csvs(strategy: str, **frames: List[pl.DataFrame]) -> None:
+    """
+    Write the distinct values of UNIQUE_COLUMNS over all EOAs of a strategy.
+
+    Args:
+        strategy: Strategy key, prefix of the files in debug/unique/
+        frames: Frame name -> frames of every EOA
+    """
+
+    os.makedirs("debug/unique", exist_ok=True)
+    for name, dfs in frames.items():
+        pl.concat(
+            [df.select(UNIQUE_COLUMNS[name]) for df in dfs], how="vertical_relaxed"
+        ).unique(maintain_order=True).write_csv(f"debug/unique/{strategy}_{name}.csv")
+
+
+def write_portfolio_chart(
+    path: str,
+    name: str,
+    titles: List[str],
+    portfolios: List[pl.DataFrame],
+    combined: pl.DataFrame,
+) -> None:
+    """
+    Save the portfolio chart of every EOA above the combined one.
+
+    Args:
+        path: HTML file to write
+        name: Strategy display name
+        titles: Chart title of every EOA
+        portfolios: allTime portfolio of every EOA
+        combined: Combined allTime portfolio
+    """
+
+    charts = [
+        visualize_portfolio(portfolio, title=title)
+        for title, portfolio in zip(titles, portfolios)
+    ]
+    charts.append(
+        visualize_portfolio(combined, title=f"Combined {name} Strategy Portfolio")
+    )
+
+    chart = charts[0]
+    for other in charts[1:]:
+        chart &= other
+    chart.properties(title=f"{name.upper()} Portfolio Overview").save(path)
+
+
+def strategy_steps(
+    strategy: str, refresh: bool = REFRESH, chart_path: str | None = None
+) -> List[Step]:
+    """
+    Steps of the report of a strategy.
+
+    Args:
+        strategy: Key of constants.strategies.strategies
+        refresh: Refetch the EOA histories instead of reading the caches
+        chart_path: Portfolio chart file, "<strategy>_portfolio.html" by default
+
+    Returns:
+        Steps to pass to run_workflow, loads are named after the address only
+        so strategies sharing an EOA share them
+    """
+
+    name = strategies[strategy]["name"]
+    eoas = strategies[strategy]["eoas"]
+    steps = []
+
+    for eoa in eoas:
+        address = eoa["address"].lower()
+        params = {"address": address, "use_cache": not refresh}
+        steps.extend(
+            Step(f"{frame}:{address}", loader, params=params, volatile=True)
+            for frame, loader in FRAME_LOADERS.items()
+        )
+        steps.append(
+            Step(
+                f"portfolio:{address}",
+                all_time_portfolio,
+                params=params,
+                volatile=True,
+            )
+        )
+
+        uid = file_uid(eoa["label"])
+        steps.append(
+            Step(
+                f"debug_csvs:{address}",
+                write_debug_csvs,
+                inputs={frame: f"{frame}:{address}" for frame in FRAME_LOADERS},
+                params={"uid": uid},
+                outputs=[f"debug/{uid}_{frame}.csv" for frame in FRAME_LOADERS],
+            )
+        )
+
+    addresses = [eoa["address"].lower() for eoa in eoas]
+    steps.append(
+        Step(
+            f"unique_csvs:{strategy}",
+            write_unique_csvs,
+            inputs={
+                frame: [f"{frame}:{address}" for address in addresses]
+                for frame in UNIQUE_COLUMNS
+            },
+            params={"strategy": strategy},
+            outputs=[f"debug/unique/{strategy}_{frame}.csv" for frame in UNIQUE_COLUMNS],
+        )
+    )
+
+    portfolios = [f"portfolio:{address}" for address in addresses]
+    steps.append(
+        Step(
+            f"combined_portfolio:{strategy}",
+            combine_portfolios,
+            inputs={"portfolios": portfolios},
+        )
+    )
+
+    chart_path = chart_path or f"{strategy}_portfolio.html"
+    steps.append(
+        Step(
+            f"portfolio_chart:{strategy}",
+            write_portfolio_chart,
+            inputs={
+                "portfolios": portfolios,
+                "combined": f"combined_portfolio:{strategy}",
+            },
+            params={
+                "path": chart_path,
+                "name": name,
+                "titles": [
+                    f"{eoa['label'].strip()} Portfolio - {eoa['address']}" for eoa in eoas
+                ],
+            },
+            outputs=[chart_path],
+            code=CHART_CODE,
+        )
+    )
+    return steps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("strategies", nargs="*", help="All strategies by default")
+    parser.add_argument("--refresh", action="store_true", help="Refetch histories")
+    parser.add_argument("--workers", type=int, help="Steps run at the same time")
+    parser.add_argument(
+        "--prune", action="store_true", help="Delete artifacts this run did not use"
+    )
+    args = parser.parse_args()
+    unknown = set(args.strategies) - set(strategies)
+    if unknown:
+        parser.error(f"Unknown strategies {sorted(unknown)}, expected {list(strategies)}")
+
+    steps = [
+        step
+        for strategy in args.strategies or strategies
+        for step in strategy_steps(strategy, refresh=args.refresh or REFRESH)
+    ]
+    kwargs = {"max_workers": args.workers} if args.workers else {}
+    artifacts = run_workflow(steps, **kwargs)
+    if args.prune:
+        prune_artifacts(artifacts)
+
+
+if __name__ == "__main__":
+    main()